@@ -0,0 +1,562 @@
+"""
+Caching helpers for the redis caches defined in :code:`CACHES`
+and :code:`INSANIC_CACHES`.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import math
+import random
+import time
+import ujson as json
+import uuid
+
+from collections import OrderedDict
+from functools import partial, wraps
+from inspect import isawaitable
+from typing import Any, Callable, Iterable, Optional, Union
+from urllib.parse import parse_qsl, urlencode
+
+from sanic.response import HTTPResponse
+from sanic.views import HTTPMethodView
+
+from insanic.connections import get_connection
+from insanic.exceptions import ImproperlyConfigured
+from insanic.functional import empty
+from insanic.log import error_logger
+from insanic.request import Request
+from insanic.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+from insanic.utils.concurrency import SingleFlight
+
+DEFAULT_CACHE = "default"
+LOCK_KEY_FORMAT = "%(key)s:lock"
+LOCK_POLL_INTERVAL = 0.05
+
+RESPONSE_KEY_FORMAT = "insanic:response:%(key)s"
+RESPONSE_TAG_KEY_FORMAT = "insanic:response_tag:%(tag)s"
+RESPONSE_EXCLUDED_HEADERS = {"content-length", "etag"}
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_single_flight = SingleFlight()
+
+
+async def _get_entry(alias: str, key: str) -> Optional[dict]:
+    redis = await get_connection(alias, key)
+    with await redis as conn:
+        entry = await conn.get(key)
+
+    return json.loads(entry) if entry else None
+
+
+async def _set_entry(
+    alias: str,
+    key: str,
+    value: Any,
+    *,
+    delta: float,
+    timeout: float,
+    stale_timeout: float,
+) -> None:
+    entry = {"value": value, "delta": delta, "expiry": time.time() + timeout}
+    redis = await get_connection(alias, key)
+    with await redis as conn:
+        await conn.set(
+            key,
+            json.dumps(entry),
+            pexpire=int((timeout + stale_timeout) * 1000),
+        )
+
+
+def _should_refresh(entry: dict, beta: float) -> bool:
+    """
+    Probabilistic early expiration. The closer an entry is to its expiry,
+    and the longer it took to compute, the more likely a caller
+    will decide to refresh it ahead of time.
+    """
+    jitter = entry["delta"] * beta * math.log(1.0 - random.random())
+    return time.time() - jitter >= entry["expiry"]
+
+
+async def _wait_for_value(
+    alias: str, key: str, lock_key: str, lock_timeout: float
+) -> Any:
+    """
+    Polls for the value another process is computing while it holds
+    the lock. Returns :code:`empty` if it didn't show up in time, or if
+    the lock was released without a value being set.
+    """
+    deadline = time.monotonic() + lock_timeout
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await _get_entry(alias, key)
+        if entry is not None:
+            return entry["value"]
+
+        redis = await get_connection(alias, key)
+        with await redis as conn:
+            locked = await conn.exists(lock_key)
+
+        if not locked:
+            # the value could have been set right before the lock was released
+            entry = await _get_entry(alias, key)
+            return entry["value"] if entry is not None else empty
+
+    return empty
+
+
+async def _refresh(
+    alias: str,
+    key: str,
+    func: Callable,
+    *,
+    timeout: float,
+    stale_timeout: float,
+    lock_timeout: float,
+    wait: bool,
+) -> Any:
+    lock_key = LOCK_KEY_FORMAT % {"key": key}
+    token = uuid.uuid4().hex
+
+    redis = await get_connection(alias, key)
+    with await redis as conn:
+        acquired = await conn.set(
+            lock_key,
+            token,
+            pexpire=int(lock_timeout * 1000),
+            exist=conn.SET_IF_NOT_EXIST,
+        )
+
+    if not acquired:
+        if not wait:
+            # another process is already refreshing this entry
+            return None
+
+        value = await _wait_for_value(alias, key, lock_key, lock_timeout)
+        if value is not empty:
+            return value
+
+    try:
+        start = time.monotonic()
+        value = func()
+        if isawaitable(value):
+            value = await value
+
+        await _set_entry(
+            alias,
+            key,
+            value,
+            delta=time.monotonic() - start,
+            timeout=timeout,
+            stale_timeout=stale_timeout,
+        )
+    finally:
+        if acquired:
+            with await redis as conn:
+                await conn.eval(
+                    RELEASE_LOCK_SCRIPT, keys=[lock_key], args=[token]
+                )
+
+    return value
+
+
+async def _background_refresh(flight_key: tuple, **kwargs) -> None:
+    try:
+        await _single_flight.do(flight_key, partial(_refresh, **kwargs))
+    except Exception:
+        error_logger.exception(
+            f"Error while refreshing cache key {flight_key[1]}."
+        )
+
+
+async def get_or_set(
+    key: str,
+    func: Callable,
+    *,
+    timeout: float = 300,
+    alias: str = DEFAULT_CACHE,
+    beta: float = 1.0,
+    stale_timeout: float = 0,
+    lock_timeout: float = 5.0,
+) -> Any:
+    """
+    Gets the value of :code:`key` from the cache. If it doesn't exist,
+    :code:`func` is called and the result is set in the cache.
+
+    Concurrent misses for the same key within the process are collapsed
+    into a single call of :code:`func`, and a short lock in redis does
+    the same across processes. Entries are refreshed probabilistically
+    before they expire, and entries that have expired but are still within
+    :code:`stale_timeout` are served while being refreshed in the background.
+
+    The value returned by :code:`func` must be json serializable.
+
+    :param key: The cache key.
+    :param func: A callable or coroutine function that computes the value.
+    :param timeout: Number of seconds the value is considered fresh.
+    :param alias: The cache alias to use.
+    :param beta: Weight of the early expiration. Values greater than 1
+        favor earlier refreshes, 0 disables it.
+    :param stale_timeout: Number of seconds a value is served after
+        :code:`timeout` while it is being refreshed.
+    :param lock_timeout: Maximum number of seconds to hold the lock
+        while computing the value.
+    """
+    flight_key = (alias, key)
+    refresh_kwargs = {
+        "alias": alias,
+        "key": key,
+        "func": func,
+        "timeout": timeout,
+        "stale_timeout": stale_timeout,
+        "lock_timeout": lock_timeout,
+    }
+
+    entry = await _get_entry(alias, key)
+
+    if entry is None:
+        return await _single_flight.do(
+            flight_key, partial(_refresh, wait=True, **refresh_kwargs)
+        )
+
+    if _should_refresh(entry, beta) and flight_key not in _single_flight:
+        asyncio.ensure_future(
+            _background_refresh(flight_key, wait=False, **refresh_kwargs)
+        )
+
+    return entry["value"]
+
+
+class _UncacheableResponse(Exception):
+    def __init__(self, response: HTTPResponse):
+        self.response = response
+        super().__init__()
+
+
+def _is_cacheable(response) -> bool:
+    # streamed responses have no body to cache
+    return isinstance(response, HTTPResponse) and response.status == HTTP_200_OK
+
+
+def _find_request(args: tuple) -> Request:
+    for arg in args:
+        if isinstance(arg, Request):
+            return arg
+
+    raise RuntimeError(
+        "`request` object was not found. "
+        "Must decorate a view function or class view method."
+    )
+
+
+def _normalized_query(request: Request) -> str:
+    return urlencode(
+        sorted(parse_qsl(request.query_string, keep_blank_values=True))
+    )
+
+
+def _decorate_class_view(decorator: Callable, view: type) -> type:
+    if not issubclass(view, HTTPMethodView):
+        raise ImproperlyConfigured("Must wrap a HTTPMethodView subclass.")
+    if not hasattr(view, "get"):
+        raise ImproperlyConfigured(
+            f"{view.__name__} has no get method to cache."
+        )
+
+    view.get = decorator(view.get)
+    return view
+
+
+async def _call_view(func: Callable, *args, **kwargs) -> HTTPResponse:
+    response = func(*args, **kwargs)
+    if isawaitable(response):
+        response = await response
+    return response
+
+
+def get_response_cache_key(
+    request: Request,
+    *,
+    vary_on_user: bool = False,
+    vary_headers: Iterable[str] = (),
+) -> str:
+    """
+    Builds the cache key for a request from the path, the normalized
+    query params and the values the response varies on.
+
+    :param request: The request to build the key for.
+    :param vary_on_user: If the response differs per user.
+    :param vary_headers: Request headers the response differs on.
+    """
+    parts = [request.path, _normalized_query(request)]
+
+    if vary_on_user:
+        parts.append(str(request.user.id))
+
+    for header in vary_headers:
+        parts.append(request.headers.get(header, ""))
+
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+    return RESPONSE_KEY_FORMAT % {"key": digest}
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+
+    if not if_none_match:
+        return False
+
+    candidates = {
+        tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")
+    }
+    return "*" in candidates or etag in candidates
+
+
+def _serialize_response(response: HTTPResponse) -> dict:
+    return {
+        "status": response.status,
+        "content_type": response.content_type,
+        "headers": [
+            [k, v]
+            for k, v in response.headers.items()
+            if k.lower() not in RESPONSE_EXCLUDED_HEADERS
+        ],
+        # latin-1 maps every byte to a code point so any body survives json
+        "body": response.body.decode("latin-1"),
+        "etag": _etag(response.body),
+    }
+
+
+def _deserialize_response(entry: dict) -> HTTPResponse:
+    response = HTTPResponse(
+        body=entry["body"].encode("latin-1"),
+        status=entry["status"],
+        content_type=entry["content_type"],
+    )
+
+    for k, v in entry["headers"]:
+        response.headers[k] = v
+    response.headers["ETag"] = entry["etag"]
+
+    return response
+
+
+def _not_modified(etag: str) -> HTTPResponse:
+    return HTTPResponse(status=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+async def _tag_response(
+    alias: str, key: str, tags: Iterable[str], timeout: float
+) -> None:
+    for tag in tags:
+        tag_key = RESPONSE_TAG_KEY_FORMAT % {"tag": tag}
+        redis = await get_connection(alias, tag_key)
+        with await redis as conn:
+            await conn.sadd(tag_key, key)
+            ttl = await conn.ttl(tag_key)
+            if ttl < timeout:
+                await conn.expire(tag_key, int(math.ceil(timeout)))
+
+
+async def invalidate_tags(*tags: str, alias: str = DEFAULT_CACHE) -> None:
+    """
+    Removes all cached responses that were tagged with any of :code:`tags`.
+
+    :param tags: The tags to invalidate.
+    :param alias: The cache alias the responses were cached in.
+    """
+    for tag in tags:
+        tag_key = RESPONSE_TAG_KEY_FORMAT % {"tag": tag}
+        redis = await get_connection(alias, tag_key)
+        with await redis as conn:
+            keys = await conn.smembers(tag_key)
+            await conn.delete(tag_key)
+
+        for key in keys:
+            redis = await get_connection(alias, key)
+            with await redis as conn:
+                await conn.delete(key)
+
+
+def cache_response(
+    *,
+    timeout: float = 60,
+    alias: str = DEFAULT_CACHE,
+    vary_on_user: bool = False,
+    vary_headers: Iterable[str] = (),
+    tags: Union[Iterable[str], Callable[..., Iterable[str]]] = (),
+    lock_timeout: float = 5.0,
+) -> Callable:
+    """
+    Caches successful GET responses of a view in a redis cache so repeated
+    requests are served from the cache without running the handler. An
+    :code:`ETag` header is set on the response and requests with a
+    matching :code:`If-None-Match` header receive a 304 response.
+
+    Can decorate a view function, a class view method, or an
+    :code:`InsanicView` (which will cache :code:`get`).
+
+    :param timeout: Number of seconds to cache the response for.
+    :param alias: The cache alias to store the responses in.
+    :param vary_on_user: If the response differs per user.
+    :param vary_headers: Request headers the response differs on.
+    :param tags: Tags to invalidate the cached response with
+        :code:`invalidate_tags`, or a callable that takes the same
+        arguments as the view and returns the tags.
+    :param lock_timeout: Maximum number of seconds to wait for
+        another worker rendering the same response.
+    """
+
+    def decorator(func_or_cls):
+        if inspect.isclass(func_or_cls):
+            return _decorate_class_view(decorator, func_or_cls)
+
+        @wraps(func_or_cls)
+        async def wrapper(*args, **kwargs):
+            request = _find_request(args)
+
+            if request.method != "GET":
+                return await _call_view(func_or_cls, *args, **kwargs)
+
+            key = get_response_cache_key(
+                request, vary_on_user=vary_on_user, vary_headers=vary_headers
+            )
+
+            rendered = []
+
+            async def render():
+                response = await _call_view(func_or_cls, *args, **kwargs)
+                rendered.append(response)
+
+                if not _is_cacheable(response):
+                    raise _UncacheableResponse(response)
+
+                response_tags = (
+                    tags(*args, **kwargs) if callable(tags) else tags
+                )
+                await _tag_response(alias, key, response_tags, timeout)
+
+                return _serialize_response(response)
+
+            try:
+                entry = await get_or_set(
+                    key,
+                    render,
+                    timeout=timeout,
+                    alias=alias,
+                    beta=0,
+                    lock_timeout=lock_timeout,
+                )
+            except _UncacheableResponse as e:
+                if rendered or isinstance(e.response, HTTPResponse):
+                    return e.response
+                # the streamed response of another request can't be shared
+                return await _call_view(func_or_cls, *args, **kwargs)
+
+            if _etag_matches(request, entry["etag"]):
+                return _not_modified(entry["etag"])
+
+            return _deserialize_response(entry)
+
+        return wrapper
+
+    return decorator
+
+
+def micro_cache(
+    timeout: float = 1.0,
+    *,
+    vary_headers: Iterable[str] = (),
+    max_entries: int = 1024,
+) -> Callable:
+    """
+    Caches successful GET responses of a view in the worker's memory for a
+    short time. While a response is being rendered, identical requests
+    wait for it instead of running the handler themselves.
+
+    Intended for hot public endpoints (e.g. :code:`public_facing`) whose
+    responses don't differ per user.
+
+    :param timeout: Number of seconds to cache the response for.
+    :param vary_headers: Request headers the response differs on.
+    :param max_entries: Maximum number of responses to keep per view.
+    """
+
+    def decorator(func_or_cls):
+        if inspect.isclass(func_or_cls):
+            return _decorate_class_view(decorator, func_or_cls)
+
+        entries = OrderedDict()
+        flight = SingleFlight()
+
+        async def render(key, owner, *args, **kwargs):
+            response = await _call_view(func_or_cls, *args, **kwargs)
+            owner.append(response)
+            if not isinstance(response, HTTPResponse):
+                return response
+
+            rendered = (
+                response.status,
+                response.content_type,
+                list(response.headers.items()),
+                response.body,
+            )
+
+            if _is_cacheable(response):
+                entries[key] = (time.monotonic() + timeout, rendered)
+                entries.move_to_end(key)
+                while len(entries) > max_entries:
+                    entries.popitem(last=False)
+
+            return rendered
+
+        @wraps(func_or_cls)
+        async def wrapper(*args, **kwargs):
+            request = _find_request(args)
+
+            if request.method != "GET":
+                return await _call_view(func_or_cls, *args, **kwargs)
+
+            key = (request.path, _normalized_query(request)) + tuple(
+                request.headers.get(h, "") for h in vary_headers
+            )
+
+            entry = entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                rendered = entry[1]
+            else:
+                entries.pop(key, None)
+                owner = []
+                rendered = await flight.do(
+                    key, partial(render, key, owner, *args, **kwargs)
+                )
+
+                if not isinstance(rendered, tuple):
+                    if owner:
+                        return rendered
+                    # the streamed response of another request can't be shared
+                    return await _call_view(func_or_cls, *args, **kwargs)
+
+            status, content_type, headers, body = rendered
+            return HTTPResponse(
+                body=body,
+                status=status,
+                headers=headers,
+                content_type=content_type,
+            )
+
+        wrapper.micro_cache_entries = entries
+        return wrapper
+
+    return decorator
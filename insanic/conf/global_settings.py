@@ -66,6 +66,18 @@ SERVICE_GLOBAL_PORT: str = "8000"
 SERVICE_CONNECTOR_MAX: int = 100
 #: httpx config for keep alive
 SERVICE_CONNECTOR_MAX_KEEPALIVE: int = 20
+#: if all services should share a single connection pool, in which case the connector limits are for the whole process (httpx 0.15 and later)
+SERVICE_SHARED_CONNECTION_POOL: bool = False
+#: the maximum number of connections to each host with the shared connection pool
+SERVICE_CONNECTOR_MAX_PER_HOST: int = 20
+#: seconds an idle connection is kept open with the shared connection pool
+SERVICE_CONNECTOR_KEEPALIVE_EXPIRY: float = 5.0
+#: if requests to services should use HTTP/2 when the service supports it, which needs the h2 package (:code:`pip install httpx[http2]`)
+SERVICE_HTTP2: bool = False
+#: if requests to services over plain http should use HTTP/2 without negotiating it, for services that are known to speak HTTP/2 (httpx 0.15 and later)
+SERVICE_HTTP2_PRIOR_KNOWLEDGE: bool = False
+#: the number of connections opened to each service in :code:`SERVICE_CONNECTIONS` when the server starts, so the first requests don't wait for connections
+SERVICE_PREWARM_CONNECTIONS: int = 0
 
 #: httpx config for timeout
 SERVICE_TIMEOUT_TOTAL: float = 5.0
@@ -75,12 +87,131 @@ SERVICE_TIMEOUT_TOTAL: float = 5.0
 # SERVICE_TIMEOUT_POOL: float = None
 # httpx configs - end
 
+#: timeouts of the endpoints of each service by service name, with endpoints as :code:`"GET /api/v1/reports/{id}/"`,
+#: or without the method for all methods, and identifiers in the path replaced with :code:`{id}`
+SERVICE_ENDPOINT_TIMEOUTS: Dict[str, Dict[str, float]] = {}
+#: if the timeout of each endpoint should be derived from its latencies when it isn't set
+SERVICE_ADAPTIVE_TIMEOUT: bool = False
+#: the percentile of the latencies of an endpoint its timeout is derived from
+SERVICE_ADAPTIVE_TIMEOUT_PERCENTILE: float = 0.99
+#: the factor of the percentile that is the timeout
+SERVICE_ADAPTIVE_TIMEOUT_FACTOR: float = 2.0
+#: the lowest timeout in seconds derived from latencies
+SERVICE_ADAPTIVE_TIMEOUT_MIN: float = 0.1
+#: the highest timeout in seconds derived from latencies, :code:`SERVICE_TIMEOUT_TOTAL` if not set
+SERVICE_ADAPTIVE_TIMEOUT_MAX: Optional[float] = None
+
 #: number of retries the Service object will attempt the GET request
 SERVICE_CONNECTION_DEFAULT_RETRY_COUNT: int = 2
 #: the hard maximum for retries
 SERVICE_CONNECTION_MAX_RETRY_COUNT: int = 4
+#: methods of requests that are retried
+SERVICE_RETRY_METHODS: List[str] = ["GET"]
+#: response status codes that are retried
+SERVICE_RETRY_STATUS_CODES: List[int] = [500, 502, 503, 504]
+#: the maximum delay in seconds before the first retry, doubled on every retry
+SERVICE_RETRY_BACKOFF_BASE: float = 0.05
+#: the maximum delay in seconds before any retry
+SERVICE_RETRY_BACKOFF_MAX: float = 1.0
+#: the number of retries allowed for each request to a service
+SERVICE_RETRY_BUDGET_RATIO: float = 0.2
+#: the number of retries allowed each second regardless of the number of requests
+SERVICE_RETRY_BUDGET_MIN_PER_SECOND: float = 10
+
+#: if identical GET requests in flight to the same service should share a single response
+SERVICE_COALESCE_REQUESTS: bool = False
+
+#: the number of requests of a :code:`dispatch_many` or :code:`scatter_gather` in flight at once
+SERVICE_DISPATCH_MANY_CONCURRENCY: int = 10
+#: the most bytes a streamed response from a service can have, unlimited if not set
+SERVICE_STREAM_MAX_BODY_SIZE: Optional[int] = None
+
+#: if GET responses from other services should be cached according to their Cache-Control headers
+SERVICE_RESPONSE_CACHE: bool = False
+#: the maximum number of responses kept in process for each service
+SERVICE_RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+#: an optional cache alias to share cached responses between processes
+SERVICE_RESPONSE_CACHE_ALIAS: Optional[str] = None
+
+#: if GET requests should be sent again when there is no response after a delay
+SERVICE_HEDGE_REQUESTS: bool = False
+#: seconds to wait before hedging. If not set, the observed latency percentile of the endpoint is used
+SERVICE_HEDGE_DELAY: Optional[float] = None
+#: the latency percentile of the endpoint to wait for before hedging
+SERVICE_HEDGE_PERCENTILE: float = 0.95
+#: the number of hedged requests allowed for each request to a service
+SERVICE_HEDGE_BUDGET_RATIO: float = 0.05
+#: the number of hedged requests allowed each second regardless of the number of requests
+SERVICE_HEDGE_BUDGET_MIN_PER_SECOND: float = 1
+
+#: the endpoints (host:port) of the instances of each service to balance requests between, by service name
+SERVICE_ENDPOINTS: Dict[str, List[str]] = {}
+#: if the addresses of service hosts should be resolved and cached by the Service, and requests balanced between them (http only)
+SERVICE_DNS_CACHE: bool = False
+#: seconds to keep the resolved addresses of a host
+SERVICE_DNS_CACHE_TTL: float = 60.0
+#: seconds to keep a failed resolution of a host
+SERVICE_DNS_CACHE_NEGATIVE_TTL: float = 5.0
+#: seconds for the latency average of an endpoint to forget a latency
+SERVICE_BALANCER_DECAY: float = 10.0
+#: the number of connection or server errors in a row that ejects an endpoint
+SERVICE_OUTLIER_CONSECUTIVE_FAILURES: int = 5
+#: seconds an endpoint is ejected for
+SERVICE_OUTLIER_EJECTION_DURATION: float = 30.0
+#: the maximum fraction of the endpoints of a service that can be ejected at once
+SERVICE_OUTLIER_MAX_EJECTED: float = 0.5
+
+#: if requests to a failing service should fail fast with a circuit breaker
+SERVICE_CIRCUIT_BREAKER: bool = False
+#: the rate of failed requests in the window that opens the circuit
+SERVICE_CIRCUIT_BREAKER_FAILURE_RATE: float = 0.5
+#: the rate of slow requests in the window that opens the circuit
+SERVICE_CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 1.0
+#: seconds after which a request is considered slow
+SERVICE_CIRCUIT_BREAKER_SLOW_CALL_DURATION: float = 5.0
+#: the number of seconds of requests the rates are calculated from
+SERVICE_CIRCUIT_BREAKER_WINDOW: int = 10
+#: the minimum number of requests in the window before the circuit can open
+SERVICE_CIRCUIT_BREAKER_MINIMUM_CALLS: int = 20
+#: seconds the circuit stays open before trial requests are let through
+SERVICE_CIRCUIT_BREAKER_OPEN_DURATION: float = 30.0
+#: the number of trial requests that must succeed to close the circuit
+SERVICE_CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 5
+
+#: if the requests in flight to each service should be limited by a limit that adapts to the latency of the service
+SERVICE_CONCURRENCY_LIMIT: bool = False
+#: the limit of requests in flight to a service before its latency is known
+SERVICE_CONCURRENCY_LIMIT_INITIAL: int = 20
+#: the lowest limit of requests in flight to a service
+SERVICE_CONCURRENCY_LIMIT_MIN: int = 1
+#: the highest limit of requests in flight to a service, which should not be more than SERVICE_CONNECTOR_MAX
+SERVICE_CONCURRENCY_LIMIT_MAX: int = 100
+#: how much higher than its average the latency of a service can be before the limit is lowered
+SERVICE_CONCURRENCY_LIMIT_TOLERANCE: float = 1.5
+#: how quickly the limit follows changes in latency, from 0 to 1
+SERVICE_CONCURRENCY_LIMIT_SMOOTHING: float = 0.2
+#: seconds a request waits for the limit before it is rejected
+SERVICE_CONCURRENCY_LIMIT_MAX_WAIT: float = 0.05
+
+#: the bulkhead of each service by service name, limiting its requests in flight (:code:`MAX_CONCURRENCY`),
+#: the requests waiting for them (:code:`MAX_QUEUE`) and for how many seconds they wait (:code:`MAX_WAIT`)
+SERVICE_BULKHEADS: Dict[str, dict] = {}
+
+#: if requests to a service should be held while it asks to back off with a 429 response
+SERVICE_RATE_LIMIT: bool = False
+#: the rate limit of each service by service name, in requests per second (:code:`RATE`) and the most
+#: requests sent at once (:code:`BURST`). Services in this setting are rate limited even without SERVICE_RATE_LIMIT.
+SERVICE_RATE_LIMITS: Dict[str, dict] = {}
+#: seconds a request waits for the rate limit of a service before it is rejected
+SERVICE_RATE_LIMIT_MAX_WAIT: float = 1.0
+#: seconds to back off after a 429 response without a Retry-After header
+SERVICE_RATE_LIMIT_DEFAULT_BACKOFF: float = 1.0
+#: requests per second sent to a service without a RATE once it has asked to back off, until the held requests are sent
+SERVICE_RATE_LIMIT_BACKOFF_RATE: float = 10.0
 
-#: Redis host, port, and db cache settings
+#: Redis host, port, and db cache settings. Instead of :code:`HOST` and
+#: :code:`PORT`, a cache can define :code:`NODES`, a list of host, port (and
+#: optionally database) settings, to shard keys with a consistent hash ring.
 INSANIC_CACHES: Dict[str, dict] = {
     "insanic": {"HOST": "localhost", "PORT": 6379, "DATABASE": 1},
     "throttle": {"HOST": "localhost", "PORT": 6379, "DATABASE": 2},
@@ -93,8 +224,14 @@ CACHES: Dict[str, dict] = {
 
 #: the key for the asyncio task context that hold user information.
 TASK_CONTEXT_REQUEST_USER: str = "request_user"
+#: the key for the asyncio task context that holds the user serialized for headers
+TASK_CONTEXT_REQUEST_USER_HEADER: str = "request_user_header"
 #: the key for the asyncio task context that holds the correlation id
 TASK_CONTEXT_CORRELATION_ID: str = "correlation_id"
+#: the key for the asyncio task context that holds the deadline of the request
+TASK_CONTEXT_DEADLINE: str = "deadline"
+#: the key for the asyncio task context that holds the batches of loaders for the request
+TASK_CONTEXT_LOADERS: str = "loaders"
 
 JWT_AUTH_DECODE_HANDLER: str = "insanic.authentication.handlers.jwt_decode_handler"
 
@@ -126,6 +263,8 @@ REQUEST_ID_HEADER_FIELD: str = "X-Insanic-Request-ID"
 INTERNAL_REQUEST_USER_HEADER: str = "x-insanic-request-user"
 #: Header key for setting request service context during intra service requests
 INTERNAL_REQUEST_SERVICE_HEADER: str = "x-insanic-request-service"
+#: Header key for the milliseconds left until the deadline of intra service requests
+INTERNAL_REQUEST_DEADLINE_HEADER: str = "x-insanic-request-deadline"
 
 SERVICE_UNAVAILABLE_MESSAGE: str = "{} is currently unavailable."
 
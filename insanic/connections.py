@@ -1,10 +1,13 @@
 import aioredis
 import asyncio
+import hashlib
 import logging
 import traceback
 
+from bisect import bisect, insort
 from inspect import isawaitable
 from threading import local
+from typing import Iterable, Optional
 
 from insanic.conf import settings
 from insanic.exceptions import ImproperlyConfigured
@@ -12,6 +15,84 @@ from insanic.functional import cached_property
 
 logger = logging.getLogger("root")
 
+DEFAULT_VIRTUAL_NODES = 160
+
+
+class ConsistentHashRing:
+    """
+    A consistent hash ring with virtual nodes. Adding or removing a node
+    only remaps the keys that hash to that node's points on the ring.
+
+    :param nodes: The names of the nodes on the ring.
+    :param virtual_nodes: Number of points each node has on the ring.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[str] = (),
+        virtual_nodes: int = DEFAULT_VIRTUAL_NODES,
+    ):
+        self.virtual_nodes = virtual_nodes
+        self._nodes = {}
+        self._points = []
+
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(
+            hashlib.md5(value.encode("utf-8")).digest()[:8], "big"
+        )
+
+    @property
+    def nodes(self) -> set:
+        return set(self._nodes.values())
+
+    def add_node(self, node: str) -> None:
+        for i in range(self.virtual_nodes):
+            point = self._hash(f"{node}#{i}")
+            if point not in self._nodes:
+                insort(self._points, point)
+            self._nodes[point] = node
+
+    def remove_node(self, node: str) -> None:
+        for i in range(self.virtual_nodes):
+            point = self._hash(f"{node}#{i}")
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                self._points.remove(point)
+
+    def get_node(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("There are no nodes in the hash ring.")
+
+        index = bisect(self._points, self._hash(key)) % len(self._points)
+        return self._nodes[self._points[index]]
+
+
+class ShardedConnectionsPool:
+    """
+    Holds a connection pool for each node of a sharded cache and
+    routes keys to them with a consistent hash ring.
+    """
+
+    def __init__(self, pools: dict, virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        self.pools = pools
+        self.ring = ConsistentHashRing(pools.keys(), virtual_nodes)
+
+    def get_pool(self, key: str) -> aioredis.ConnectionsPool:
+        return self.pools[self.ring.get_node(key)]
+
+    def close(self) -> None:
+        for pool in self.pools.values():
+            pool.close()
+
+    async def wait_closed(self) -> None:
+        await asyncio.gather(
+            *[pool.wait_closed() for pool in self.pools.values()]
+        )
+
 
 class ConnectionHandler:
     def __init__(self):
@@ -52,25 +133,52 @@ class ConnectionHandler:
         return self._caches
 
     async def _get_connection(self, alias):
-        conn = await self.connect(alias)
+        try:
+            conn = await self.connect(alias)
+        except BaseException:
+            if hasattr(self._connections, alias):
+                delattr(self._connections, alias)
+            raise
         setattr(self._connections, alias, conn)
 
         return conn
 
-    async def connect(self, alias):
-        # if alias == "redis_client":
-        connection_config = self.caches[alias]
-
-        _pool = await aioredis.create_pool(
-            (connection_config["HOST"], connection_config["PORT"]),
+    async def _create_pool(self, host, port, database):
+        return await aioredis.create_pool(
+            (host, port),
             encoding="utf-8",
-            db=int(connection_config.get("DATABASE", 0)),
+            db=int(database),
             loop=self.loop,
             minsize=1,
             maxsize=10,
         )
 
-        return _pool
+    async def connect(self, alias):
+        connection_config = self.caches[alias]
+        database = connection_config.get("DATABASE", 0)
+
+        if "NODES" not in connection_config:
+            return await self._create_pool(
+                connection_config["HOST"], connection_config["PORT"], database
+            )
+
+        nodes = {}
+        for node in connection_config["NODES"]:
+            node_database = node.get("DATABASE", database)
+            name = f"{node['HOST']}:{node['PORT']}/{node_database}"
+            nodes[name] = (node["HOST"], node["PORT"], node_database)
+
+        if not nodes:
+            raise ImproperlyConfigured(f"NODES for {alias} must not be empty.")
+
+        pools = await asyncio.gather(
+            *[self._create_pool(*node) for node in nodes.values()]
+        )
+
+        return ShardedConnectionsPool(
+            dict(zip(nodes.keys(), pools)),
+            connection_config.get("VIRTUAL_NODES", DEFAULT_VIRTUAL_NODES),
+        )
 
     def __getitem__(self, alias):
         if hasattr(self._connections, alias):
@@ -83,7 +191,11 @@ class ConnectionHandler:
     def __getattr__(self, item):
         if hasattr(self._connections, item):
             return getattr(self._connections, item)
-        return self._get_connection(item)
+
+        # concurrent callers share the pending connection
+        conn = asyncio.ensure_future(self._get_connection(item))
+        setattr(self._connections, item, conn)
+        return conn
 
     def __setitem__(self, key, value):
         setattr(self._connections, key, value)
@@ -113,8 +225,8 @@ class ConnectionHandler:
             else:
                 raise AttributeError("{0} is not connected.")
 
-            # if isawaitable(_conn):
-            #     _conn = await _conn
+            if isinstance(_conn, asyncio.Future):
+                _conn = await _conn
             _conn.close()
             await _conn.wait_closed()
             logger.debug("Closing database connection: {0}".format(alias))
@@ -136,10 +248,24 @@ class ConnectionHandler:
 _connections = ConnectionHandler()
 
 
-async def get_connection(alias):
+async def get_connection(alias: str, key: Optional[str] = None):
+    """
+    Gets a redis client for the cache alias. If the alias is sharded
+    across multiple nodes, :code:`key` determines which node to use.
+
+    :param alias: The cache alias defined in the settings.
+    :param key: The key that will be operated on.
+    """
     _conn = getattr(_connections, alias)
 
     if isawaitable(_conn) and not isinstance(_conn, aioredis.ConnectionsPool):
         _conn = await _conn
 
+    if isinstance(_conn, ShardedConnectionsPool):
+        if key is None:
+            raise ValueError(
+                f"{alias} is sharded. A key is required to get a connection."
+            )
+        _conn = _conn.get_pool(key)
+
     return aioredis.Redis(_conn)
@@ -36,10 +36,12 @@ class GlobalErrorCodes(Enum):
     server_signature_error = 999601
     service_unavailable = 999603
     service_timeout = 999604
+    deadline_exceeded = 999605
     invalid_url = 999610
     client_payload_error = 999620
     transport_error = 999630
     stream_error = 999640
+    response_too_large = 999641
 
     error_unspecified = 999998
     unknown_error = 999999
@@ -191,6 +191,18 @@ class ResponseTimeoutError(APIException):
     message = "Response timeout."
 
 
+class DeadlineExceeded(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    error_code = GlobalErrorCodes.deadline_exceeded
+    message = "Deadline exceeded."
+
+
+class ResponseTooLarge(APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    error_code = GlobalErrorCodes.response_too_large
+    message = "Response too large."
+
+
 class RequestTimeoutError(APIException):
     status_code = status.HTTP_408_REQUEST_TIMEOUT
     message = "Request timeout."
@@ -25,11 +25,28 @@ async def after_server_start_connect_database(app, loop=None, **kwargs):
     _connections.loop = loop
 
 
+async def after_server_start_prewarm_connections(app, loop=None, **kwargs):
+    """
+    Opens connections to the services this application connects to.
+    """
+    from insanic.conf import settings
+    from insanic.services.registry import registry
+
+    if settings.SERVICE_PREWARM_CONNECTIONS:
+        await asyncio.gather(
+            *[
+                service.prewarm(settings.SERVICE_PREWARM_CONNECTIONS)
+                for service in registry.values()
+            ]
+        )
+
+
 async def after_server_stop_clean_up(app, loop, **kwargs):
     """
     Clean up all connections and close service client connections.
     """
     from insanic.connections import _connections
+    from insanic.services.pool import close_connection_pool
     from insanic.services.registry import registry
 
     close_tasks = _connections.close_all()
@@ -39,4 +56,5 @@ async def after_server_stop_clean_up(app, loop, **kwargs):
         service.close_client() for service in registry.values()
     ]
     await asyncio.gather(*close_client_tasks)
+    await close_connection_pool()
     await asyncio.sleep(0)
@@ -1,4 +1,4 @@
-from prometheus_client import Gauge, Counter, Info, core
+from prometheus_client import Gauge, Counter, Histogram, Info, core
 
 
 class PrometheusMetric(object):
@@ -49,6 +49,26 @@ class InsanicMetrics(object):
         "The number of requests this application has handled",
     )
     META = PrometheusMetric(Info, "service", "Meta data about this instance.")
+    CIRCUIT_BREAKER_STATE = PrometheusMetric(
+        Gauge,
+        "service_circuit_breaker_state",
+        "State of the circuit breaker to a service "
+        "(0: closed, 1: half open, 2: open).",
+        labelnames=["service"],
+    )
+    SERVICE_CONCURRENCY_LIMIT = PrometheusMetric(
+        Gauge,
+        "service_concurrency_limit",
+        "The limit of requests in flight to a service.",
+        labelnames=["service"],
+    )
+    SERVICE_CONCURRENCY_QUEUE_WAIT = PrometheusMetric(
+        Histogram,
+        "service_concurrency_queue_wait_seconds",
+        "Seconds requests to a service waited for the concurrency limit.",
+        labelnames=["service"],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    )
 
     @classmethod
     def reset(cls):
@@ -60,6 +80,9 @@ class InsanicMetrics(object):
             "PROC_CPU_PERC",
             "REQUEST_COUNT",
             "META",
+            "CIRCUIT_BREAKER_STATE",
+            "SERVICE_CONCURRENCY_LIMIT",
+            "SERVICE_CONCURRENCY_QUEUE_WAIT",
         ]
 
         for name in metrics:
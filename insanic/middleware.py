@@ -1,13 +1,19 @@
 import aiotask_context
 
 from insanic.conf import settings
+from insanic.exceptions import DeadlineExceeded
+from insanic.services.loader import RequestBatches
+from insanic.services.utils import set_context_deadline
 
 
 def request_middleware(request) -> None:
     """
     Request middleware that runs on all requests. Tracks the
     request count and sets a correlation id to the asyncio task
-    if included in the headers.
+    if included in the headers. Starts the batches of loaders for
+    the request. Sets the deadline of the request
+    if the header for it is included, and rejects the request
+    if the deadline has passed.
 
     :param request: The Request object.
     """
@@ -16,3 +22,17 @@ def request_middleware(request) -> None:
     except AttributeError:  # pragma: no cover
         pass
     aiotask_context.set(settings.TASK_CONTEXT_CORRELATION_ID, request.id)
+    aiotask_context.set(settings.TASK_CONTEXT_LOADERS, RequestBatches())
+
+    remaining = request.headers.get(settings.INTERNAL_REQUEST_DEADLINE_HEADER)
+    if remaining is not None:
+        try:
+            remaining = int(remaining) / 1000
+        except ValueError:
+            return
+
+        set_context_deadline(remaining)
+        if remaining <= 0:
+            raise DeadlineExceeded(
+                description="The deadline of the request has passed."
+            )
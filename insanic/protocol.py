@@ -21,7 +21,10 @@ class InsanicHttpProtocol(HttpProtocol):
 
             extra = {
                 "status": response.status,
-                "byte": len(response.body),
+                # streamed responses have no body to measure
+                "byte": len(response.body)
+                if isinstance(response, HTTPResponse)
+                else -1,
                 "host": f"{self.request.socket[0]}:{self.request.socket[1]}",
                 "request": f"{self.request.method} {self.request.url}",
                 "request_duration": int(time.time() * 1000000)
@@ -50,7 +53,9 @@ class InsanicHttpProtocol(HttpProtocol):
 
             if str(response.status)[0] == "5":
                 access_logger.exception(
-                    "", extra=extra, exc_info=response.exception
+                    "",
+                    extra=extra,
+                    exc_info=getattr(response, "exception", None),
                 )
             else:
                 access_logger.info("", extra=extra)
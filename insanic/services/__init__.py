@@ -1,3 +1,4 @@
+from insanic.services.batch import scatter_gather
 from insanic.services.client import Service
 
-__all__ = ["Service"]
+__all__ = ["Service", "scatter_gather"]
@@ -182,6 +182,18 @@ class Timeout(HTTPXTimeout):
         super().__init__(**kwargs)
 
 
+def timeout_fields(timeout: HTTPXTimeout) -> dict:
+    """
+    The connect, read, write and pool timeouts of a timeout, by the
+    names :code:`Timeout` takes them.
+    """
+    suffix = "" if IS_HTTPX_VERSION_0_14 else "_timeout"
+    return {
+        field: getattr(timeout, field + suffix)
+        for field in ("connect", "read", "write", "pool")
+    }
+
+
 class AsyncClient(HTTPXClient):
     def __init__(
         self,
@@ -210,6 +222,7 @@ class AsyncClient(HTTPXClient):
             kwargs = {
                 "transport": transport,
                 "limits": limits,
+                "http2": http2,
             }
 
         else:
@@ -237,6 +250,14 @@ class AsyncClient(HTTPXClient):
             **kwargs,
         )
 
+    def build_request(self, method, url, *, content=None, data=None, **kwargs):
+        # content is an argument since 0.15.0, data took bytes and streams before
+        if IS_HTTPX_VERSION_0_15:
+            kwargs["content"] = content
+        elif content is not None:
+            data = content
+        return super().build_request(method, url, data=data, **kwargs)
+
     def aclose(self):
         if hasattr(super(), "aclose"):
             return super().aclose()
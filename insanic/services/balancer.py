@@ -0,0 +1,201 @@
+import math
+import random
+import time
+
+from typing import Iterable, List, Optional
+
+from httpx import URL, Request
+
+from insanic.conf import settings
+
+#: The latency in seconds assumed for endpoints that are faster or unknown.
+MIN_LATENCY = 0.001
+
+
+class Endpoint:
+    """
+    An instance of a service that requests can be sent to, along
+    with what the load balancer knows of it.
+
+    :param url: The url of the instance. Only the scheme, host and port are used.
+    """
+
+    __slots__ = (
+        "url",
+        "outstanding",
+        "latency",
+        "consecutive_failures",
+        "ejected_until",
+        "_updated_at",
+    )
+
+    def __init__(self, url: URL):
+        self.url = url
+        self.outstanding = 0
+        self.latency = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self._updated_at = None
+
+    def __repr__(self) -> str:
+        return f"<Endpoint {self.url.scheme}://{self.url.host}:{self.url.port}>"
+
+    @property
+    def key(self) -> tuple:
+        return self.url.scheme, self.url.host, self.url.port
+
+    def cost(self) -> float:
+        """
+        The expected latency of a request taking the requests that
+        are already in flight into account.
+        """
+        return max(self.latency, MIN_LATENCY) * (self.outstanding + 1)
+
+    def route(self, request: Request) -> Request:
+        """
+        A copy of the request to be sent to this endpoint. The
+        :code:`Host` header of the original request is kept.
+        """
+        return Request(
+            request.method,
+            request.url.copy_with(
+                scheme=self.url.scheme, host=self.url.host, port=self.url.port
+            ),
+            headers=request.headers,
+            stream=request.stream,
+        )
+
+
+class LoadBalancer:
+    """
+    Balances requests between the instances of a service with the
+    power of two choices: two endpoints are picked at random and the
+    request is sent to the one with the lowest cost. The cost is the
+    number of outstanding requests weighed by a peak sensitive
+    exponentially weighted moving average of its latency.
+
+    Endpoints that fail :code:`consecutive_failures` times in a row
+    with a connection error or a server error are ejected for
+    :code:`ejection_duration` seconds, unless that would eject more than
+    :code:`max_ejected` of the endpoints.
+
+    :param endpoints: The urls of the endpoints.
+    :param decay: Seconds for the latency average to forget a latency.
+    :param consecutive_failures: Failures in a row that eject an endpoint.
+    :param ejection_duration: Seconds an endpoint is ejected for.
+    :param max_ejected: The maximum fraction of endpoints ejected at once.
+    """
+
+    def __init__(
+        self,
+        endpoints: Iterable[URL],
+        *,
+        decay: float = 10.0,
+        consecutive_failures: int = 5,
+        ejection_duration: float = 30.0,
+        max_ejected: float = 0.5,
+    ):
+        self.decay = decay
+        self.consecutive_failures = consecutive_failures
+        self.ejection_duration = ejection_duration
+        self.max_ejected = max_ejected
+        self.endpoints = []
+        self.update(endpoints)
+
+    @classmethod
+    def from_settings(cls, endpoints: Iterable[URL]) -> "LoadBalancer":
+        return cls(
+            endpoints,
+            decay=settings.SERVICE_BALANCER_DECAY,
+            consecutive_failures=settings.SERVICE_OUTLIER_CONSECUTIVE_FAILURES,
+            ejection_duration=settings.SERVICE_OUTLIER_EJECTION_DURATION,
+            max_ejected=settings.SERVICE_OUTLIER_MAX_EJECTED,
+        )
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    def update(self, endpoints: Iterable[URL]) -> None:
+        """
+        Replaces the endpoints, keeping what is known of the
+        endpoints that remain.
+        """
+        current = {e.key: e for e in self.endpoints}
+        updated = []
+        for url in endpoints:
+            endpoint = Endpoint(url)
+            updated.append(current.get(endpoint.key, endpoint))
+
+        if not updated:
+            raise ValueError("A load balancer needs at least one endpoint.")
+        self.endpoints = updated
+
+    def available(self) -> List[Endpoint]:
+        now = self.timer()
+        available = [e for e in self.endpoints if e.ejected_until <= now]
+        return available or self.endpoints
+
+    def acquire(self) -> Endpoint:
+        """
+        Picks the endpoint to send a request to. Every endpoint
+        acquired must be released.
+        """
+        available = self.available()
+        if len(available) == 1:
+            endpoint = available[0]
+        else:
+            first, second = random.sample(available, 2)
+            endpoint = first if first.cost() <= second.cost() else second
+
+        endpoint.outstanding += 1
+        return endpoint
+
+    def release(
+        self,
+        endpoint: Endpoint,
+        latency: Optional[float] = None,
+        *,
+        failed: bool = False,
+    ) -> None:
+        """
+        Records the result of a request to the endpoint.
+
+        :param endpoint: The endpoint that was acquired.
+        :param latency: The seconds the request took, if it finished.
+        :param failed: If the request failed with a connection or server error.
+        """
+        endpoint.outstanding = max(endpoint.outstanding - 1, 0)
+
+        if failed:
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.consecutive_failures:
+                self._eject(endpoint)
+        elif latency is not None:
+            endpoint.consecutive_failures = 0
+            self._observe(endpoint, latency)
+
+    def _observe(self, endpoint: Endpoint, latency: float) -> None:
+        now = self.timer()
+        if endpoint._updated_at is None or latency > endpoint.latency:
+            # be quick to notice an endpoint is getting slower
+            endpoint.latency = latency
+        else:
+            weight = math.exp(-(now - endpoint._updated_at) / self.decay)
+            endpoint.latency = endpoint.latency * weight + latency * (
+                1 - weight
+            )
+        endpoint._updated_at = now
+
+    def _eject(self, endpoint: Endpoint) -> None:
+        now = self.timer()
+        ejected = sum(
+            1
+            for e in self.endpoints
+            if e.ejected_until > now and e is not endpoint
+        )
+        if ejected + 1 > len(self.endpoints) * self.max_ejected:
+            return
+
+        endpoint.ejected_until = now + self.ejection_duration
+        endpoint.consecutive_failures = 0
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from typing import Any, Iterable, List, Optional, Tuple
+
+from insanic.conf import settings
+from insanic.exceptions import DeadlineExceeded
+from insanic.services.utils import deadline_remaining, set_context_deadline
+
+
+async def scatter_gather(
+    calls: Iterable[Tuple[Any, dict]],
+    *,
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> List[Any]:
+    """
+    Sends many requests, to one or more services, with at most
+    :code:`concurrency` of them in flight at once.
+
+    The results are returned in the order of the calls. A request that
+    failed has its exception in place of its result, so one failure
+    doesn't fail the others. After :code:`timeout` seconds, or the
+    deadline of the request being handled, the requests that haven't
+    finished are cancelled and have a :code:`DeadlineExceeded` instead.
+
+    >>> users, orders = await scatter_gather([
+    ...     (UserService, {"method": "GET", "endpoint": "/api/v1/users/1/"}),
+    ...     (OrderService, {"method": "GET", "endpoint": "/api/v1/orders/"}),
+    ... ])
+
+    :param calls: Pairs of a :code:`Service` and the arguments for its :code:`http_dispatch`.
+    :param concurrency: The most requests in flight at once. Defaults to :code:`SERVICE_DISPATCH_MANY_CONCURRENCY`.
+    :param timeout: Seconds to wait for all of the requests.
+    :return: The result or exception of each request.
+    """
+    if concurrency is None:
+        concurrency = settings.SERVICE_DISPATCH_MANY_CONCURRENCY
+
+    remaining = deadline_remaining()
+    if remaining is not None:
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def dispatch(service, kwargs: dict):
+        async with semaphore:
+            if deadline is not None:
+                # only sets the deadline in the context of this task
+                set_context_deadline(deadline - time.monotonic())
+            return await service.http_dispatch(**kwargs)
+
+    tasks = [
+        asyncio.ensure_future(dispatch(service, kwargs))
+        for service, kwargs in calls
+    ]
+    if not tasks:
+        return []
+
+    pending = set()
+    try:
+        done, pending = await asyncio.wait(
+            tasks, timeout=max(timeout, 0) if timeout is not None else None
+        )
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    results = []
+    for task in tasks:
+        if task in pending:
+            results.append(
+                DeadlineExceeded(
+                    description="The deadline passed before the request finished."
+                )
+            )
+        elif task.exception() is not None:
+            results.append(task.exception())
+        else:
+            results.append(task.result())
+    return results
@@ -0,0 +1,137 @@
+import asyncio
+
+from collections import deque
+from typing import Optional
+
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.exceptions import ServiceUnavailable503Error
+
+
+class BulkheadFull(ServiceUnavailable503Error):
+    """
+    Raised instead of sending a request when the bulkhead of
+    the service has no room for it.
+    """
+
+    error_code = GlobalErrorCodes.service_unavailable
+
+
+class Bulkhead:
+    """
+    Isolates the requests to a service from the requests to other
+    services, so a slow service can't take up all of the connections
+    and tasks of the application.
+
+    At most :code:`max_concurrency` requests are in flight to the
+    service. Up to :code:`max_queue` more wait for one of them to finish,
+    for at most :code:`max_wait` seconds. Requests beyond that are
+    rejected immediately.
+
+    :param name: The name of the service.
+    :param max_concurrency: The maximum number of requests in flight.
+    :param max_queue: The maximum number of requests waiting.
+    :param max_wait: Seconds a request waits before it is rejected, or :code:`None` to wait until there is room.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_concurrency: int,
+        max_queue: int = 0,
+        max_wait: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @classmethod
+    def from_settings(cls, name: str) -> Optional["Bulkhead"]:
+        """
+        The bulkhead for the service in :code:`SERVICE_BULKHEADS`,
+        or :code:`None` if it doesn't have one.
+        """
+        config = settings.SERVICE_BULKHEADS.get(name)
+        if not config:
+            return None
+
+        return cls(
+            name,
+            max_concurrency=config["MAX_CONCURRENCY"],
+            max_queue=config.get("MAX_QUEUE", 0),
+            max_wait=config.get("MAX_WAIT"),
+        )
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _full(self) -> BulkheadFull:
+        return BulkheadFull(
+            description=settings.SERVICE_UNAVAILABLE_MESSAGE.format(self.name)
+        )
+
+    async def acquire(self) -> None:
+        """
+        Waits until there is room for a request.
+
+        :raises BulkheadFull: If the queue is full or the request waited longer than :code:`max_wait`.
+        """
+        if self.in_flight < self.max_concurrency and not self.queued:
+            self.in_flight += 1
+            return
+
+        if self.queued >= self.max_queue:
+            raise self._full()
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            raise self._full()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """
+        Frees the slot of a request and hands it to the
+        next waiting request.
+        """
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.max_concurrency:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Awaits :code:`func` once there is room for it.
+        """
+        await self.acquire()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.release()
+
+
+_bulkheads = {}
+
+
+def get_bulkhead(name: str) -> Optional[Bulkhead]:
+    """
+    The bulkhead shared by all :code:`Service` objects of a service,
+    if it has one in :code:`SERVICE_BULKHEADS`.
+    """
+    if name not in _bulkheads:
+        _bulkheads[name] = Bulkhead.from_settings(name)
+    return _bulkheads[name]
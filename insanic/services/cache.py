@@ -0,0 +1,324 @@
+import hashlib
+import time
+import ujson as json
+
+from collections import OrderedDict
+from typing import Optional
+
+from httpx import Request, Response
+
+from insanic.connections import get_connection
+
+#: Status codes that can be stored by the response cache.
+CACHEABLE_STATUS_CODES = (200, 203)
+#: Headers that describe the transfer, not the (already decoded) content.
+EXCLUDED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+#: Seconds to keep stale entries that can be revalidated.
+VALIDATOR_RETENTION = 600
+
+CACHE_KEY_FORMAT = "insanic:service_response:%(service)s:%(key)s"
+
+
+def parse_cache_control(value: Optional[str]) -> dict:
+    """
+    Parses a :code:`Cache-Control` header into a dictionary of directives.
+    Directives without a value are set to :code:`True`.
+
+    >>> parse_cache_control("max-age=60, stale-if-error=300, public")
+    {"max-age": 60, "stale-if-error": 300, "public": True}
+    """
+    directives = {}
+
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+
+        argument = argument.strip().strip('"')
+        if not argument:
+            directives[name] = True
+        else:
+            try:
+                directives[name] = int(argument)
+            except ValueError:
+                directives[name] = argument
+
+    return directives
+
+
+class CachedResponse:
+    """
+    A response stored by :code:`ResponseCache` along with what is
+    needed to determine its freshness and to revalidate it.
+    """
+
+    __slots__ = (
+        "status_code",
+        "headers",
+        "content",
+        "stored_at",
+        "max_age",
+        "stale_while_revalidate",
+        "stale_if_error",
+        "etag",
+        "last_modified",
+        "vary",
+    )
+
+    def __init__(
+        self,
+        *,
+        status_code: int,
+        headers: list,
+        content: bytes,
+        stored_at: float,
+        max_age: int = 0,
+        stale_while_revalidate: int = 0,
+        stale_if_error: int = 0,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        vary: Optional[dict] = None,
+    ):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.stored_at = stored_at
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.etag = etag
+        self.last_modified = last_modified
+        self.vary = vary or {}
+
+    @classmethod
+    def from_response(
+        cls, response: Response, now: float
+    ) -> Optional["CachedResponse"]:
+        """
+        Creates an entry from a response or returns :code:`None`
+        if the response must not be stored.
+        """
+        if (
+            response.request.method != "GET"
+            or response.status_code not in CACHEABLE_STATUS_CODES
+        ):
+            return None
+
+        cache_control = parse_cache_control(
+            response.headers.get("cache-control")
+        )
+        vary = [
+            h.strip().lower()
+            for h in response.headers.get("vary", "").split(",")
+            if h.strip()
+        ]
+
+        # responses are shared between users in the worker
+        if "no-store" in cache_control or "private" in cache_control:
+            return None
+        if "*" in vary:
+            return None
+
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+
+        max_age = cache_control.get("s-maxage", cache_control.get("max-age"))
+        if not isinstance(max_age, int) or "no-cache" in cache_control:
+            max_age = 0
+
+        if max_age <= 0 and not (etag or last_modified):
+            return None
+
+        try:
+            age = max(int(response.headers.get("age", 0)), 0)
+        except ValueError:
+            age = 0
+
+        def directive(name):
+            value = cache_control.get(name, 0)
+            return value if isinstance(value, int) else 0
+
+        return cls(
+            status_code=response.status_code,
+            headers=[
+                [k, v]
+                for k, v in response.headers.items()
+                if k.lower() not in EXCLUDED_HEADERS
+            ],
+            content=response.content,
+            stored_at=now - age,
+            max_age=max_age,
+            stale_while_revalidate=directive("stale-while-revalidate"),
+            stale_if_error=directive("stale-if-error"),
+            etag=etag,
+            last_modified=last_modified,
+            vary={h: response.request.headers.get(h) for h in vary},
+        )
+
+    def age(self, now: float) -> float:
+        return now - self.stored_at
+
+    def is_fresh(self, now: float) -> bool:
+        return self.age(now) < self.max_age
+
+    def can_serve_while_revalidating(self, now: float) -> bool:
+        return self.age(now) < self.max_age + self.stale_while_revalidate
+
+    def can_serve_on_error(self, now: float) -> bool:
+        return self.age(now) < self.max_age + self.stale_if_error
+
+    @property
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    @property
+    def retention(self) -> float:
+        """
+        Number of seconds from when the response was stored
+        that the entry is of any use.
+        """
+        stale = max(self.stale_while_revalidate, self.stale_if_error)
+        if self.has_validators:
+            stale = max(stale, VALIDATOR_RETENTION)
+        return self.max_age + stale
+
+    def matches(self, request: Request) -> bool:
+        """
+        If the request has the same values for the headers
+        the response varies on.
+        """
+        return all(request.headers.get(h) == v for h, v in self.vary.items())
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["if-none-match"] = self.etag
+        if self.last_modified:
+            headers["if-modified-since"] = self.last_modified
+        return headers
+
+    def revalidated(self, response: Response, now: float) -> "CachedResponse":
+        """
+        Updates the freshness of the entry with the headers of a
+        :code:`304 Not Modified` response.
+        """
+        updated = self.from_response(
+            Response(
+                self.status_code,
+                request=response.request,
+                headers=self._merge_headers(response),
+                content=self.content,
+            ),
+            now,
+        )
+        return updated or self
+
+    def _merge_headers(self, response: Response) -> list:
+        updated = {k.lower() for k in response.headers.keys()}
+        headers = [[k, v] for k, v in self.headers if k.lower() not in updated]
+        headers.extend(
+            [k, v]
+            for k, v in response.headers.items()
+            if k.lower() not in EXCLUDED_HEADERS
+        )
+        return headers
+
+    def to_response(self, request: Request) -> Response:
+        return Response(
+            self.status_code,
+            request=request,
+            headers=self.headers,
+            content=self.content,
+        )
+
+    def to_dict(self) -> dict:
+        data = {k: getattr(self, k) for k in self.__slots__}
+        # latin-1 maps every byte to a code point so any content survives json
+        data["content"] = self.content.decode("latin-1")
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CachedResponse":
+        data["content"] = data["content"].encode("latin-1")
+        return cls(**data)
+
+
+class ResponseCache:
+    """
+    A bounded in process LRU cache of responses, optionally
+    backed by a redis cache alias shared between processes.
+
+    :param service_name: The name of the service the responses are from.
+    :param max_entries: The maximum number of responses kept in process.
+    :param alias: An optional cache alias to store responses in.
+    """
+
+    def __init__(
+        self,
+        service_name: str,
+        *,
+        max_entries: int = 1000,
+        alias: Optional[str] = None,
+    ):
+        self.service_name = service_name
+        self.max_entries = max_entries
+        self.alias = alias
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def timer() -> float:
+        return time.time()
+
+    def _cache_key(self, request: Request) -> str:
+        return CACHE_KEY_FORMAT % {
+            "service": self.service_name,
+            "key": hashlib.sha1(str(request.url).encode("utf-8")).hexdigest(),
+        }
+
+    async def get(self, request: Request) -> Optional[CachedResponse]:
+        key = self._cache_key(request)
+        entry = self._entries.get(key)
+
+        if entry is None and self.alias is not None:
+            redis = await get_connection(self.alias, key)
+            with await redis as conn:
+                data = await conn.get(key)
+            if data:
+                entry = CachedResponse.from_dict(json.loads(data))
+                self._store_local(key, entry)
+
+        if entry is None:
+            return None
+
+        if entry.age(self.timer()) >= entry.retention:
+            self._entries.pop(key, None)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry if entry.matches(request) else None
+
+    async def set(self, request: Request, entry: CachedResponse) -> None:
+        key = self._cache_key(request)
+        self._store_local(key, entry)
+
+        if self.alias is not None:
+            ttl = entry.retention - entry.age(self.timer())
+            if ttl <= 0:
+                return
+
+            redis = await get_connection(self.alias, key)
+            with await redis as conn:
+                await conn.set(
+                    key, json.dumps(entry.to_dict()), pexpire=int(ttl * 1000)
+                )
+
+    def _store_local(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.exceptions import ServiceUnavailable503Error
+from insanic.metrics import InsanicMetrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+#: The value of the state gauge for each state.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(ServiceUnavailable503Error):
+    """
+    Raised instead of sending a request while the circuit is open.
+    """
+
+    error_code = GlobalErrorCodes.service_unavailable
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a service that is failing or slow.
+
+    Calls are counted in one second buckets over a rolling window.
+    When the window has at least :code:`minimum_calls` and the rate of
+    failed or slow calls reaches its threshold, the circuit opens and
+    calls fail fast. After :code:`open_duration` seconds, the circuit
+    is half open and lets :code:`half_open_calls` trial calls through.
+    If all of them succeed the circuit closes, otherwise it opens again.
+
+    :param name: The name of the service, used as the metric label.
+    :param failure_rate_threshold: Rate of failed calls that opens the circuit.
+    :param slow_call_rate_threshold: Rate of slow calls that opens the circuit.
+    :param slow_call_duration: Seconds after which a call is slow.
+    :param window: Seconds of calls to consider.
+    :param minimum_calls: Number of calls in the window before the rates are considered.
+    :param open_duration: Seconds to fail fast before trying again.
+    :param half_open_calls: Number of trial calls when half open.
+    :param failure_exceptions: Exceptions raised by a call that count as failures.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_rate_threshold: float = 0.5,
+        slow_call_rate_threshold: float = 1.0,
+        slow_call_duration: float = 5.0,
+        window: int = 10,
+        minimum_calls: int = 20,
+        open_duration: float = 30.0,
+        half_open_calls: int = 5,
+        failure_exceptions: tuple = (Exception,),
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.window = max(int(window), 1)
+        self.minimum_calls = minimum_calls
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self.failure_exceptions = failure_exceptions
+
+        # each bucket is [second, calls, failures, slow calls]
+        self._buckets = [[0, 0, 0, 0] for _ in range(self.window)]
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self.state = CLOSED
+
+    @classmethod
+    def from_settings(cls, name: str, **kwargs) -> "CircuitBreaker":
+        return cls(
+            name,
+            failure_rate_threshold=settings.SERVICE_CIRCUIT_BREAKER_FAILURE_RATE,
+            slow_call_rate_threshold=settings.SERVICE_CIRCUIT_BREAKER_SLOW_CALL_RATE,
+            slow_call_duration=settings.SERVICE_CIRCUIT_BREAKER_SLOW_CALL_DURATION,
+            window=settings.SERVICE_CIRCUIT_BREAKER_WINDOW,
+            minimum_calls=settings.SERVICE_CIRCUIT_BREAKER_MINIMUM_CALLS,
+            open_duration=settings.SERVICE_CIRCUIT_BREAKER_OPEN_DURATION,
+            half_open_calls=settings.SERVICE_CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+            **kwargs,
+        )
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, value: str) -> None:
+        self._state = value
+        InsanicMetrics.CIRCUIT_BREAKER_STATE.labels(service=self.name).set(
+            STATE_VALUES[value]
+        )
+
+    def allow_request(self) -> bool:
+        """
+        If a call can be made. Half open calls are counted
+        as trial calls, so a call must follow.
+        """
+        if self.state == OPEN:
+            if self.timer() - self._opened_at < self.open_duration:
+                return False
+            self._half_open()
+
+        if self.state == HALF_OPEN:
+            if self._trial_calls >= self.half_open_calls:
+                return False
+            self._trial_calls += 1
+
+        return True
+
+    def check(self) -> None:
+        """
+        Raises :code:`CircuitOpenError` if a call can not be made.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(
+                description=settings.SERVICE_UNAVAILABLE_MESSAGE.format(
+                    self.name
+                )
+            )
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Awaits :code:`func` if the circuit allows it and records the result.
+        """
+        self.check()
+        start = self.timer()
+
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._release_trial()
+            raise
+        except Exception as e:
+            self.record(
+                self.timer() - start,
+                failed=isinstance(e, self.failure_exceptions),
+            )
+            raise
+
+        self.record(self.timer() - start, failed=False)
+        return result
+
+    def record(self, duration: float, failed: bool) -> None:
+        """
+        Records the result of a call.
+
+        :param duration: The seconds the call took.
+        :param failed: If the call failed.
+        """
+        slow = duration >= self.slow_call_duration
+
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._open()
+            else:
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_calls:
+                    self._close()
+            return
+
+        if self.state == OPEN:
+            return
+
+        second = int(self.timer())
+        bucket = self._buckets[second % self.window]
+        if bucket[0] != second:
+            bucket[:] = [second, 0, 0, 0]
+        bucket[1] += 1
+        bucket[2] += failed
+        bucket[3] += slow
+
+        calls, failures, slow_calls = self._totals(second)
+        if calls >= self.minimum_calls and (
+            failures / calls >= self.failure_rate_threshold
+            or slow_calls / calls >= self.slow_call_rate_threshold
+        ):
+            self._open()
+
+    def _totals(self, second: int) -> tuple:
+        calls = failures = slow_calls = 0
+        for bucket in self._buckets:
+            if second - bucket[0] < self.window:
+                calls += bucket[1]
+                failures += bucket[2]
+                slow_calls += bucket[3]
+        return calls, failures, slow_calls
+
+    def _release_trial(self) -> None:
+        # a cancelled call says nothing about the service
+        if self.state == HALF_OPEN and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def _open(self) -> None:
+        self._opened_at = self.timer()
+        self.state = OPEN
+
+    def _half_open(self) -> None:
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self.state = HALF_OPEN
+
+    def _close(self) -> None:
+        for bucket in self._buckets:
+            bucket[:] = [0, 0, 0, 0]
+        self.state = CLOSED
@@ -1,9 +1,14 @@
 import asyncio
+from functools import partial
 from json import JSONDecodeError
 
 import httpx
+import ipaddress
 import socket
-from httpx import URL, Headers, Request, codes, StatusCode
+import time
+import ujson
+from typing import Any, AsyncIterator, Iterable, Optional
+from httpx import URL, Headers, Request, Response, codes, StatusCode
 
 from insanic import exceptions, status
 from insanic.authentication.handlers import (
@@ -13,7 +18,6 @@ from insanic.authentication.handlers import (
 from insanic.conf import settings
 from insanic.errors import GlobalErrorCodes
 from insanic.log import error_logger
-from insanic.models import to_header_value
 from insanic.services.adapters import (
     Limits,
     Timeout,
@@ -27,9 +31,63 @@ from insanic.services.adapters import (
     NotRedirectResponse,
     CookieConflict,
     StreamError,
+    timeout_fields,
+)
+from insanic.services.balancer import LoadBalancer
+from insanic.services.batch import scatter_gather
+from insanic.services.bulkhead import Bulkhead, BulkheadFull, get_bulkhead
+from insanic.services.cache import CachedResponse, ResponseCache
+from insanic.services.circuitbreaker import CircuitBreaker, CircuitOpenError
+from insanic.services.concurrency import (
+    ConcurrencyLimiter,
+    ConcurrencyLimitExceeded,
+)
+from insanic.services.pool import get_transport
+from insanic.services.ratelimit import RateLimited, RateLimiter
+from insanic.services.resolver import get_resolver
+from insanic.services.retry import (
+    RetryBudget,
+    RetryPolicy,
+    parse_retry_after,
+)
+from insanic.services.stats import LatencyStats, endpoint_template
+from insanic.services.streaming import (
+    STREAM_FORMATS,
+    ProxyResponse,
+    iter_file,
+    iter_request_stream,
+    iter_response,
+)
+from insanic.services.utils import (
+    context_user_header,
+    context_correlation_id,
+    date_header,
+    deadline_remaining,
+)
+from insanic.utils.concurrency import SingleFlight
+
+#: Methods that are safe to share a single in flight request.
+COALESCE_METHODS = ("GET", "HEAD", "OPTIONS")
+#: Headers that differ on every request and don't affect the response.
+COALESCE_IGNORED_HEADERS = ("date",)
+#: Methods that are safe to send twice when hedging.
+HEDGE_METHODS = ("GET", "HEAD", "OPTIONS")
+#: The number of latencies of an endpoint needed to hedge after a percentile.
+HEDGE_MIN_SAMPLES = 20
+#: The number of latencies of an endpoint needed to derive its timeout.
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 100
+#: Headers that are not forwarded by a proxy, in either direction.
+PROXY_HOP_BY_HOP_HEADERS = (
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "content-length",
 )
-from insanic.services.utils import context_user, context_correlation_id
-from insanic.utils.datetime import get_utc_datetime
 
 
 class Service:
@@ -41,6 +99,7 @@ class Service:
     """
 
     _client = None
+    _response_cache = None
 
     def __init__(self, service_name: str, partial_path: str = None):
 
@@ -55,6 +114,21 @@ class Service:
             f"{settings.SERVICE_GLOBAL_HOST_TEMPLATE.format(self.service_name)}"
             f":{settings.SERVICE_GLOBAL_PORT}{partial_path}"
         )
+        self._in_flight = SingleFlight()
+        self._circuit_breaker = None
+        self._concurrency_limiter = None
+        self._rate_limiter = None
+        self._retry_policy = None
+        self._balancer = None
+        self._resolved_balancer = None
+        self._resolved_addresses = None
+        self.hedge_budget = RetryBudget(
+            ratio=settings.SERVICE_HEDGE_BUDGET_RATIO,
+            min_per_second=settings.SERVICE_HEDGE_BUDGET_MIN_PER_SECOND,
+        )
+        self.latencies = LatencyStats()
+        self._user_header = settings.INTERNAL_REQUEST_USER_HEADER.lower()
+        self._request_id_header = settings.REQUEST_ID_HEADER_FIELD.lower()
         super().__init__()
 
     @property
@@ -78,6 +152,8 @@ class Service:
             self._client = AsyncClient(
                 limits=limits,
                 timeout=timeout,
+                http2=settings.SERVICE_HTTP2,
+                transport=get_transport(),
                 base_url=self.url,
                 headers={
                     "authorization": f"{settings.JWT_SERVICE_AUTH_AUTH_HEADER_PREFIX} {self.service_token}"
@@ -85,6 +161,102 @@ class Service:
             )
         return self._client
 
+    @property
+    def response_cache(self) -> ResponseCache:
+        """
+        The cache for responses from this service that allow caching.
+        """
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(
+                self.service_name,
+                max_entries=settings.SERVICE_RESPONSE_CACHE_MAX_ENTRIES,
+                alias=settings.SERVICE_RESPONSE_CACHE_ALIAS,
+            )
+        return self._response_cache
+
+    @property
+    def circuit_breaker(self) -> Optional[CircuitBreaker]:
+        """
+        The circuit breaker for requests to this service if
+        :code:`SERVICE_CIRCUIT_BREAKER` is enabled.
+        """
+        if self._circuit_breaker is None and settings.SERVICE_CIRCUIT_BREAKER:
+            self._circuit_breaker = CircuitBreaker.from_settings(
+                self.service_name,
+                failure_exceptions=(
+                    TransportError,
+                    HTTPStatusError,
+                    ConnectionResetError,
+                ),
+            )
+        return self._circuit_breaker
+
+    @property
+    def bulkhead(self) -> Optional[Bulkhead]:
+        """
+        The bulkhead for requests to this service if it has one in
+        :code:`SERVICE_BULKHEADS`. It is shared by all :code:`Service`
+        objects of the service.
+        """
+        return get_bulkhead(self.service_name)
+
+    @property
+    def concurrency_limiter(self) -> Optional[ConcurrencyLimiter]:
+        """
+        The adaptive limit of requests in flight to this service if
+        :code:`SERVICE_CONCURRENCY_LIMIT` is enabled.
+        """
+        if (
+            self._concurrency_limiter is None
+            and settings.SERVICE_CONCURRENCY_LIMIT
+        ):
+            self._concurrency_limiter = ConcurrencyLimiter.from_settings(
+                self.service_name, drop_exceptions=(httpx.TimeoutException,),
+            )
+        return self._concurrency_limiter
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        """
+        The rate limit of requests to this service if
+        :code:`SERVICE_RATE_LIMIT` is enabled or it has one in
+        :code:`SERVICE_RATE_LIMITS`.
+        """
+        if self._rate_limiter is None and (
+            settings.SERVICE_RATE_LIMIT
+            or self.service_name in settings.SERVICE_RATE_LIMITS
+        ):
+            self._rate_limiter = RateLimiter.from_settings(self.service_name)
+        return self._rate_limiter
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        """
+        The policy for retrying failed requests to this service.
+        """
+        if self._retry_policy is None:
+            self._retry_policy = RetryPolicy.from_settings()
+        return self._retry_policy
+
+    @property
+    def balancer(self) -> Optional[LoadBalancer]:
+        """
+        The load balancer between the endpoints of this service
+        if they are set in :code:`SERVICE_ENDPOINTS`.
+        """
+        if self._balancer is None:
+            endpoints = settings.SERVICE_ENDPOINTS.get(self.service_name)
+            if endpoints:
+                self._balancer = LoadBalancer.from_settings(
+                    [self._endpoint_url(e) for e in endpoints]
+                )
+        return self._balancer
+
+    def _endpoint_url(self, endpoint: str) -> URL:
+        if "://" not in endpoint:
+            endpoint = f"{self.url.scheme}://{endpoint}"
+        return URL(endpoint)
+
     @property
     def host(self) -> str:
         """
@@ -115,30 +287,110 @@ class Service:
             await self._client.aclose()
             await asyncio.sleep(0)
 
+    async def prewarm(self, connections: int) -> int:
+        """
+        Opens connections to the service before they are needed by
+        sending concurrent pings to each of its endpoints. The
+        connections are kept alive in the client's pool, up to
+        :code:`SERVICE_CONNECTOR_MAX_KEEPALIVE` of them.
+
+        :param connections: The number of connections to open to each endpoint.
+        :return: The number of pings that received a response.
+        """
+        request = self.client.build_request(
+            "GET",
+            f"/{self.service_name}/ping/",
+            headers=self._inject_headers({}),
+        )
+        try:
+            balancer = await self._current_balancer(request)
+        except socket.gaierror as e:
+            error_logger.warning(
+                f"Pre-warming connections to {self.service_name} failed: {e}"
+            )
+            return 0
+
+        requests = (
+            [endpoint.route(request) for endpoint in balancer.endpoints]
+            if balancer is not None
+            else [request]
+        )
+        connections = min(connections, settings.SERVICE_CONNECTOR_MAX_KEEPALIVE)
+
+        responses = await asyncio.gather(
+            *[
+                self.client.send(r)
+                for r in requests
+                for _ in range(connections)
+            ],
+            return_exceptions=True,
+        )
+
+        errors = [r for r in responses if isinstance(r, Exception)]
+        if errors:
+            error_logger.warning(
+                f"Pre-warming {len(errors)} of {len(responses)} connections "
+                f"to {self.service_name} failed: {errors[0]!r}"
+            )
+        return len(responses) - len(errors)
+
     def _inject_headers(self, headers: dict):
         # need to coerce to str
-        headers = {k: str(v) for k, v in headers.items()}
-        headers.update(
-            {"date": get_utc_datetime().strftime("%a, %d %b %y %T %z")}
-        )
+        headers = {
+            k: v if isinstance(v, str) else str(v) for k, v in headers.items()
+        }
+        headers["date"] = date_header()
 
         # inject user information to request headers
-        user = context_user()
-        headers.update(
-            {
-                settings.INTERNAL_REQUEST_USER_HEADER.lower(): to_header_value(
-                    user
-                )
-            }
-        )
+        headers[self._user_header] = context_user_header()
         # inject correlation_id
-        correlation_id = context_correlation_id()
-        headers.update(
-            {settings.REQUEST_ID_HEADER_FIELD.lower(): correlation_id}
-        )
+        headers[self._request_id_header] = context_correlation_id()
+        # forward the time left until the deadline
+        remaining = deadline_remaining()
+        if remaining is not None:
+            self._inject_deadline(headers, remaining)
 
         return Headers(headers)
 
+    def _inject_deadline(self, headers, remaining: float) -> None:
+        headers[settings.INTERNAL_REQUEST_DEADLINE_HEADER.lower()] = str(
+            max(int(remaining * 1000), 0)
+        )
+
+    def _deadline_timeout(self, request: Request, timeout):
+        """
+        The timeout of an attempt, or each of the timeouts of a
+        :code:`Timeout`, clipped to the time left until the deadline of
+        the request being handled. The time left is also updated in the
+        headers of the request.
+
+        :raises DeadlineExceeded: If the deadline has passed.
+        """
+        remaining = deadline_remaining()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise exceptions.DeadlineExceeded(
+                description=f"The deadline passed before the request to "
+                f"{self.service_name} could be sent."
+            )
+        self._inject_deadline(request.headers, remaining)
+
+        if timeout is UNSET:
+            timeout = settings.SERVICE_TIMEOUT_TOTAL
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, (int, float)):
+            return min(timeout, remaining)
+        if isinstance(timeout, httpx.Timeout):
+            return Timeout(
+                **{
+                    field: remaining if value is None else min(value, remaining)
+                    for field, value in timeout_fields(timeout).items()
+                }
+            )
+        return timeout
+
     def http_dispatch(
         self,
         method: str,
@@ -146,12 +398,19 @@ class Service:
         *,
         query_params: dict = None,
         payload: dict = None,
+        json: Any = None,
+        content: Any = None,
         files: dict = None,
         headers: dict = None,
         propagate_error: bool = False,
         include_status_code: bool = False,
         response_timeout: int = UNSET,
         retry_count: int = None,
+        coalesce: bool = None,
+        use_cache: bool = None,
+        hedge: bool = None,
+        stream: str = None,
+        max_body_size: int = None,
         **kwargs,
     ):
         """
@@ -160,29 +419,71 @@ class Service:
         :param method: method to send request (GET, POST, PATCH, PUT, etc)
         :param endpoint: the path to send request to (eg /api/v1/..)
         :param query_params: query params to attach to url
-        :param payload: the data to send on any non GET requests
+        :param payload: the data to send on any non GET requests, can't be combined with :code:`json` or :code:`content`
+        :param json: the body to send as json, or json that is already encoded as bytes
+        :param content: the body to send as is, as bytes, an async iterator of bytes or a file. Requests with a body from an iterator or file are not retried.
         :param files: if any files to send with request, must be included here
         :param headers: headers to send along with request
         :param propagate_error: if you want to raise on 400 or greater status codes
         :param include_status_code: if you want this method to return the response with the status code
         :param response_timeout: if you want to increase the timeout for this requests
         :param retry_count: number times you want to retry the request if failed on server errors
+        :param coalesce: if identical requests in flight should share a single response. Defaults to :code:`SERVICE_COALESCE_REQUESTS`.
+        :param use_cache: if GET responses should be cached according to their Cache-Control headers. Defaults to :code:`SERVICE_RESPONSE_CACHE`.
+        :param hedge: if a second request should be sent when the first is slow. Defaults to :code:`SERVICE_HEDGE_REQUESTS`.
+        :param stream: to iterate over the response body as it arrives instead of awaiting it, in chunks of :code:`bytes`, records of :code:`ndjson` or items of a :code:`json` array
+        :param max_body_size: the most bytes a streamed response can have. Defaults to :code:`SERVICE_STREAM_MAX_BODY_SIZE`.
         """
+        if stream is not None and stream not in STREAM_FORMATS:
+            raise ValueError(
+                f"stream must be one of {', '.join(STREAM_FORMATS)}."
+            )
+
+        if json is not None or content is not None:
+            if payload:
+                raise ValueError("payload can't be sent with json or content.")
+        else:
+            payload = payload or {}
 
         files = files or {}
         query_params = query_params or {}
-        payload = payload or {}
         headers = self._inject_headers(headers or {})
 
+        if json is not None:
+            if not isinstance(json, (bytes, bytearray)):
+                json = ujson.dumps(json).encode()
+            content = json
+            headers.setdefault("content-type", "application/json")
+        elif hasattr(content, "read"):
+            content = iter_file(content)
+
+        if content is not None and not isinstance(
+            content, (bytes, bytearray, str)
+        ):
+            # a streamed body can only be sent once
+            retry_count = 0
+            hedge = False
+
         request = self.client.build_request(
             method,
             endpoint,
+            content=content,
             data=payload,
             files=files,
             params=query_params,
             headers=headers,
         )
 
+        if stream is not None:
+            return self._dispatch_stream(
+                request,
+                stream=stream,
+                max_body_size=max_body_size,
+                response_timeout=response_timeout,
+                retry_count=retry_count,
+                **kwargs,
+            )
+
         return asyncio.ensure_future(
             self._dispatch_future(
                 request,
@@ -190,10 +491,135 @@ class Service:
                 response_timeout=response_timeout,
                 include_status_code=include_status_code,
                 retry_count=retry_count,
+                coalesce=coalesce,
+                use_cache=use_cache,
+                hedge=hedge,
                 **kwargs,
             )
         )
 
+    async def dispatch_many(
+        self,
+        requests: Iterable[dict],
+        *,
+        concurrency: int = None,
+        timeout: float = None,
+    ) -> list:
+        """
+        Sends many requests to the service with at most
+        :code:`concurrency` of them in flight at once.
+
+        >>> results = await UserService.dispatch_many(
+        ...     [{"method": "GET", "endpoint": f"/api/v1/users/{i}/"} for i in ids]
+        ... )
+
+        :param requests: the arguments for :code:`http_dispatch` of each request
+        :param concurrency: the most requests in flight at once. Defaults to :code:`SERVICE_DISPATCH_MANY_CONCURRENCY`.
+        :param timeout: seconds to wait for all of the requests
+        :return: the result of each request in order, or its exception if it failed or didn't finish in time
+        """
+        return await scatter_gather(
+            [(self, kwargs) for kwargs in requests],
+            concurrency=concurrency,
+            timeout=timeout,
+        )
+
+    async def proxy(
+        self,
+        request,
+        endpoint: str = None,
+        *,
+        method: str = None,
+        headers: dict = None,
+        response_timeout: int = UNSET,
+    ) -> ProxyResponse:
+        """
+        Forwards a request received by this application to the service,
+        and returns the response of the service to send back. Neither
+        body is held in memory, as they are streamed through as they
+        arrive. Error responses of the service are passed through as
+        they are. The user and correlation id of the request are
+        injected like for any other request to the service.
+
+        >>> @app.route("/api/v1/users/<path:path>", stream=True)
+        ... async def users(request, path):
+        ...     return await UserService.proxy(request)
+
+        :param request: the Sanic request to forward, from a route with :code:`stream=True` to stream its body
+        :param endpoint: the path to send the request to. Defaults to the path of the request.
+        :param method: the method to send the request with. Defaults to the method of the request.
+        :param headers: headers to send in addition to those of the request
+        :param response_timeout: if you want to increase the timeout for this request
+        """
+        ignored_headers = PROXY_HOP_BY_HOP_HEADERS + (
+            "host",
+            "authorization",
+            "date",
+            settings.INTERNAL_REQUEST_USER_HEADER.lower(),
+            settings.REQUEST_ID_HEADER_FIELD.lower(),
+            settings.INTERNAL_REQUEST_DEADLINE_HEADER.lower(),
+        )
+        forwarded_headers = {
+            k: v
+            for k, v in request.headers.items()
+            if k.lower() not in ignored_headers
+        }
+        forwarded_headers.update(headers or {})
+
+        if request.stream is not None:
+            content = iter_request_stream(request.stream)
+        else:
+            content = request.body or None
+
+        proxy_request = self.client.build_request(
+            method or request.method,
+            endpoint or request.path,
+            content=content,
+            params=request.query_string or None,
+            headers=self._inject_headers(forwarded_headers),
+        )
+
+        response = await self._dispatch_future(
+            proxy_request,
+            stream=True,
+            response_timeout=response_timeout,
+            retry_count=0 if request.stream is not None else None,
+            hedge=False,
+        )
+
+        return ProxyResponse(
+            response,
+            status=response.status_code,
+            headers={
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() not in PROXY_HOP_BY_HOP_HEADERS
+                and k.lower() != "content-type"
+            },
+            content_type=response.headers.get(
+                "content-type", "application/octet-stream"
+            ),
+        )
+
+    def _coalesce_key(self, request: Request) -> tuple:
+        """
+        Identical requests have the same method, url and headers
+        (including the user context), except for headers that differ on
+        every request.
+        """
+        ignored_headers = COALESCE_IGNORED_HEADERS + (
+            settings.REQUEST_ID_HEADER_FIELD.lower(),
+            settings.INTERNAL_REQUEST_DEADLINE_HEADER.lower(),
+        )
+        headers = tuple(
+            sorted(
+                (k, v)
+                for k, v in request.headers.items()
+                if k.lower() not in ignored_headers
+            )
+        )
+        return request.method, str(request.url), headers
+
     async def _dispatch_future(
         self,
         request,
@@ -202,6 +628,10 @@ class Service:
         response_timeout: float = None,
         include_status_code: bool = False,
         retry_count: int = None,
+        coalesce: bool = None,
+        use_cache: bool = None,
+        hedge: bool = None,
+        stream: bool = False,
         **kwargs,
     ):
         """
@@ -212,19 +642,30 @@ class Service:
         :param response_timeout:
         :param include_status_code:
         :param retry_count:
+        :param coalesce:
+        :param use_cache:
+        :param hedge:
+        :param stream: to return the response before its body is read
         :param kwargs:
         :return:
         """
 
         try:
-            resp = await asyncio.shield(
-                self._dispatch_send(
-                    request=request,
-                    timeout=response_timeout,
-                    retry_count=retry_count,
-                )
+            resp = await self._send(
+                request,
+                timeout=response_timeout,
+                retry_count=retry_count,
+                coalesce=coalesce,
+                use_cache=use_cache,
+                hedge=hedge,
+                stream=stream,
             )
 
+            if stream:
+                return await self._raise_for_stream_status(
+                    resp, propagate_error
+                )
+
             if propagate_error:
                 resp.raise_for_status()
             response = resp.json()
@@ -336,42 +777,484 @@ class Service:
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
 
+    async def _raise_for_stream_status(
+        self, response: Response, propagate_error: bool
+    ) -> Response:
+        """
+        Raises for an error response to a streamed request if
+        :code:`propagate_error`, after reading its body for the error.
+        """
+        if propagate_error and response.is_error:
+            await response.aread()
+            response.raise_for_status()
+        return response
+
+    async def _dispatch_stream(
+        self,
+        request: Request,
+        *,
+        stream: str,
+        max_body_size: int = None,
+        **kwargs,
+    ) -> AsyncIterator[Any]:
+        """
+        Iterates over the body of the response as it arrives. The
+        response is closed once the iteration finishes or is closed.
+
+        :param request:
+        :param stream: the format of the body in :code:`STREAM_FORMATS`
+        :param max_body_size: the most bytes the body can have
+        :param kwargs: the arguments for :code:`_dispatch_future`
+        """
+        if max_body_size is None:
+            max_body_size = settings.SERVICE_STREAM_MAX_BODY_SIZE
+
+        response = await self._dispatch_future(
+            request, stream=True, propagate_error=True, **kwargs
+        )
+        try:
+            async for item in iter_response(
+                response.aiter_bytes(), stream, max_body_size
+            ):
+                yield item
+        except httpx.TimeoutException as e:
+            raise exceptions.ResponseTimeoutError(
+                description=str(e),
+                error_code=GlobalErrorCodes.service_timeout,
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        except HTTPError as e:
+            raise exceptions.APIException(
+                description=str(e),
+                error_code=GlobalErrorCodes.stream_error,
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        finally:
+            await response.aclose()
+
+    async def _send(
+        self,
+        request: Request,
+        *,
+        timeout: float = None,
+        retry_count: int = None,
+        coalesce: bool = None,
+        use_cache: bool = None,
+        hedge: bool = None,
+        stream: bool = False,
+    ) -> Response:
+        """
+        Sends the request through the response cache and
+        request coalescing if they are enabled. Streamed
+        requests are neither cached, coalesced nor hedged.
+        """
+        if stream:
+            try:
+                return await self._dispatch_send(
+                    request,
+                    timeout=timeout,
+                    retry_count=retry_count,
+                    hedge=False,
+                    stream=True,
+                )
+            except HTTPStatusError as e:
+                # returned unread like any other error response
+                return e.response
+
+        if coalesce is None:
+            coalesce = settings.SERVICE_COALESCE_REQUESTS
+        if use_cache is None:
+            use_cache = settings.SERVICE_RESPONSE_CACHE
+
+        send = partial(
+            self._dispatch_send,
+            timeout=timeout,
+            retry_count=retry_count,
+            hedge=hedge,
+        )
+
+        if use_cache and request.method == "GET":
+            send = partial(self._cached_send, send=send)
+
+        if coalesce and request.method in COALESCE_METHODS:
+            return await self._in_flight.do(
+                self._coalesce_key(request), send, request=request
+            )
+
+        return await asyncio.shield(send(request=request))
+
+    async def _cached_send(self, request: Request, *, send) -> Response:
+        """
+        Serves the response from the response cache if it is fresh.
+        Otherwise the request is sent, conditionally if the cached
+        response can be revalidated.
+        """
+        entry = await self.response_cache.get(request)
+
+        if entry is not None:
+            now = self.response_cache.timer()
+            if entry.is_fresh(now):
+                return entry.to_response(request)
+
+            request.headers.update(entry.conditional_headers())
+
+            if entry.can_serve_while_revalidating(now):
+                asyncio.ensure_future(
+                    self._background_revalidate(request, send, entry)
+                )
+                return entry.to_response(request)
+
+        return await self._revalidate(request, send, entry)
+
+    async def _revalidate(
+        self, request: Request, send, entry: CachedResponse = None
+    ) -> Response:
+        try:
+            response = await send(request=request)
+        except (
+            TransportError,
+            HTTPStatusError,
+            ConnectionResetError,
+            CircuitOpenError,
+            ConcurrencyLimitExceeded,
+            BulkheadFull,
+            RateLimited,
+        ):
+            if entry is not None and entry.can_serve_on_error(
+                self.response_cache.timer()
+            ):
+                return entry.to_response(request)
+            raise
+
+        now = self.response_cache.timer()
+
+        if response.status_code == status.HTTP_304_NOT_MODIFIED and entry:
+            entry = entry.revalidated(response, now)
+            await self.response_cache.set(request, entry)
+            return entry.to_response(request)
+
+        new_entry = CachedResponse.from_response(response, now)
+        if new_entry is not None:
+            await self.response_cache.set(request, new_entry)
+
+        return response
+
+    async def _background_revalidate(
+        self, request: Request, send, entry: CachedResponse
+    ) -> None:
+        try:
+            await self._in_flight.do(
+                ("revalidate", str(request.url)),
+                self._revalidate,
+                request,
+                send,
+                entry,
+            )
+        except Exception as e:
+            error_logger.info(
+                f"Revalidating {request.method} {request.url} failed: {e}"
+            )
+
     async def _dispatch_send(
         self,
         request: Request,
         *,
         timeout: float = None,
         retry_count: int = None,
+        hedge: bool = None,
+        stream: bool = False,
     ):
         """
-
-        TODO: need better implementation for retry
+        Sends the request, retrying failed attempts according to
+        the retry policy of the service.
 
         :param request:
         :param timeout:
-        :param retry_count:
+        :param retry_count: the number of retries, capped by :code:`SERVICE_CONNECTION_MAX_RETRY_COUNT`
+        :param hedge: if attempts should be hedged
+        :param stream: to return the response before its body is read
         """
-        attempts = 1
-        if request.method == "GET":
-            attempts += (
-                settings.SERVICE_CONNECTION_DEFAULT_RETRY_COUNT
-                if retry_count is None
-                else min(
-                    retry_count,
-                    int(settings.SERVICE_CONNECTION_MAX_RETRY_COUNT),
-                )
-            )
+        policy = self.retry_policy
+        attempts = policy.attempts(request.method, retry_count)
+        policy.budget.deposit()
+
+        if hedge is None:
+            hedge = settings.SERVICE_HEDGE_REQUESTS
+        hedge_delay = None
+        if hedge and request.method in HEDGE_METHODS:
+            self.hedge_budget.deposit()
+            hedge_delay = self._hedge_delay(request)
 
+        timeout = self._endpoint_timeout(request, timeout)
         for i in range(attempts):
+            attempt_timeout = self._deadline_timeout(request, timeout)
             try:
-                response = await self.client.send(request, timeout=timeout)
-
-                if codes.is_server_error(response.status_code):
-                    response.raise_for_status()
-
+                if hedge_delay is None:
+                    response = await self._send_attempt(
+                        request, timeout=attempt_timeout, stream=stream
+                    )
+                else:
+                    response = await self._send_hedged(
+                        request, timeout=attempt_timeout, delay=hedge_delay
+                    )
             except (TransportError, HTTPStatusError, ConnectionResetError) as e:
                 error_logger.debug(f"{str(e)} on attempt {i}")
-                if i + 1 >= attempts:
+                delay = self._retry_delay(policy, i, attempts, e)
+                if delay is None:
                     raise
+                if stream and isinstance(e, HTTPStatusError):
+                    await e.response.aclose()
             else:
-                return response
+                # server errors raise, other statuses like 429 are retried here
+                if response.status_code not in policy.status_codes:
+                    return response
+
+                error = HTTPStatusError(
+                    f"{response.status_code} on attempt {i}",
+                    request=request,
+                    response=response,
+                )
+                error_logger.debug(str(error))
+                delay = self._retry_delay(policy, i, attempts, error)
+                if delay is None:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(delay)
+
+    def _retry_delay(
+        self, policy: RetryPolicy, attempt: int, attempts: int, exc: Exception
+    ) -> Optional[float]:
+        """
+        The seconds to wait before retrying a failed attempt, or
+        :code:`None` if it must not be retried. A retry withdraws
+        from the retry budget.
+        """
+        if attempt + 1 >= attempts or not policy.is_retryable(exc):
+            return None
+
+        delay = policy.backoff(attempt, exc)
+        remaining = deadline_remaining()
+        if delay is None or (remaining is not None and delay >= remaining):
+            # the retry would be after the deadline
+            return None
+        if not policy.budget.withdraw():
+            return None
+        return delay
+
+    def _latency_key(self, request: Request) -> tuple:
+        return request.method, endpoint_template(request.url.path)
+
+    def _endpoint_timeout(self, request: Request, timeout):
+        """
+        The timeout for the endpoint of the request, if one wasn't
+        given. From :code:`SERVICE_ENDPOINT_TIMEOUTS` if it is set for
+        the endpoint, or else derived from the endpoint's latencies with
+        :code:`SERVICE_ADAPTIVE_TIMEOUT`.
+        """
+        overrides = settings.SERVICE_ENDPOINT_TIMEOUTS.get(self.service_name)
+        if timeout is not UNSET or not (
+            overrides or settings.SERVICE_ADAPTIVE_TIMEOUT
+        ):
+            return timeout
+
+        key = self._latency_key(request)
+        if overrides:
+            method, template = key
+            for endpoint in (f"{method} {template}", template):
+                if endpoint in overrides:
+                    return overrides[endpoint]
+
+        if not settings.SERVICE_ADAPTIVE_TIMEOUT:
+            return timeout
+
+        latency = self.latencies.percentile(
+            key,
+            settings.SERVICE_ADAPTIVE_TIMEOUT_PERCENTILE,
+            min_samples=ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+        )
+        if latency is None:
+            return timeout
+
+        maximum = (
+            settings.SERVICE_ADAPTIVE_TIMEOUT_MAX
+            or settings.SERVICE_TIMEOUT_TOTAL
+        )
+        return min(
+            max(
+                latency * settings.SERVICE_ADAPTIVE_TIMEOUT_FACTOR,
+                settings.SERVICE_ADAPTIVE_TIMEOUT_MIN,
+            ),
+            maximum,
+        )
+
+    def _hedge_delay(self, request: Request) -> Optional[float]:
+        """
+        The seconds to wait for a response before sending a hedged
+        request, or :code:`None` if the endpoint's latency is unknown.
+        """
+        if settings.SERVICE_HEDGE_DELAY is not None:
+            return settings.SERVICE_HEDGE_DELAY
+
+        return self.latencies.percentile(
+            self._latency_key(request),
+            settings.SERVICE_HEDGE_PERCENTILE,
+            min_samples=HEDGE_MIN_SAMPLES,
+        )
+
+    async def _send_hedged(
+        self, request: Request, *, timeout: float = None, delay: float
+    ) -> Response:
+        """
+        Sends the request and, if there is no response after
+        :code:`delay` seconds and the hedging budget allows it, sends
+        it again. The first successful response is returned and the
+        other request is cancelled.
+        """
+        done = set()
+        pending = {
+            asyncio.ensure_future(self._send_attempt(request, timeout=timeout))
+        }
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self.hedge_budget.withdraw():
+                pending.add(
+                    asyncio.ensure_future(
+                        self._send_attempt(request, timeout=timeout)
+                    )
+                )
+
+            while True:
+                if not done:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                task = done.pop()
+                if not pending or task.exception() is None:
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in done:
+                # both may have finished, the other's error is not needed
+                if not task.cancelled():
+                    task.exception()
+
+    async def _send_attempt(
+        self, request: Request, *, timeout: float = None, stream: bool = False
+    ) -> Response:
+        send = self._send_balanced
+        if self.circuit_breaker is not None:
+            send = partial(self.circuit_breaker.call, send)
+        # requests rejected by the limit are not calls for the circuit breaker
+        if self.concurrency_limiter is not None:
+            send = partial(self.concurrency_limiter.call, send)
+        if self.bulkhead is not None:
+            send = partial(self.bulkhead.call, send)
+
+        rate_limiter = self.rate_limiter
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+
+        response = await send(request, timeout=timeout, stream=stream)
+        if (
+            rate_limiter is not None
+            and response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        ):
+            rate_limiter.backoff(
+                parse_retry_after(response.headers.get("retry-after"))
+            )
+        return response
+
+    async def _send_balanced(
+        self, request: Request, *, timeout: float = None, stream: bool = False
+    ) -> Response:
+        """
+        Sends the request to one of the endpoints of the service
+        if it has more than the one url.
+        """
+        # the time waiting for the limits is charged against the deadline
+        timeout = self._deadline_timeout(request, timeout)
+        balancer = await self._current_balancer(request)
+        if balancer is None:
+            return await self._send_once(
+                request, timeout=timeout, stream=stream
+            )
+
+        endpoint = balancer.acquire()
+        start = time.monotonic()
+        latency = None
+        failed = False
+        try:
+            response = await self._send_once(
+                endpoint.route(request), timeout=timeout, stream=stream
+            )
+            latency = time.monotonic() - start
+            return response
+        except (TransportError, HTTPStatusError, ConnectionResetError):
+            failed = True
+            raise
+        finally:
+            balancer.release(endpoint, latency, failed=failed)
+
+    async def _current_balancer(
+        self, request: Request
+    ) -> Optional[LoadBalancer]:
+        """
+        The load balancer between the endpoints in
+        :code:`SERVICE_ENDPOINTS` or, with :code:`SERVICE_DNS_CACHE`,
+        between the resolved addresses of the service's host.
+        """
+        if self.balancer is not None:
+            return self.balancer
+
+        if not settings.SERVICE_DNS_CACHE:
+            return None
+
+        url = request.url
+        # the address can only replace the host if it isn't needed for tls
+        if url.scheme != "http":
+            return None
+
+        try:
+            ipaddress.ip_address(url.host)
+        except ValueError:
+            pass
+        else:
+            return None
+
+        addresses = await get_resolver().resolve(url.host, url.port)
+        endpoints = [url.copy_with(host=address) for address in addresses]
+
+        if self._resolved_balancer is None:
+            self._resolved_balancer = LoadBalancer.from_settings(endpoints)
+        elif addresses != self._resolved_addresses:
+            self._resolved_balancer.update(endpoints)
+        self._resolved_addresses = addresses
+
+        return self._resolved_balancer
+
+    async def _send_once(
+        self, request: Request, *, timeout: float = None, stream: bool = False
+    ) -> Response:
+        # the latency of the send alone, without waiting for the limits
+        start = time.monotonic()
+        try:
+            response = await self.client.send(
+                request, timeout=timeout, stream=stream
+            )
+        except httpx.TimeoutException:
+            # a timed out attempt took at least its timeout, which lets
+            # the adaptive timeout grow when the endpoint slows down
+            latency = time.monotonic() - start
+            if isinstance(timeout, (int, float)):
+                latency = max(latency, timeout)
+            self.latencies.add(self._latency_key(request), latency)
+            raise
+
+        if codes.is_server_error(response.status_code):
+            # the body of a streamed response is left for the caller
+            response.raise_for_status()
+
+        self.latencies.add(self._latency_key(request), time.monotonic() - start)
+        return response
@@ -0,0 +1,210 @@
+import asyncio
+import math
+import time
+
+from collections import deque
+
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.exceptions import ServiceUnavailable503Error
+from insanic.metrics import InsanicMetrics
+
+
+class ConcurrencyLimitExceeded(ServiceUnavailable503Error):
+    """
+    Raised instead of sending a request when the service has as many
+    requests in flight as its limit and the request waited too long.
+    """
+
+    error_code = GlobalErrorCodes.service_unavailable
+
+
+class ConcurrencyLimiter:
+    """
+    Limits the number of requests in flight to a service and adapts
+    the limit to the latency of the service.
+
+    While the latency stays within :code:`tolerance` of its long term
+    average, the service isn't queueing requests and the limit grows.
+    When the latency rises above it, the limit shrinks in proportion, so
+    a slow service gets fewer requests instead of more and more of them.
+    Requests that fail with one of :code:`drop_exceptions`, like
+    timeouts, shrink the limit by :code:`backoff`.
+
+    Requests over the limit wait up to :code:`max_wait` seconds for
+    another request to finish, and are rejected after that.
+
+    :param name: The name of the service, used as the metric label.
+    :param initial_limit: The limit before any latencies are known.
+    :param min_limit: The lowest the limit can go.
+    :param max_limit: The highest the limit can go.
+    :param tolerance: How much higher than average the latency can be before the limit shrinks.
+    :param smoothing: How quickly the limit follows changes in latency (0 to 1).
+    :param backoff: The factor the limit is shrunk by when a request is dropped.
+    :param max_wait: Seconds a request waits for the limit before it is rejected.
+    :param window: The number of latencies the long term average is over.
+    :param drop_exceptions: Exceptions raised by a request that mean it was dropped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        backoff: float = 0.9,
+        max_wait: float = 0.05,
+        window: int = 600,
+        drop_exceptions: tuple = (asyncio.TimeoutError,),
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.window = window
+        self.drop_exceptions = drop_exceptions
+
+        self.in_flight = 0
+        self.average_latency = None
+        self._waiters = deque()
+        self.limit = initial_limit
+
+    @classmethod
+    def from_settings(cls, name: str, **kwargs) -> "ConcurrencyLimiter":
+        return cls(
+            name,
+            initial_limit=settings.SERVICE_CONCURRENCY_LIMIT_INITIAL,
+            min_limit=settings.SERVICE_CONCURRENCY_LIMIT_MIN,
+            max_limit=settings.SERVICE_CONCURRENCY_LIMIT_MAX,
+            tolerance=settings.SERVICE_CONCURRENCY_LIMIT_TOLERANCE,
+            smoothing=settings.SERVICE_CONCURRENCY_LIMIT_SMOOTHING,
+            max_wait=settings.SERVICE_CONCURRENCY_LIMIT_MAX_WAIT,
+            **kwargs,
+        )
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    @property
+    def limit(self) -> float:
+        return self._limit
+
+    @limit.setter
+    def limit(self, value: float) -> None:
+        self._limit = min(max(value, self.min_limit), self.max_limit)
+        InsanicMetrics.SERVICE_CONCURRENCY_LIMIT.labels(service=self.name).set(
+            self._limit
+        )
+        self._wake()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> None:
+        """
+        Waits until a request can be sent.
+
+        :raises ConcurrencyLimitExceeded: If the request waited longer than :code:`max_wait`.
+        """
+        if self.in_flight < int(self.limit) and not self.queued:
+            self.in_flight += 1
+            self._observe_wait(0.0)
+            return
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        start = self.timer()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._observe_wait(self.timer() - start)
+            raise ConcurrencyLimitExceeded(
+                description=settings.SERVICE_UNAVAILABLE_MESSAGE.format(
+                    self.name
+                )
+            )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            raise
+        self._observe_wait(self.timer() - start)
+
+    def release(self, latency: float = None, *, dropped: bool = False) -> None:
+        """
+        Frees the slot of a request that was sent and adapts the limit.
+
+        :param latency: The seconds the request took, if it finished.
+        :param dropped: If the request failed in a way that means the service is overloaded.
+        """
+        if dropped:
+            self.limit = self.limit * self.backoff
+        elif latency is not None:
+            self._observe(latency)
+
+        self.in_flight -= 1
+        self._wake()
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Awaits :code:`func` once the limit allows it and adapts the limit
+        to how long it took.
+        """
+        await self.acquire()
+        start = self.timer()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as e:
+            self.release(dropped=isinstance(e, self.drop_exceptions))
+            raise
+
+        self.release(self.timer() - start)
+        return result
+
+    def _observe(self, latency: float) -> None:
+        latency = max(latency, 1e-6)
+        if self.average_latency is None:
+            self.average_latency = latency
+        else:
+            self.average_latency += (
+                latency - self.average_latency
+            ) / self.window
+            if self.average_latency / latency > 2:
+                # the service got a lot faster, catch up with it sooner
+                self.average_latency *= 0.95
+
+        # when less than half of the limit is used, the latency says
+        # nothing about how many requests the service can take
+        if self.in_flight < self.limit / 2:
+            return
+
+        gradient = max(
+            0.5, min(1.0, self.tolerance * self.average_latency / latency)
+        )
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = (
+            self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        )
+
+    def _observe_wait(self, wait: float) -> None:
+        InsanicMetrics.SERVICE_CONCURRENCY_QUEUE_WAIT.labels(
+            service=self.name
+        ).observe(wait)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
@@ -0,0 +1,207 @@
+import aiotask_context
+import asyncio
+
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from insanic.conf import settings
+from insanic.loading import get_service
+from insanic.services.client import Service
+
+
+class RequestBatches(dict):
+    """
+    The batches of the loaders of a request, by loader. They are shared
+    by all the tasks of the request, even when the task factory copies
+    the context.
+    """
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class _Batch:
+    """
+    The keys of a loader waiting to be loaded, and the loaded keys
+    of the request being handled.
+    """
+
+    def __init__(self) -> None:
+        self.futures: Dict[Hashable, asyncio.Future] = {}
+        self.queue: List[Tuple[Hashable, asyncio.Future]] = []
+        self.scheduled = False
+
+
+class Loader:
+    """
+    Batches the lookups of single items from a service into requests
+    to one of its endpoints that returns many of them.
+
+    The keys loaded in the same tick of the event loop, for example by
+    coroutines gathered with :code:`asyncio.gather`, are loaded together
+    with a single request for each :code:`max_batch_size` keys. The
+    loaded keys are kept for the rest of the request being handled, so
+    loading them again doesn't send another request.
+
+    By default the keys are sent comma separated in the :code:`key_param`
+    query parameter and the endpoint returns a list of the items, each with
+    its key in :code:`key_field`. Keys without an item load as :code:`None`.
+    Other endpoints can be used by overriding :code:`batch_load`.
+
+    >>> users = Loader("user", "/api/v1/users/")
+    >>> user = await users.load(1)
+    >>> user_list = await users.load_many([1, 2, 3])
+
+    :param service: The :code:`Service`, or the name of the service to send requests to.
+    :param endpoint: The path of the endpoint that returns many items.
+    :param method: The method of the requests.
+    :param key_param: The query parameter for the keys.
+    :param key_field: The field of an item that has its key.
+    :param max_batch_size: The most keys loaded in a single request.
+    """
+
+    def __init__(
+        self,
+        service: Union[Service, str],
+        endpoint: str,
+        *,
+        method: str = "GET",
+        key_param: str = "ids",
+        key_field: str = "id",
+        max_batch_size: int = 100,
+    ):
+        self._service = service
+        self.endpoint = endpoint
+        self.method = method
+        self.key_param = key_param
+        self.key_field = key_field
+        self.max_batch_size = max(max_batch_size, 1)
+        self._unscoped_batch = None
+
+    @property
+    def service(self) -> Service:
+        if isinstance(self._service, str):
+            self._service = get_service(self._service)
+        return self._service
+
+    def _batch(self) -> _Batch:
+        """
+        The batch of this loader for the request being handled. Outside of
+        a request, keys are still batched but are not kept once loaded.
+        """
+        try:
+            batches = aiotask_context.get(settings.TASK_CONTEXT_LOADERS, None)
+        except AttributeError:
+            batches = None
+
+        if batches is None:
+            batch = self._unscoped_batch
+            if batch is None or not batch.scheduled:
+                batch = self._unscoped_batch = _Batch()
+            return batch
+
+        if self not in batches:
+            batches[self] = _Batch()
+        return batches[self]
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        """
+        Loads the item of a key, together with the other keys
+        loaded in the same tick of the event loop.
+
+        :param key: The key of the item.
+        :return: A future of the item.
+        """
+        batch = self._batch()
+        future = batch.futures.get(key)
+        if future is not None:
+            return future
+
+        future = batch.futures[key] = asyncio.get_event_loop().create_future()
+        batch.queue.append((key, future))
+        if not batch.scheduled:
+            batch.scheduled = True
+            # a task started from the caller shares the context of its request
+            asyncio.ensure_future(self._dispatch(batch))
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        """
+        Loads the items of many keys.
+
+        :param keys: The keys of the items.
+        :return: The items in the order of the keys.
+        """
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def clear(self, key: Optional[Hashable] = None) -> None:
+        """
+        Forgets a loaded key, or all loaded keys, of the request
+        being handled so they are loaded again.
+        """
+        batch = self._batch()
+        if key is None:
+            batch.futures.clear()
+        else:
+            batch.futures.pop(key, None)
+
+    async def _dispatch(self, batch: _Batch) -> None:
+        queue, batch.queue = batch.queue, []
+        batch.scheduled = False
+
+        await asyncio.gather(
+            *[
+                self._load_chunk(batch, queue[i : i + self.max_batch_size])
+                for i in range(0, len(queue), self.max_batch_size)
+            ]
+        )
+
+    async def _load_chunk(
+        self, batch: _Batch, chunk: List[Tuple[Hashable, asyncio.Future]]
+    ) -> None:
+        try:
+            items = await self.batch_load([key for key, future in chunk])
+        except BaseException as e:
+            for key, future in chunk:
+                # failed keys are loaded again the next time
+                if batch.futures.get(key) is future:
+                    del batch.futures[key]
+                if future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for key, future in chunk:
+            if not future.done():
+                future.set_result(items.get(key))
+
+    async def batch_load(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Sends the request for many keys.
+
+        :param keys: The keys to load.
+        :return: The loaded items by key.
+        """
+        items = await self.service.http_dispatch(
+            self.method,
+            self.endpoint,
+            query_params={self.key_param: ",".join(str(k) for k in keys)},
+            propagate_error=True,
+        )
+
+        # keys in query parameters and json may not be the same type
+        by_key = {str(item[self.key_field]): item for item in items}
+        return {key: by_key.get(str(key)) for key in keys}
@@ -0,0 +1,251 @@
+import asyncio
+
+from typing import AsyncIterator, Callable, Optional
+
+from insanic.conf import settings
+from insanic.log import error_logger
+from insanic.services.adapters import AsyncHTTPTransport, IS_HTTPX_VERSION_0_15
+
+if IS_HTTPX_VERSION_0_15:
+    import httpcore
+
+    from httpcore._async.connection import AsyncHTTPConnection
+
+    class _PriorKnowledgeConnection(AsyncHTTPConnection):
+        """
+        A connection that speaks HTTP/2 over plain http without
+        negotiating it first. httpcore only negotiates HTTP/2 with TLS.
+        """
+
+        def _create_connection(self, socket) -> None:
+            if self.origin[0] != b"http":
+                return super()._create_connection(socket)
+
+            from httpcore._async.http2 import AsyncHTTP2Connection
+
+            self.is_http2 = True
+            self.connection = AsyncHTTP2Connection(
+                socket=socket,
+                backend=self.backend,
+                ssl_context=self.ssl_context,
+            )
+
+    class PriorKnowledgeConnectionPool(httpcore.AsyncConnectionPool):
+        """
+        A connection pool that uses HTTP/2 for all connections, also
+        for connections over plain http.
+        """
+
+        def _create_connection(self, origin: tuple) -> AsyncHTTPConnection:
+            return _PriorKnowledgeConnection(
+                origin=origin,
+                http2=True,
+                uds=self._uds,
+                ssl_context=self._ssl_context,
+                local_address=self._local_address,
+                backend=self._backend,
+            )
+
+
+class _ReleasingStream:
+    """
+    Wraps a response stream to release the connection slot
+    of the host when the response is closed.
+    """
+
+    def __init__(self, stream, release: Callable):
+        self.stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class ConnectionPool(AsyncHTTPTransport):
+    """
+    A connection pool shared by the clients of all services, so the
+    number of connections is limited for the whole process and
+    connections to the same host are reused between services.
+
+    Idle connections are closed after :code:`keepalive_expiry` seconds,
+    even if no other requests are made.
+
+    The clients of services don't close the pool when they are closed.
+    It is closed with :code:`close_connection_pool` when the server stops.
+
+    :param max_connections: The maximum number of connections.
+    :param max_connections_per_host: The maximum number of connections to each host.
+    :param max_keepalive_connections: The maximum number of idle connections kept open.
+    :param keepalive_expiry: Seconds an idle connection is kept open.
+    :param http2: If HTTP/2 should be used with hosts that support it.
+    :param http2_prior_knowledge: If HTTP/2 should also be used over plain http.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: Optional[int] = None,
+        max_connections_per_host: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: bool = False,
+        http2_prior_knowledge: bool = False,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 or http2_prior_knowledge
+
+        pool_class = (
+            PriorKnowledgeConnectionPool
+            if http2_prior_knowledge
+            else httpcore.AsyncConnectionPool
+        )
+        self._pool = pool_class(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            http2=self.http2,
+        )
+        self._host_semaphores = {}
+        self._reaper = None
+        self.closed = False
+
+    @classmethod
+    def from_settings(cls) -> "ConnectionPool":
+        return cls(
+            max_connections=settings.SERVICE_CONNECTOR_MAX,
+            max_connections_per_host=settings.SERVICE_CONNECTOR_MAX_PER_HOST,
+            max_keepalive_connections=settings.SERVICE_CONNECTOR_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SERVICE_CONNECTOR_KEEPALIVE_EXPIRY,
+            http2=settings.SERVICE_HTTP2,
+            http2_prior_knowledge=settings.SERVICE_HTTP2_PRIOR_KNOWLEDGE,
+        )
+
+    def _host_semaphore(self, origin: tuple) -> Optional[asyncio.Semaphore]:
+        # requests to a host share one connection with HTTP/2, so limiting
+        # them would only limit the number of streams
+        if not self.max_connections_per_host or self.http2:
+            return None
+
+        semaphore = self._host_semaphores.get(origin)
+        if semaphore is None:
+            semaphore = self._host_semaphores[origin] = asyncio.Semaphore(
+                self.max_connections_per_host
+            )
+        return semaphore
+
+    async def arequest(
+        self, method: bytes, url: tuple, headers=None, stream=None, ext=None
+    ):
+        if self.closed:
+            raise RuntimeError("The connection pool is closed.")
+        if self._reaper is None and self.keepalive_expiry:
+            self._reaper = asyncio.ensure_future(self._reap())
+
+        semaphore = self._host_semaphore(url[:3])
+        if semaphore is None:
+            return await self._pool.arequest(
+                method, url, headers=headers, stream=stream, ext=ext
+            )
+
+        timeout = (ext or {}).get("timeout", {}).get("pool")
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.PoolTimeout(
+                "Timed out waiting for a connection to the host."
+            )
+
+        try:
+            status_code, headers, stream, ext = await self._pool.arequest(
+                method, url, headers=headers, stream=stream, ext=ext
+            )
+        except BaseException:
+            semaphore.release()
+            raise
+        return (
+            status_code,
+            headers,
+            _ReleasingStream(stream, semaphore.release),
+            ext,
+        )
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(self.keepalive_expiry)
+            try:
+                # closes the connections that have been idle for too long
+                await self._pool.get_connection_info()
+            except Exception as e:  # pragma: no cover
+                error_logger.debug(f"Reaping idle connections failed: {e}")
+
+    async def connection_info(self) -> dict:
+        return await self._pool.get_connection_info()
+
+    async def aclose(self) -> None:
+        """
+        Closing a client doesn't close the shared pool.
+        """
+
+    async def close(self) -> None:
+        self.closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self._pool.aclose()
+
+
+_connection_pool = None
+
+
+def get_connection_pool() -> Optional[ConnectionPool]:
+    """
+    The connection pool shared by all services if
+    :code:`SERVICE_SHARED_CONNECTION_POOL` is enabled.
+    Only available with httpx 0.15 and later.
+    """
+    global _connection_pool
+
+    if not settings.SERVICE_SHARED_CONNECTION_POOL or not IS_HTTPX_VERSION_0_15:
+        return None
+
+    if _connection_pool is None or _connection_pool.closed:
+        _connection_pool = ConnectionPool.from_settings()
+    return _connection_pool
+
+
+def get_transport() -> Optional[AsyncHTTPTransport]:
+    """
+    The transport for the client of a service. The shared connection
+    pool if it is enabled, or a connection pool of the client's own if
+    :code:`SERVICE_HTTP2_PRIOR_KNOWLEDGE` is enabled. Otherwise httpx
+    creates the transport.
+    """
+    pool = get_connection_pool()
+    if pool is not None or not IS_HTTPX_VERSION_0_15:
+        return pool
+
+    if settings.SERVICE_HTTP2_PRIOR_KNOWLEDGE:
+        return PriorKnowledgeConnectionPool(
+            max_connections=settings.SERVICE_CONNECTOR_MAX,
+            max_keepalive_connections=settings.SERVICE_CONNECTOR_MAX_KEEPALIVE,
+            http2=True,
+        )
+    return None
+
+
+async def close_connection_pool() -> None:
+    global _connection_pool
+
+    if _connection_pool is not None:
+        pool, _connection_pool = _connection_pool, None
+        await pool.close()
@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+from typing import Optional
+
+from insanic.conf import settings
+from insanic.exceptions import Throttled
+
+
+class RateLimited(Throttled):
+    """
+    Raised instead of sending a request when the service asked to
+    back off, or its rate limit is reached, for longer than the
+    request can wait.
+    """
+
+
+class RateLimiter:
+    """
+    Paces the requests to a service with a token bucket, and stops
+    sending requests while the service asks to back off.
+
+    With a :code:`rate`, the bucket holds up to :code:`burst` tokens and
+    refills at :code:`rate` tokens per second. Each request takes a token
+    or waits until there is one. A :code:`429` response from the service
+    empties the bucket and holds all requests for its :code:`Retry-After`,
+    or :code:`default_backoff` seconds without one. After that, the held
+    requests are sent at the rate of the bucket instead of all at once.
+    Without a :code:`rate`, they are sent at :code:`backoff_rate` until
+    the bucket is full again.
+
+    Requests that would have to wait longer than :code:`max_wait` seconds
+    are rejected immediately, since the service is known to reject them.
+
+    :param name: The name of the service.
+    :param rate: Requests per second, or :code:`None` to only back off on a :code:`429`.
+    :param burst: The most requests sent at once.
+    :param max_wait: Seconds a request waits before it is rejected.
+    :param default_backoff: Seconds to back off on a :code:`429` without a :code:`Retry-After`.
+    :param backoff_rate: Requests per second after a back off, without a :code:`rate`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        max_wait: float = 1.0,
+        default_backoff: float = 1.0,
+        backoff_rate: float = 10.0,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_wait = max_wait
+        self.default_backoff = default_backoff
+        self.backoff_rate = backoff_rate
+
+        self.blocked_until = 0.0
+        self._paced = False
+        self._tokens = float(self.burst)
+        self._updated_at = self.timer()
+
+    @classmethod
+    def from_settings(cls, name: str) -> "RateLimiter":
+        config = settings.SERVICE_RATE_LIMITS.get(name, {})
+        return cls(
+            name,
+            rate=config.get("RATE"),
+            burst=config.get("BURST", 1),
+            max_wait=settings.SERVICE_RATE_LIMIT_MAX_WAIT,
+            default_backoff=settings.SERVICE_RATE_LIMIT_DEFAULT_BACKOFF,
+            backoff_rate=settings.SERVICE_RATE_LIMIT_BACKOFF_RATE,
+        )
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    def _refill(self, now: float, rate: float) -> None:
+        # tokens only refill after a back off is over
+        if now > self._updated_at:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * rate
+            )
+            self._updated_at = now
+
+    def _current_rate(self, now: float) -> Optional[float]:
+        """
+        The rate requests are paced at, after refilling the bucket.
+        Without a :code:`rate`, requests are only paced after a back off
+        and until the bucket is full again.
+        """
+        if self.rate is not None:
+            self._refill(now, self.rate)
+            return self.rate
+
+        if not self._paced:
+            return None
+
+        self._refill(now, self.backoff_rate)
+        if now >= self.blocked_until and self._tokens >= self.burst:
+            self._paced = False
+            return None
+        return self.backoff_rate
+
+    def reserve(self) -> float:
+        """
+        Takes a turn to send a request.
+
+        :return: The seconds to wait before sending it.
+        :raises RateLimited: If the wait is longer than :code:`max_wait`.
+        """
+        now = self.timer()
+        wait = max(self.blocked_until - now, 0)
+
+        rate = self._current_rate(now)
+        if rate is not None:
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, self._updated_at - now - self._tokens / rate)
+
+        if wait > self.max_wait:
+            if rate is not None:
+                self._tokens += 1
+            raise RateLimited(
+                wait=wait,
+                description=f"Requests to {self.name} are rate limited.",
+            )
+        return wait
+
+    async def acquire(self) -> None:
+        """
+        Waits for the turn of a request.
+
+        :raises RateLimited: If the wait is longer than :code:`max_wait`.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, retry_after: Optional[float] = None) -> None:
+        """
+        Holds the requests to the service after it responded with
+        a :code:`429`.
+
+        :param retry_after: Seconds from the :code:`Retry-After` of the response.
+        """
+        if retry_after is None:
+            retry_after = self.default_backoff
+        now = self.timer()
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+        # once it is over, the first held request is sent right away
+        # and the rest are paced instead of all sent at once
+        self._current_rate(now)
+        self._paced = True
+        self._tokens = min(self._tokens, 1)
+        self._updated_at = max(self._updated_at, self.blocked_until)
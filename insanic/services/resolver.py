@@ -0,0 +1,149 @@
+import asyncio
+import socket
+import time
+
+from typing import List, Optional
+
+from insanic.conf import settings
+from insanic.log import error_logger
+from insanic.utils.concurrency import SingleFlight
+
+
+class _Resolution:
+    __slots__ = ("addresses", "error", "expires_at", "refresh_at")
+
+    def __init__(
+        self,
+        addresses: List[str],
+        error: Optional[Exception],
+        expires_at: float,
+        refresh_at: float,
+    ):
+        self.addresses = addresses
+        self.error = error
+        self.expires_at = expires_at
+        self.refresh_at = refresh_at
+
+
+class Resolver:
+    """
+    An asynchronous cache of host name resolutions.
+
+    Addresses are resolved with the event loop's :code:`getaddrinfo`
+    and kept for :code:`ttl` seconds. After :code:`refresh_after` of the
+    ttl has passed, the addresses are refreshed in the background while
+    the cached addresses are still served. Failed resolutions are kept
+    for :code:`negative_ttl` seconds so a failing resolver is not asked
+    on every request. Concurrent resolutions of a host share a single
+    lookup.
+
+    :param ttl: Seconds to keep resolved addresses.
+    :param negative_ttl: Seconds to keep a failed resolution.
+    :param refresh_after: The fraction of the ttl after which addresses are refreshed.
+    :param family: The address family to resolve.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        refresh_after: float = 0.8,
+        family: int = socket.AF_INET,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_after = refresh_after
+        self.family = family
+
+        self._resolutions = {}
+        self._in_flight = SingleFlight()
+
+    @classmethod
+    def from_settings(cls) -> "Resolver":
+        return cls(
+            ttl=settings.SERVICE_DNS_CACHE_TTL,
+            negative_ttl=settings.SERVICE_DNS_CACHE_NEGATIVE_TTL,
+        )
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    def clear(self) -> None:
+        self._resolutions.clear()
+
+    async def resolve(self, host: str, port: Optional[int] = None) -> List[str]:
+        """
+        The addresses of the host, from the cache if it has them.
+
+        :raises socket.gaierror: If the host could not be resolved.
+        """
+        key = (host, port)
+        resolution = self._resolutions.get(key)
+        now = self.timer()
+
+        if resolution is not None and now < resolution.expires_at:
+            if resolution.error is not None:
+                raise resolution.error
+
+            if now >= resolution.refresh_at and key not in self._in_flight:
+                asyncio.ensure_future(self._refresh(host, port))
+            return resolution.addresses
+
+        return await self._in_flight.do(key, self._lookup, host, port)
+
+    async def _lookup(
+        self, host: str, port: Optional[int], *, negative: bool = True
+    ) -> List[str]:
+        loop = asyncio.get_event_loop()
+        key = (host, port)
+
+        try:
+            infos = await loop.getaddrinfo(
+                host, port, family=self.family, type=socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            if negative:
+                now = self.timer()
+                self._resolutions[key] = _Resolution(
+                    [], e, now + self.negative_ttl, now + self.negative_ttl
+                )
+            raise
+
+        addresses = []
+        for info in infos:
+            address = info[4][0]
+            if address not in addresses:
+                addresses.append(address)
+
+        now = self.timer()
+        self._resolutions[key] = _Resolution(
+            addresses,
+            None,
+            now + self.ttl,
+            now + self.ttl * self.refresh_after,
+        )
+        return addresses
+
+    async def _refresh(self, host: str, port: Optional[int]) -> None:
+        try:
+            # keep serving the addresses until they expire if refreshing fails
+            await self._in_flight.do(
+                (host, port), self._lookup, host, port, negative=False
+            )
+        except socket.gaierror as e:
+            error_logger.info(f"Refreshing the addresses of {host} failed: {e}")
+
+
+_resolver = None
+
+
+def get_resolver() -> Resolver:
+    """
+    The resolver shared by all services.
+    """
+    global _resolver
+    if _resolver is None:
+        _resolver = Resolver.from_settings()
+    return _resolver
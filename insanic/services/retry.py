@@ -0,0 +1,184 @@
+import random
+import time
+
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Optional
+
+from insanic.conf import settings
+
+
+class RetryBudget:
+    """
+    A token bucket that limits retries to a ratio of requests.
+
+    Every request deposits :code:`ratio` tokens and every retry
+    withdraws a whole token. So a downstream that fails every request
+    is retried at most :code:`ratio` times per request. The bucket also
+    refills at :code:`min_per_second` tokens per second so services
+    with little traffic can still retry.
+
+    :param ratio: The number of retries allowed per request.
+    :param min_per_second: Retries allowed per second regardless of traffic.
+    :param max_tokens: The most tokens the bucket can hold.
+    """
+
+    def __init__(
+        self,
+        *,
+        ratio: float = 0.2,
+        min_per_second: float = 10,
+        max_tokens: Optional[float] = None,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max(
+            max_tokens if max_tokens is not None else min_per_second * 10, 1
+        )
+        self._tokens = max(min_per_second, 1)
+        self._updated_at = self.timer()
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = self.timer()
+        self._tokens = min(
+            self.max_tokens,
+            self._tokens + (now - self._updated_at) * self.min_per_second,
+        )
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        """
+        Called for every request that is not a retry.
+        """
+        self._refill()
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Takes a token for a retry. Returns :code:`False` if the
+        budget is spent and the request must not be retried.
+        """
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a :code:`Retry-After` header, either in seconds or
+    an HTTP date, into the number of seconds to wait.
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+class RetryPolicy:
+    """
+    Decides if and when a failed request is retried.
+
+    Retries are delayed with exponential backoff and full jitter,
+    so retries from many workers don't arrive at the same time.
+
+    :param methods: The methods of requests that can be retried.
+    :param status_codes: The response status codes that can be retried.
+    :param backoff_base: The maximum delay in seconds before the first retry.
+    :param backoff_max: The maximum delay in seconds before any retry. A
+        :code:`Retry-After` longer than this is not retried.
+    :param budget: The retry budget shared by all requests with this policy.
+    """
+
+    def __init__(
+        self,
+        *,
+        methods: Iterable[str] = ("GET",),
+        status_codes: Iterable[int] = (500, 502, 503, 504),
+        backoff_base: float = 0.05,
+        backoff_max: float = 1.0,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.methods = {m.upper() for m in methods}
+        self.status_codes = set(status_codes)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget or RetryBudget()
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            methods=settings.SERVICE_RETRY_METHODS,
+            status_codes=settings.SERVICE_RETRY_STATUS_CODES,
+            backoff_base=settings.SERVICE_RETRY_BACKOFF_BASE,
+            backoff_max=settings.SERVICE_RETRY_BACKOFF_MAX,
+            budget=RetryBudget(
+                ratio=settings.SERVICE_RETRY_BUDGET_RATIO,
+                min_per_second=settings.SERVICE_RETRY_BUDGET_MIN_PER_SECOND,
+            ),
+        )
+
+    def attempts(self, method: str, retry_count: Optional[int] = None) -> int:
+        """
+        The maximum number of attempts for a request.
+        """
+        if method.upper() not in self.methods:
+            return 1
+
+        if retry_count is None:
+            retry_count = settings.SERVICE_CONNECTION_DEFAULT_RETRY_COUNT
+        return 1 + min(
+            retry_count, int(settings.SERVICE_CONNECTION_MAX_RETRY_COUNT)
+        )
+
+    def is_retryable(self, exc: Exception) -> bool:
+        """
+        If the exception from an attempt can be retried. Errors with
+        a response are only retried for the configured status codes.
+        """
+        status_code = getattr(
+            getattr(exc, "response", None), "status_code", None
+        )
+        return status_code is None or status_code in self.status_codes
+
+    def backoff(
+        self, attempt: int, exc: Optional[Exception] = None
+    ) -> Optional[float]:
+        """
+        The seconds to wait before retrying, or :code:`None` if the
+        response asks to wait longer than :code:`backoff_max`.
+
+        :param attempt: The number of the attempt that failed, from 0.
+        :param exc: The exception from the attempt.
+        """
+        delay = random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        )
+
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+        if headers is not None:
+            retry_after = parse_retry_after(headers.get("retry-after"))
+            if retry_after is not None:
+                if retry_after > self.backoff_max:
+                    return None
+                delay = max(delay, retry_after)
+
+        return delay
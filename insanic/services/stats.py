@@ -0,0 +1,144 @@
+import math
+import re
+import time
+
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+#: The smallest latency in seconds that is told apart.
+MIN_LATENCY = 0.0001
+
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?"
+    r"[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}|[0-9a-fA-F]{24,})$"
+)
+
+
+def endpoint_template(path: str) -> str:
+    """
+    The path with the segments that look like identifiers (numbers,
+    uuids and long hexadecimal strings) replaced with :code:`{id}`, so
+    requests to the same endpoint share their latencies.
+
+    :param path: The path of a request, e.g. :code:`/api/v1/users/1234/`.
+    :return: The template, e.g. :code:`/api/v1/users/{id}/`.
+    """
+    return "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in path.split("/")
+    )
+
+
+class LatencySketch:
+    """
+    Keeps the distribution of recent latencies in logarithmic buckets
+    so any percentile can be estimated within :code:`relative_accuracy`
+    with a fixed amount of memory.
+
+    Latencies are kept for between one and two :code:`window` seconds
+    so the estimates follow changes in latency.
+
+    :param relative_accuracy: The relative error of the estimates.
+    :param window: Seconds of latencies to keep.
+    """
+
+    def __init__(
+        self, *, relative_accuracy: float = 0.02, window: float = 60.0
+    ):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.window = window
+
+        self._current = {}
+        self._previous = {}
+        self._rotated_at = self.timer()
+
+    @staticmethod
+    def timer() -> float:
+        return time.monotonic()
+
+    def _rotate(self) -> None:
+        elapsed = self.timer() - self._rotated_at
+        if elapsed >= self.window:
+            self._previous = self._current if elapsed < 2 * self.window else {}
+            self._current = {}
+            self._rotated_at += elapsed - elapsed % self.window
+
+    def add(self, latency: float) -> None:
+        """
+        Adds a latency in seconds.
+        """
+        self._rotate()
+        key = math.ceil(math.log(max(latency, MIN_LATENCY)) / self._log_gamma)
+        self._current[key] = self._current.get(key, 0) + 1
+
+    def __len__(self) -> int:
+        self._rotate()
+        return sum(self._current.values()) + sum(self._previous.values())
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        The estimated latency below which :code:`q` (0 to 1) of the
+        latencies fall, or :code:`None` if there are none.
+        """
+        self._rotate()
+        counts = dict(self._previous)
+        for key, count in self._current.items():
+            counts[key] = counts.get(key, 0) + count
+
+        total = sum(counts.values())
+        if not total:
+            return None
+
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(counts):
+            seen += counts[key]
+            if seen > rank:
+                break
+
+        # the middle of the bucket in relative terms
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+
+class LatencyStats:
+    """
+    Latency sketches for the most recently used keys, for example
+    the endpoints of a service.
+
+    :param max_keys: The maximum number of keys to keep sketches for.
+    :param window: The window of each sketch.
+    """
+
+    def __init__(self, *, max_keys: int = 1000, window: float = 60.0):
+        self.max_keys = max_keys
+        self.window = window
+        self._sketches = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def get(self, key: Hashable) -> Optional[LatencySketch]:
+        return self._sketches.get(key)
+
+    def add(self, key: Hashable, latency: float) -> None:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = LatencySketch(window=self.window)
+            while len(self._sketches) > self.max_keys:
+                self._sketches.popitem(last=False)
+        else:
+            self._sketches.move_to_end(key)
+        sketch.add(latency)
+
+    def percentile(
+        self, key: Hashable, q: float, *, min_samples: int = 1
+    ) -> Optional[float]:
+        """
+        The percentile of the latencies of :code:`key`, or :code:`None`
+        if there are less than :code:`min_samples` latencies.
+        """
+        sketch = self._sketches.get(key)
+        if sketch is None or len(sketch) < max(min_samples, 1):
+            return None
+        return sketch.percentile(q)
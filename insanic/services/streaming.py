@@ -0,0 +1,242 @@
+import asyncio
+import codecs
+import inspect
+import json
+
+from httpx import Response
+from sanic.response import StreamingHTTPResponse
+from typing import Any, AsyncIterator, Optional
+
+from insanic import exceptions, status
+from insanic.errors import GlobalErrorCodes
+
+#: The formats a response can be streamed in.
+STREAM_FORMATS = ("bytes", "ndjson", "json")
+#: The size of the chunks a file is uploaded in.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+_whitespace = " \t\n\r"
+
+
+def _invalid(description: str) -> exceptions.APIException:
+    return exceptions.APIException(
+        description=description,
+        error_code=GlobalErrorCodes.stream_error,
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+
+
+async def iter_bytes(
+    chunks: AsyncIterator[bytes], max_body_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yields the chunks of a body.
+
+    :param chunks: The chunks of the body.
+    :param max_body_size: The most bytes the body can have.
+    :raises ResponseTooLarge: Once the body has more than :code:`max_body_size` bytes.
+    """
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if max_body_size is not None and size > max_body_size:
+            raise exceptions.ResponseTooLarge(
+                description=f"The response is larger than {max_body_size} bytes."
+            )
+        yield chunk
+
+
+async def iter_text(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Decodes the chunks of a utf-8 body, including characters
+    split between chunks.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the records of a newline delimited json body.
+    """
+    buffer = ""
+    async for text in iter_text(chunks):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+def _loads(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise _invalid(f"Invalid json record in the response: {e}")
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the items of a json array body as each of them arrives,
+    without holding the whole array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    empty = True
+    ended = False
+
+    async for text in iter_text(chunks):
+        buffer += text
+        position = 0
+
+        while True:
+            position = _skip_whitespace(buffer, position)
+            if position == len(buffer):
+                break
+
+            if ended:
+                raise _invalid("Unexpected data after the json array.")
+
+            if not started:
+                if buffer[position] != "[":
+                    raise _invalid("The response is not a json array.")
+                started = True
+                position += 1
+                continue
+
+            if empty and buffer[position] == "]":
+                ended = True
+                position += 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # the item hasn't fully arrived yet
+                break
+
+            # a number can continue in the next chunk, so an item is
+            # only complete once the delimiter after it has arrived
+            delimiter = _skip_whitespace(buffer, end)
+            if delimiter == len(buffer):
+                break
+            if buffer[delimiter] not in ",]":
+                raise _invalid("Invalid json array in the response.")
+
+            yield item
+            empty = False
+            ended = buffer[delimiter] == "]"
+            position = delimiter + 1
+
+        buffer = buffer[position:]
+
+    if not ended:
+        raise _invalid("The json array in the response is incomplete.")
+
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    while position < len(buffer) and buffer[position] in _whitespace:
+        position += 1
+    return position
+
+
+def iter_response(
+    chunks: AsyncIterator[bytes],
+    stream: str,
+    max_body_size: Optional[int] = None,
+) -> AsyncIterator[Any]:
+    """
+    Decodes the chunks of a response body in one of :code:`STREAM_FORMATS`.
+
+    :param chunks: The chunks of the body.
+    :param stream: :code:`bytes` for the chunks, :code:`ndjson` for the records of newline delimited json or :code:`json` for the items of a json array.
+    :param max_body_size: The most bytes the body can have.
+    """
+    chunks = iter_bytes(chunks, max_body_size)
+    if stream == "ndjson":
+        return iter_ndjson(chunks)
+    if stream == "json":
+        return iter_json_array(chunks)
+    return chunks
+
+
+async def iter_file(
+    file, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Reads a file in chunks to upload it without holding all of it.
+    The reads of files with an async :code:`read`, like those of
+    :code:`aiofiles`, are awaited.
+
+    :param file: The file opened for reading.
+    :param chunk_size: The most bytes read at once.
+    """
+    while True:
+        chunk = file.read(chunk_size)
+        if inspect.isawaitable(chunk):
+            chunk = await chunk
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        yield chunk
+
+
+async def iter_request_stream(stream) -> AsyncIterator[bytes]:
+    """
+    Yields the chunks of the body of a Sanic request from
+    a route with :code:`stream=True` as they arrive.
+
+    :param stream: The :code:`stream` of the request.
+    """
+    while True:
+        chunk = await stream.read()
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _stream_proxied(proxy_response: "ProxyResponse") -> None:
+    response = proxy_response.response
+    try:
+        async for chunk in response.aiter_raw():
+            await proxy_response.write(chunk)
+    finally:
+        await response.aclose()
+
+
+class ProxyResponse(StreamingHTTPResponse):
+    """
+    Streams the raw body of a response of another service through as
+    it arrives. The response is closed once it is streamed, or when
+    this response is discarded without being sent, like when a
+    middleware replaces it.
+
+    :param response: The streamed response of the other service.
+    """
+
+    __slots__ = ("response",)
+
+    def __init__(self, response: Response, **kwargs):
+        self.response = response
+        super().__init__(_stream_proxied, **kwargs)
+
+    def __del__(self):
+        if self.response.is_closed:
+            return
+
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        if not loop.is_closed():
+            loop.create_task(self.response.aclose())
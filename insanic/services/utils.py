@@ -1,7 +1,19 @@
 import aiotask_context
+import time
+
+from datetime import datetime, timezone
+from typing import Optional
 
 from insanic.conf import settings
-from insanic.models import AnonymousUser
+from insanic.models import AnonymousUser, to_header_value
+from insanic.utils.datetime import get_utc_timestamp
+
+#: The format of the date header of requests to other services.
+DATE_HEADER_FORMAT = "%a, %d %b %y %T %z"
+
+_anonymous_user_header = to_header_value(AnonymousUser)
+# the second and the formatted date header of that second
+_date_header = [None, ""]
 
 
 def context_user() -> dict:
@@ -18,6 +30,52 @@ def context_user() -> dict:
     return user
 
 
+def context_user_header() -> str:
+    """
+    The user from the asyncio task serialized for the header of requests
+    to other services. It is serialized once for each user and kept in
+    the asyncio task.
+
+    :return:
+    """
+    try:
+        user = aiotask_context.get(settings.TASK_CONTEXT_REQUEST_USER, None)
+    except AttributeError:
+        user = None
+    if user is None:
+        return _anonymous_user_header
+
+    cached = aiotask_context.get(
+        settings.TASK_CONTEXT_REQUEST_USER_HEADER, None
+    )
+    if cached is not None and cached[0] is user:
+        return cached[1]
+
+    header = to_header_value(user)
+    aiotask_context.set(
+        settings.TASK_CONTEXT_REQUEST_USER_HEADER, (user, header)
+    )
+    return header
+
+
+def date_header() -> str:
+    """
+    The date header of requests to other services. It is only
+    formatted once a second.
+
+    :return:
+    """
+    second = int(get_utc_timestamp())
+    if _date_header[0] != second:
+        _date_header[:] = [
+            second,
+            datetime.fromtimestamp(second, tz=timezone.utc).strftime(
+                DATE_HEADER_FORMAT
+            ),
+        ]
+    return _date_header[1]
+
+
 def context_correlation_id() -> str:
     """
     Retrives the request/correlation id from the asyncio task.
@@ -31,3 +89,48 @@ def context_correlation_id() -> str:
     except AttributeError:
         correlation_id = "not set"
     return correlation_id
+
+
+def context_deadline() -> Optional[float]:
+    """
+    Retrieves the deadline of the request from the asyncio task,
+    in :code:`time.monotonic` seconds.
+
+    :return: The deadline, or :code:`None` if the request doesn't have one.
+    """
+    try:
+        deadline = aiotask_context.get(settings.TASK_CONTEXT_DEADLINE, None)
+    except AttributeError:
+        deadline = None
+    return deadline
+
+
+def set_context_deadline(timeout: float) -> float:
+    """
+    Sets the deadline of the request to :code:`timeout` seconds from
+    now, unless the request already has an earlier deadline.
+
+    :param timeout: Seconds until the deadline.
+    :return: The deadline.
+    """
+    deadline = time.monotonic() + timeout
+    current = context_deadline()
+    if current is not None:
+        deadline = min(deadline, current)
+    try:
+        aiotask_context.set(settings.TASK_CONTEXT_DEADLINE, deadline)
+    except AttributeError:
+        pass
+    return deadline
+
+
+def deadline_remaining() -> Optional[float]:
+    """
+    Seconds left until the deadline of the request.
+
+    :return: The seconds, negative if it has passed, or :code:`None` if the request doesn't have a deadline.
+    """
+    deadline = context_deadline()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
@@ -120,7 +120,7 @@ class SimpleRateThrottle(BaseThrottle):
         if self.key is None:
             return True
 
-        redis = await get_connection(THROTTLE_CACHE)
+        redis = await get_connection(THROTTLE_CACHE, self.key)
         with await redis as conn:
             history = await conn.get(self.key)
             self.history = json.loads(history) if history else []
@@ -141,7 +141,7 @@ class SimpleRateThrottle(BaseThrottle):
         into the cache.
         """
         self.history.insert(0, self.now)
-        redis = await get_connection(THROTTLE_CACHE)
+        redis = await get_connection(THROTTLE_CACHE, self.key)
         with await redis as conn:
             await conn.set(
                 self.key, json.dumps(self.history), expire=self.duration
@@ -0,0 +1,56 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into a single execution.
+    The first caller for a key starts the work while every other caller
+    that arrives before it finishes awaits the same result (or exception).
+
+    >>> flight = SingleFlight()
+    >>> await flight.do("key", fetch_something, arg)
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+        # mark the exception as retrieved in case all waiters were cancelled
+        if not future.cancelled():
+            future.exception()
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        **kwargs,
+    ) -> Any:
+        """
+        Runs :code:`func(*args, **kwargs)` unless a call for :code:`key`
+        is already in flight, in which case the result of that call is
+        awaited instead.
+
+        :param key: The key that identifies identical calls.
+        :param func: A coroutine function to execute.
+        """
+        future = self._calls.get(key)
+
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+
+        # cancelling a waiter must not cancel the shared execution
+        return await asyncio.shield(future)
@@ -10,6 +10,7 @@ from sanic.views import HTTPMethodView
 
 from insanic import authentication, exceptions, permissions
 from insanic.errors import GlobalErrorCodes
+from insanic.services.utils import set_context_deadline
 
 
 class InsanicView(HTTPMethodView):
@@ -30,6 +31,9 @@ class InsanicView(HTTPMethodView):
         authentication.ServiceJWTAuthentication,
         authentication.JSONWebTokenAuthentication,
     ]
+    #: seconds the view has to respond, which is also the deadline
+    #: for the requests it sends to other services
+    timeout = None
 
     def _allowed_methods(self):
         return [m.upper() for m in self.http_method_names if hasattr(self, m)]
@@ -127,6 +131,9 @@ class InsanicView(HTTPMethodView):
         but with extra hooks for startup, finalize, and exception handling.
         """
 
+        if self.timeout is not None:
+            set_context_deadline(self.timeout)
+
         self.request.authenticators = self.get_authenticators()
         self.headers = self.default_response_headers  # deprecate?
 
@@ -0,0 +1,445 @@
+import asyncio
+import pytest
+import time
+import ujson
+
+from multidict import CIMultiDict
+from sanic.response import StreamingHTTPResponse, json, stream
+
+from insanic import cache
+from insanic.cache import cache_response, invalidate_tags, micro_cache
+from insanic.connections import _connections, get_connection
+from insanic.exceptions import ImproperlyConfigured
+from insanic.request import Request
+from insanic.scopes import public_facing
+from insanic.views import InsanicView
+
+
+@pytest.fixture(autouse=True)
+async def cache_connections(loop):
+    _connections.loop = loop
+    yield
+    await _connections.close_all()
+
+
+class TestGetOrSet:
+    @pytest.fixture()
+    def counter(self):
+        calls = []
+
+        async def compute():
+            calls.append(True)
+            await asyncio.sleep(0.05)
+            return {"count": len(calls)}
+
+        compute.calls = calls
+        return compute
+
+    async def test_miss_sets_value(self, counter):
+        value = await cache.get_or_set("key", counter, timeout=10)
+
+        assert value == {"count": 1}
+
+        redis = await get_connection(cache.DEFAULT_CACHE)
+        with await redis as conn:
+            entry = ujson.loads(await conn.get("key"))
+            ttl = await conn.pttl("key")
+
+        assert entry["value"] == {"count": 1}
+        assert 0 < ttl <= 10000
+
+    async def test_hit_does_not_compute(self, counter):
+        await cache.get_or_set("key", counter, timeout=10, beta=0)
+        value = await cache.get_or_set("key", counter, timeout=10, beta=0)
+
+        assert value == {"count": 1}
+        assert len(counter.calls) == 1
+
+    async def test_sync_callable(self):
+        value = await cache.get_or_set("key", lambda: "sync", timeout=10)
+
+        assert value == "sync"
+
+    async def test_concurrent_misses_are_collapsed(self, counter):
+        values = await asyncio.gather(
+            *[cache.get_or_set("key", counter, timeout=10) for _ in range(20)]
+        )
+
+        assert len(counter.calls) == 1
+        assert all(v == {"count": 1} for v in values)
+
+    async def test_waits_for_other_process_holding_lock(self, counter):
+        redis = await get_connection(cache.DEFAULT_CACHE)
+        with await redis as conn:
+            await conn.set("key:lock", "other", pexpire=1000)
+
+        async def other_process():
+            await asyncio.sleep(0.1)
+            await cache._set_entry(
+                cache.DEFAULT_CACHE,
+                "key",
+                "from other",
+                delta=0.1,
+                timeout=10,
+                stale_timeout=0,
+            )
+
+        asyncio.ensure_future(other_process())
+        value = await cache.get_or_set("key", counter, timeout=10)
+
+        assert value == "from other"
+        assert counter.calls == []
+
+    async def test_stops_waiting_when_lock_is_released(self, counter):
+        redis = await get_connection(cache.DEFAULT_CACHE)
+        with await redis as conn:
+            await conn.set("key:lock", "other", pexpire=5000)
+
+        async def other_process():
+            # fails without setting a value
+            await asyncio.sleep(0.05)
+            with await redis as conn:
+                await conn.delete("key:lock")
+
+        asyncio.ensure_future(other_process())
+        start = time.monotonic()
+        value = await cache.get_or_set(
+            "key", counter, timeout=10, lock_timeout=2
+        )
+
+        assert value == {"count": 1}
+        assert time.monotonic() - start < 1
+
+    async def test_lock_is_released(self, counter):
+        await cache.get_or_set("key", counter, timeout=10)
+
+        redis = await get_connection(cache.DEFAULT_CACHE)
+        with await redis as conn:
+            assert await conn.get("key:lock") is None
+
+    async def test_stale_value_is_served_while_refreshing(self, counter):
+        await cache._set_entry(
+            cache.DEFAULT_CACHE,
+            "key",
+            "stale",
+            delta=0.1,
+            timeout=-1,
+            stale_timeout=10,
+        )
+
+        value = await cache.get_or_set(
+            "key", counter, timeout=10, stale_timeout=10
+        )
+        assert value == "stale"
+
+        await asyncio.sleep(0.1)
+        value = await cache.get_or_set(
+            "key", counter, timeout=10, stale_timeout=10, beta=0
+        )
+        assert value == {"count": 1}
+
+    async def test_early_refresh(self, counter, monkeypatch):
+        await cache.get_or_set("key", counter, timeout=10)
+
+        monkeypatch.setattr(cache, "_should_refresh", lambda *args: True)
+        value = await cache.get_or_set("key", counter, timeout=10)
+
+        assert value == {"count": 1}
+        await asyncio.sleep(0.1)
+        assert len(counter.calls) == 2
+
+    def test_should_refresh(self):
+        entry = {"delta": 1, "expiry": time.time() + 60}
+
+        assert cache._should_refresh(entry, beta=0) is False
+        assert cache._should_refresh(entry, beta=1) is False
+
+        entry["expiry"] = time.time() - 1
+        assert cache._should_refresh(entry, beta=0) is True
+
+
+class TestCacheResponse:
+    @pytest.fixture()
+    def calls(self):
+        return []
+
+    @pytest.fixture()
+    def application(self, insanic_application, calls):
+        class CachedView(InsanicView):
+            authentication_classes = []
+            permission_classes = []
+
+            @cache_response(timeout=10, vary_headers=["X-Vary"], tags=["items"])
+            async def get(self, request, *args, **kwargs):
+                calls.append(request.query_string)
+                return json({"calls": len(calls)})
+
+            async def post(self, request, *args, **kwargs):
+                await invalidate_tags("items")
+                return json({}, status=201)
+
+        @cache_response(timeout=10)
+        async def not_found(request):
+            calls.append(True)
+            return json({}, status=404)
+
+        @cache_response(
+            timeout=10, tags=lambda view, request, item: [f"item:{item}"]
+        )
+        class ItemView(InsanicView):
+            authentication_classes = []
+            permission_classes = []
+
+            async def get(self, request, item):
+                calls.append(item)
+                return json({"item": item})
+
+        insanic_application.add_route(CachedView.as_view(), "/cached/")
+        insanic_application.add_route(ItemView.as_view(), "/item/<item>/")
+        insanic_application.add_route(not_found, "/not_found/")
+        return insanic_application
+
+    def test_response_is_cached(self, application, calls):
+        request, response = application.test_client.get("/cached/")
+
+        assert response.status == 200
+        assert response.json == {"calls": 1}
+        etag = response.headers["ETag"]
+
+        request, response = application.test_client.get("/cached/")
+
+        assert response.status == 200
+        assert response.json == {"calls": 1}
+        assert response.headers["ETag"] == etag
+        assert response.headers["Content-Type"] == "application/json"
+        assert len(calls) == 1
+
+    def test_if_none_match(self, application, calls):
+        request, response = application.test_client.get("/cached/")
+        etag = response.headers["ETag"]
+
+        request, response = application.test_client.get(
+            "/cached/", headers={"If-None-Match": etag}
+        )
+
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+        assert response.body == b""
+        assert len(calls) == 1
+
+        request, response = application.test_client.get(
+            "/cached/", headers={"If-None-Match": '"other"'}
+        )
+        assert response.status == 200
+
+    def test_query_params_are_normalized(self, application, calls):
+        application.test_client.get("/cached/?a=1&b=2")
+        application.test_client.get("/cached/?b=2&a=1")
+        application.test_client.get("/cached/?a=2&b=2")
+
+        assert calls == ["a=1&b=2", "a=2&b=2"]
+
+    def test_vary_headers(self, application, calls):
+        application.test_client.get("/cached/", headers={"X-Vary": "a"})
+        application.test_client.get("/cached/", headers={"X-Vary": "a"})
+        application.test_client.get("/cached/", headers={"X-Vary": "b"})
+
+        assert len(calls) == 2
+
+    def test_non_200_is_not_cached(self, application, calls):
+        for _ in range(2):
+            request, response = application.test_client.get("/not_found/")
+            assert response.status == 404
+            assert "ETag" not in response.headers
+
+        assert len(calls) == 2
+
+    async def test_non_200_rendered_by_other_worker(self, calls):
+        @cache_response(timeout=10)
+        async def not_found(request):
+            calls.append(True)
+            return json({}, status=404)
+
+        request = Request(
+            b"/not_found/", CIMultiDict(), "1.1", "GET", None, None
+        )
+        lock_key = cache.LOCK_KEY_FORMAT % {
+            "key": cache.get_response_cache_key(request)
+        }
+
+        redis = await get_connection(cache.DEFAULT_CACHE)
+        with await redis as conn:
+            await conn.set(lock_key, "other", pexpire=5000)
+
+        async def other_worker():
+            # renders a 404, which releases the lock without caching it
+            await asyncio.sleep(0.1)
+            with await redis as conn:
+                await conn.delete(lock_key)
+
+        asyncio.ensure_future(other_worker())
+        start = time.monotonic()
+        response = await not_found(request)
+
+        assert response.status == 404
+        assert len(calls) == 1
+        assert time.monotonic() - start < 1
+
+    def test_invalidate_tags(self, application, calls):
+        application.test_client.get("/cached/")
+        application.test_client.get("/cached/?a=1")
+        application.test_client.get("/item/1/")
+
+        request, response = application.test_client.post("/cached/")
+        assert response.status == 201
+
+        request, response = application.test_client.get("/cached/")
+        assert response.json == {"calls": 4}
+        application.test_client.get("/cached/?a=1")
+        application.test_client.get("/item/1/")
+
+        assert calls == ["", "a=1", "1", "", "a=1"]
+
+    def test_class_decorator(self, application, calls):
+        application.test_client.get("/item/1/")
+        request, response = application.test_client.get("/item/1/")
+        application.test_client.get("/item/2/")
+
+        assert response.json == {"item": "1"}
+        assert calls == ["1", "2"]
+
+    def test_must_decorate_view(self):
+        with pytest.raises(ImproperlyConfigured):
+
+            @cache_response()
+            class NotAView:
+                pass
+
+    def test_view_must_have_get(self):
+        with pytest.raises(ImproperlyConfigured):
+
+            @cache_response()
+            class PostView(InsanicView):
+                async def post(self, request):
+                    pass
+
+    async def test_streamed_response_is_not_cached(self, calls):
+        @cache_response(timeout=10)
+        async def streamed(request):
+            calls.append(True)
+
+            async def write(response):
+                await response.write(b"streamed")
+
+            return stream(write)
+
+        for _ in range(2):
+            request = Request(
+                b"/streamed/", CIMultiDict(), "1.1", "GET", None, None
+            )
+            response = await streamed(request)
+            assert isinstance(response, StreamingHTTPResponse)
+
+        assert len(calls) == 2
+
+
+class TestMicroCache:
+    @pytest.fixture()
+    def calls(self):
+        return []
+
+    @pytest.fixture()
+    def view(self, calls):
+        @public_facing
+        @micro_cache(timeout=0.2, vary_headers=["X-Vary"], max_entries=2)
+        async def view(request):
+            calls.append(request.query_string)
+            await asyncio.sleep(0.05)
+            status = int(request.args.get("status", 200))
+            return json({"calls": len(calls)}, status=status)
+
+        return view
+
+    def make_request(self, path="/", method="GET", headers=None):
+        return Request(
+            path.encode(),
+            CIMultiDict(headers or {}),
+            "1.1",
+            method,
+            None,
+            None,
+        )
+
+    async def test_concurrent_requests_are_collapsed(self, view, calls):
+        responses = await asyncio.gather(
+            *[view(self.make_request("/?a=1&b=2")) for _ in range(10)]
+        )
+
+        assert calls == ["a=1&b=2"]
+        assert len({id(r) for r in responses}) == 10
+        assert all(r.body == responses[0].body for r in responses)
+        assert all(r.content_type == "application/json" for r in responses)
+
+    async def test_response_is_cached_for_timeout(self, view, calls):
+        await view(self.make_request("/?a=1&b=2"))
+        await view(self.make_request("/?b=2&a=1"))
+
+        assert len(calls) == 1
+
+        await asyncio.sleep(0.2)
+        response = await view(self.make_request("/?a=1&b=2"))
+
+        assert len(calls) == 2
+        assert response.body == b'{"calls":2}'
+
+    async def test_vary_headers(self, view, calls):
+        await view(self.make_request(headers={"X-Vary": "a"}))
+        await view(self.make_request(headers={"X-Vary": "a"}))
+        await view(self.make_request(headers={"X-Vary": "b"}))
+
+        assert len(calls) == 2
+
+    async def test_non_200_is_not_cached(self, view, calls):
+        responses = await asyncio.gather(
+            *[view(self.make_request("/?status=404")) for _ in range(3)]
+        )
+        assert all(r.status == 404 for r in responses)
+
+        await view(self.make_request("/?status=404"))
+        assert len(calls) == 2
+
+    async def test_max_entries(self, view, calls):
+        for path in ("/?a=1", "/?a=2", "/?a=3", "/?a=1"):
+            await view(self.make_request(path))
+
+        assert len(calls) == 4
+        assert len(view.micro_cache_entries) == 2
+
+    async def test_non_get_is_not_cached(self, view, calls):
+        await view(self.make_request(method="POST"))
+        await view(self.make_request(method="POST"))
+
+        assert len(calls) == 2
+
+    async def test_streamed_response_is_not_shared(self, calls):
+        @micro_cache(timeout=10)
+        async def streamed(request):
+            calls.append(True)
+            await asyncio.sleep(0.05)
+
+            async def write(response):
+                await response.write(b"streamed")
+
+            return stream(write)
+
+        responses = await asyncio.gather(
+            *[streamed(self.make_request()) for _ in range(3)]
+        )
+
+        assert len(calls) == 3
+        assert len({id(r) for r in responses}) == 3
+        assert all(isinstance(r, StreamingHTTPResponse) for r in responses)
+        assert streamed.micro_cache_entries == {}
+
+    def test_public_facing_is_preserved(self, view):
+        assert view.scope == "public"
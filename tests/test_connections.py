@@ -0,0 +1,122 @@
+import asyncio
+import aioredis
+import pytest
+import uuid
+
+from insanic.conf import settings
+from insanic.connections import (
+    ConsistentHashRing,
+    ShardedConnectionsPool,
+    _connections,
+    get_connection,
+)
+
+
+@pytest.fixture(autouse=True)
+async def cache_connections(loop):
+    _connections.loop = loop
+    yield
+    await _connections.close_all()
+
+
+class TestConsistentHashRing:
+    keys = [uuid.uuid4().hex for _ in range(2000)]
+
+    def test_empty_ring(self):
+        ring = ConsistentHashRing()
+
+        with pytest.raises(LookupError):
+            ring.get_node("key")
+
+    def test_same_key_same_node(self):
+        ring = ConsistentHashRing(["a", "b", "c"])
+
+        assert ring.nodes == {"a", "b", "c"}
+        assert ring.get_node("key") == ring.get_node("key")
+
+    def test_keys_are_spread(self):
+        ring = ConsistentHashRing(["a", "b", "c", "d"])
+
+        counts = {}
+        for k in self.keys:
+            node = ring.get_node(k)
+            counts[node] = counts.get(node, 0) + 1
+
+        assert set(counts.keys()) == {"a", "b", "c", "d"}
+        for count in counts.values():
+            assert 250 < count < 750
+
+    def test_adding_node_remaps_small_fraction(self):
+        ring = ConsistentHashRing(["a", "b", "c", "d"])
+        before = {k: ring.get_node(k) for k in self.keys}
+
+        ring.add_node("e")
+        after = {k: ring.get_node(k) for k in self.keys}
+
+        moved = [k for k in self.keys if before[k] != after[k]]
+
+        assert all(after[k] == "e" for k in moved)
+        assert len(moved) < len(self.keys) * 0.35
+
+    def test_remove_node(self):
+        ring = ConsistentHashRing(["a", "b"])
+        ring.remove_node("b")
+
+        assert ring.nodes == {"a"}
+        assert all(ring.get_node(k) == "a" for k in self.keys[:100])
+
+
+class TestShardedConnection:
+    @pytest.fixture(autouse=True)
+    def sharded_cache(self, monkeypatch):
+        host = settings.CACHES["default"]["HOST"]
+        port = settings.CACHES["default"]["PORT"]
+
+        monkeypatch.setitem(
+            _connections.caches,
+            "sharded",
+            {
+                "NODES": [
+                    {"HOST": host, "PORT": port, "DATABASE": 3},
+                    {"HOST": host, "PORT": port, "DATABASE": 4},
+                ],
+                "VIRTUAL_NODES": 10,
+            },
+        )
+
+    async def test_key_is_required(self):
+        with pytest.raises(ValueError):
+            await get_connection("sharded")
+
+    async def test_keys_are_routed_to_nodes(self):
+        pool = await _connections.sharded
+        assert isinstance(pool, ShardedConnectionsPool)
+
+        databases = set()
+        for i in range(50):
+            key = f"key{i}"
+            redis = await get_connection("sharded", key)
+            with await redis as conn:
+                await conn.set(key, "value", expire=10)
+
+            node = pool.ring.get_node(key)
+            assert redis.db == int(node.rsplit("/", 1)[-1])
+            databases.add(redis.db)
+
+        assert databases == {3, 4}
+
+    async def test_close(self):
+        await get_connection("sharded", "key")
+        await _connections.close("sharded")
+
+        assert not hasattr(_connections._connections, "sharded")
+
+
+async def test_concurrent_connections_share_pool():
+    redis_clients = await asyncio.gather(
+        *[get_connection("default") for _ in range(10)]
+    )
+
+    pools = {id(r.connection) for r in redis_clients}
+    assert len(pools) == 1
+    assert isinstance(redis_clients[0].connection, aioredis.ConnectionsPool)
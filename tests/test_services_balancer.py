@@ -0,0 +1,157 @@
+import httpx
+import pytest
+import ujson
+
+from httpx import URL
+
+from insanic.conf import settings
+from insanic.exceptions import APIException
+from insanic.services import Service
+from insanic.services.balancer import LoadBalancer
+
+
+class TestLoadBalancer:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(LoadBalancer, "timer", lambda *a: self.now)
+
+    def balancer(self, count=2, **kwargs):
+        return LoadBalancer(
+            [URL(f"http://10.0.0.{i}:8000") for i in range(count)], **kwargs
+        )
+
+    def test_needs_endpoints(self):
+        with pytest.raises(ValueError):
+            LoadBalancer([])
+
+    def test_prefers_less_outstanding_requests(self):
+        balancer = self.balancer()
+        first = balancer.acquire()
+        second = balancer.acquire()
+
+        assert first is not second
+        assert first.outstanding == second.outstanding == 1
+
+        balancer.release(first, 0.1)
+        balancer.release(second, 0.1)
+        assert first.outstanding == second.outstanding == 0
+
+    def test_prefers_lower_latency(self):
+        balancer = self.balancer()
+        fast, slow = balancer.endpoints
+        balancer.release(balancer.acquire(), 0.01)
+        fast.outstanding = slow.outstanding = 0
+        fast.latency, slow.latency = 0.01, 1
+
+        assert {balancer.acquire() for _ in range(20)} == {fast}
+
+    def test_latency_average(self):
+        balancer = self.balancer(count=1, decay=10)
+        endpoint = balancer.endpoints[0]
+
+        balancer.release(balancer.acquire(), 0.1)
+        assert endpoint.latency == 0.1
+
+        # an increase is taken at once
+        balancer.release(balancer.acquire(), 1)
+        assert endpoint.latency == 1
+
+        # a decrease is averaged over time
+        self.now += 10
+        balancer.release(balancer.acquire(), 0.1)
+        assert 0.1 < endpoint.latency < 1
+
+    def test_outlier_ejection(self):
+        balancer = self.balancer(count=4, consecutive_failures=2)
+        bad = balancer.endpoints[0]
+
+        bad.outstanding += 2
+        balancer.release(bad, failed=True)
+        assert bad in balancer.available()
+        balancer.release(bad, failed=True)
+        assert bad not in balancer.available()
+
+        self.now += 30
+        assert bad in balancer.available()
+
+    def test_success_resets_failures(self):
+        balancer = self.balancer(consecutive_failures=2)
+        endpoint = balancer.endpoints[0]
+
+        balancer.release(endpoint, failed=True)
+        balancer.release(endpoint, 0.1)
+        balancer.release(endpoint, failed=True)
+
+        assert endpoint in balancer.available()
+
+    def test_max_ejected(self):
+        balancer = self.balancer(
+            count=2, consecutive_failures=1, max_ejected=0.5
+        )
+        first, second = balancer.endpoints
+
+        balancer.release(first, failed=True)
+        balancer.release(second, failed=True)
+
+        assert balancer.available() == [second]
+
+    def test_update_keeps_state(self):
+        balancer = self.balancer()
+        balancer.endpoints[1].latency = 0.5
+
+        balancer.update([URL("http://10.0.0.1:8000"), URL("http://10.0.0.9")])
+
+        assert len(balancer.endpoints) == 2
+        assert balancer.endpoints[0].latency == 0.5
+        assert balancer.endpoints[1].latency == 0
+
+
+class TestServiceLoadBalancing:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_ENDPOINTS",
+            {"test": ["10.0.0.1:8000", "http://10.0.0.2:9000"]},
+        )
+        monkeypatch.setattr(settings, "SERVICE_OUTLIER_CONSECUTIVE_FAILURES", 2)
+        monkeypatch.setattr(
+            settings, "SERVICE_CONNECTION_DEFAULT_RETRY_COUNT", 0
+        )
+        self.sent = []
+        self.failing = set()
+        self.service = Service("test")
+        self.service.client.send = self.send
+
+    async def send(self, request, **kwargs):
+        self.sent.append(request)
+        if request.url.host in self.failing:
+            raise httpx.ConnectError("error", request=request)
+        return httpx.Response(
+            200, request=request, content=ujson.dumps(request.url.host).encode()
+        )
+
+    def test_without_endpoints(self):
+        assert Service("other").balancer is None
+
+    async def test_requests_are_balanced(self):
+        hosts = [
+            await self.service.http_dispatch("GET", "/") for _ in range(40)
+        ]
+
+        assert set(hosts) == {"10.0.0.1", "10.0.0.2"}
+        assert {r.url.port for r in self.sent} == {8000, 9000}
+        assert all(r.headers["host"] == "test:8000" for r in self.sent)
+
+    async def test_failing_endpoint_is_ejected(self):
+        self.failing.add("10.0.0.1")
+
+        for _ in range(20):
+            try:
+                await self.service.http_dispatch("GET", "/")
+            except APIException:
+                pass
+
+        failed = [r for r in self.sent if r.url.host == "10.0.0.1"]
+        assert len(failed) == 2
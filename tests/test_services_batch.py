@@ -0,0 +1,113 @@
+import asyncio
+import httpx
+import pytest
+
+from insanic.conf import settings
+from insanic.exceptions import APIException, DeadlineExceeded
+from insanic.services import Service, scatter_gather
+from insanic.services.utils import set_context_deadline
+
+
+class TestDispatchMany:
+    @pytest.fixture(autouse=True)
+    def services(self, monkeypatch):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.deadlines = []
+
+        async def send(request, **kwargs):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.deadlines.append(
+                request.headers.get(settings.INTERNAL_REQUEST_DEADLINE_HEADER)
+            )
+            try:
+                path = request.url.path
+                if path.startswith("/slow/"):
+                    await asyncio.sleep(1)
+                else:
+                    await asyncio.sleep(0.01)
+                status_code = 404 if path.startswith("/missing/") else 200
+                return httpx.Response(
+                    status_code,
+                    request=request,
+                    json={"host": request.url.host, "path": path},
+                )
+            finally:
+                self.in_flight -= 1
+
+        self.user = Service("user")
+        self.order = Service("order")
+        self.user.client.send = send
+        self.order.client.send = send
+
+    async def test_results_in_order(self):
+        results = await self.user.dispatch_many(
+            [{"method": "GET", "endpoint": f"/{i}/"} for i in range(5)]
+        )
+
+        assert [r["path"] for r in results] == [f"/{i}/" for i in range(5)]
+
+    async def test_concurrency(self):
+        await self.user.dispatch_many(
+            [{"method": "GET", "endpoint": f"/{i}/"} for i in range(10)],
+            concurrency=3,
+        )
+
+        assert self.max_in_flight == 3
+
+    async def test_errors_per_item(self):
+        results = await self.user.dispatch_many(
+            [
+                {"method": "GET", "endpoint": "/1/"},
+                {
+                    "method": "GET",
+                    "endpoint": "/missing/",
+                    "propagate_error": True,
+                },
+                {"method": "GET", "endpoint": "/2/"},
+            ]
+        )
+
+        assert results[0]["path"] == "/1/"
+        assert isinstance(results[1], APIException)
+        assert results[1].status_code == 404
+        assert results[2]["path"] == "/2/"
+
+    async def test_partial_results_after_timeout(self):
+        results = await self.user.dispatch_many(
+            [
+                {"method": "GET", "endpoint": "/1/"},
+                {"method": "GET", "endpoint": "/slow/"},
+            ],
+            timeout=0.2,
+        )
+
+        assert results[0]["path"] == "/1/"
+        assert isinstance(results[1], DeadlineExceeded)
+        assert 0 < int(self.deadlines[0]) <= 200
+
+    async def test_request_deadline(self):
+        set_context_deadline(0.2)
+
+        results = await self.user.dispatch_many(
+            [{"method": "GET", "endpoint": "/slow/"}], timeout=5
+        )
+
+        assert isinstance(results[0], DeadlineExceeded)
+
+    async def test_empty(self):
+        assert await self.user.dispatch_many([]) == []
+
+    async def test_scatter_gather(self):
+        results = await scatter_gather(
+            [
+                (self.user, {"method": "GET", "endpoint": "/1/"}),
+                (self.order, {"method": "GET", "endpoint": "/2/"}),
+            ]
+        )
+
+        assert [r["host"] for r in results] == [
+            self.user.host,
+            self.order.host,
+        ]
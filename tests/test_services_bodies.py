@@ -0,0 +1,112 @@
+import httpx
+import io
+import pytest
+import ujson
+
+from insanic.exceptions import APIException
+from insanic.services import Service
+from insanic.services.streaming import iter_file
+
+
+class AsyncFile:
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+
+    async def read(self, size=-1):
+        return self.file.read(size)
+
+
+class TestRequestBodies:
+    @pytest.fixture(autouse=True)
+    def service(self):
+        self.sent = []
+        self.status_code = 200
+
+        async def send(request, **kwargs):
+            body = b"".join([chunk async for chunk in request.stream])
+            self.sent.append((request, body))
+            return httpx.Response(
+                self.status_code, request=request, content=b"{}"
+            )
+
+        self.service = Service("test")
+        self.service.client.send = send
+
+    async def test_json(self):
+        await self.service.http_dispatch("POST", "/", json={"a": [1, "b"]})
+
+        request, body = self.sent[0]
+        assert ujson.loads(body) == {"a": [1, "b"]}
+        assert request.headers["content-type"] == "application/json"
+
+    async def test_encoded_json_is_sent_as_is(self):
+        await self.service.http_dispatch(
+            "POST",
+            "/",
+            json=b'{"a": 1}',
+            headers={"content-type": "application/vnd.api+json"},
+        )
+
+        request, body = self.sent[0]
+        assert body == b'{"a": 1}'
+        assert request.headers["content-type"] == "application/vnd.api+json"
+
+    async def test_content_from_async_iterator(self):
+        async def chunks():
+            yield b"a" * 10
+            yield b"b" * 10
+
+        await self.service.http_dispatch("PUT", "/", content=chunks())
+
+        request, body = self.sent[0]
+        assert body == b"a" * 10 + b"b" * 10
+
+    @pytest.mark.parametrize("file_class", (io.BytesIO, AsyncFile))
+    async def test_content_from_file(self, file_class):
+        data = bytes(range(256)) * 1000
+
+        await self.service.http_dispatch("PUT", "/", content=file_class(data))
+
+        request, body = self.sent[0]
+        assert body == data
+
+    async def test_streamed_body_is_not_retried(self):
+        self.status_code = 503
+
+        async def chunks():
+            yield b"a"
+
+        with pytest.raises(APIException):
+            await self.service.http_dispatch(
+                "GET", "/", content=chunks(), retry_count=2
+            )
+
+        assert len(self.sent) == 1
+
+    async def test_payload(self):
+        await self.service.http_dispatch("POST", "/", payload={"a": "b"})
+
+        request, body = self.sent[0]
+        assert body == b"a=b"
+
+    @pytest.mark.parametrize(
+        "body", ({"json": {"a": 1}}, {"content": b"a"}, {"json": b"{}"})
+    )
+    def test_payload_with_body(self, body):
+        with pytest.raises(ValueError):
+            self.service.http_dispatch("POST", "/", payload={"a": "b"}, **body)
+
+        assert self.sent == []
+
+    async def test_json_without_payload(self):
+        await self.service.http_dispatch("POST", "/", json=[1])
+
+        request, body = self.sent[0]
+        assert body == b"[1]"
+        assert request.headers["content-length"] == "3"
+
+
+async def test_iter_file_chunks():
+    chunks = [c async for c in iter_file(io.BytesIO(b"abcde"), chunk_size=2)]
+
+    assert chunks == [b"ab", b"cd", b"e"]
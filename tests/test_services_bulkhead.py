@@ -0,0 +1,125 @@
+import asyncio
+import httpx
+import pytest
+
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.services import Service
+from insanic.services import bulkhead as bulkhead_module
+from insanic.services.bulkhead import Bulkhead, BulkheadFull
+
+
+class TestBulkhead:
+    @pytest.fixture()
+    def bulkhead(self):
+        return Bulkhead("test", max_concurrency=2, max_queue=1, max_wait=0.05)
+
+    async def test_rejects_when_full(self, bulkhead):
+        await bulkhead.acquire()
+        await bulkhead.acquire()
+        waiting = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+
+        assert bulkhead.queued == 1
+
+        with pytest.raises(BulkheadFull):
+            await bulkhead.acquire()
+
+        bulkhead.release()
+        await waiting
+
+        assert bulkhead.in_flight == 2
+        assert bulkhead.queued == 0
+
+    async def test_rejects_after_max_wait(self, bulkhead):
+        await bulkhead.acquire()
+        await bulkhead.acquire()
+
+        with pytest.raises(BulkheadFull):
+            await bulkhead.acquire()
+
+        assert bulkhead.in_flight == 2
+        assert bulkhead.queued == 0
+
+    async def test_cancelled_waiter_does_not_take_slot(self, bulkhead):
+        await bulkhead.acquire()
+        await bulkhead.acquire()
+        waiting = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        await asyncio.sleep(0)
+        bulkhead.release()
+
+        assert bulkhead.in_flight == 1
+
+    async def test_call_releases(self, bulkhead):
+        async def fail():
+            raise RuntimeError()
+
+        with pytest.raises(RuntimeError):
+            await bulkhead.call(fail)
+
+        assert bulkhead.in_flight == 0
+
+    def test_from_settings(self, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_BULKHEADS", {"test": {"MAX_CONCURRENCY": 5}}
+        )
+
+        bulkhead = Bulkhead.from_settings("test")
+
+        assert bulkhead.max_concurrency == 5
+        assert bulkhead.max_queue == 0
+        assert bulkhead.max_wait is None
+        assert Bulkhead.from_settings("other") is None
+
+
+class TestServiceBulkhead:
+    @pytest.fixture(autouse=True)
+    def services(self, monkeypatch):
+        monkeypatch.setattr(bulkhead_module, "_bulkheads", {})
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_BULKHEADS",
+            {"recommendations": {"MAX_CONCURRENCY": 1, "MAX_QUEUE": 1}},
+        )
+        self.sent = []
+
+        async def send(request, **kwargs):
+            self.sent.append(request.url.host)
+            if "recommendations" in request.url.host:
+                await asyncio.sleep(0.05)
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.recommendations = Service("recommendations")
+        self.auth = Service("auth")
+        self.recommendations.client.send = send
+        self.auth.client.send = send
+
+    async def test_full_bulkhead_rejects(self):
+        results = await asyncio.gather(
+            *[self.recommendations.http_dispatch("GET", "/") for _ in range(3)],
+            return_exceptions=True,
+        )
+
+        assert results[:2] == [{}, {}]
+        assert isinstance(results[2], BulkheadFull)
+        assert results[2].error_code == GlobalErrorCodes.service_unavailable
+
+    async def test_other_services_are_not_affected(self):
+        slow = [
+            self.recommendations.http_dispatch("GET", "/") for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+
+        assert await self.auth.http_dispatch("GET", "/") == {}
+        assert self.auth.bulkhead is None
+        assert self.recommendations.bulkhead.in_flight == 1
+
+        await asyncio.gather(*slow)
+
+    async def test_shared_between_services(self):
+        assert (
+            Service("recommendations").bulkhead is self.recommendations.bulkhead
+        )
@@ -0,0 +1,226 @@
+import asyncio
+import httpx
+import pytest
+import ujson
+
+from insanic.conf import settings
+from insanic.connections import _connections
+from insanic.exceptions import APIException
+from insanic.services import Service
+from insanic.services.cache import (
+    CachedResponse,
+    ResponseCache,
+    parse_cache_control,
+)
+
+
+def test_parse_cache_control():
+    assert parse_cache_control(None) == {}
+    assert parse_cache_control(
+        'max-age=60, Stale-If-Error=300, public, private="x"'
+    ) == {"max-age": 60, "stale-if-error": 300, "public": True, "private": "x"}
+
+
+class TestCachedResponse:
+    def response(self, headers, status_code=200, method="GET"):
+        request = httpx.Request(method, "http://test:8000/")
+        return httpx.Response(
+            status_code, request=request, headers=headers, content=b"{}"
+        )
+
+    @pytest.mark.parametrize(
+        "headers, status_code, method",
+        (
+            ({}, 200, "GET"),
+            ({"cache-control": "max-age=60"}, 500, "GET"),
+            ({"cache-control": "max-age=60"}, 200, "POST"),
+            ({"cache-control": "max-age=60, no-store"}, 200, "GET"),
+            ({"cache-control": "max-age=60, private"}, 200, "GET"),
+            ({"cache-control": "max-age=60", "vary": "*"}, 200, "GET"),
+            ({"cache-control": "no-cache"}, 200, "GET"),
+        ),
+    )
+    def test_not_storable(self, headers, status_code, method):
+        response = self.response(headers, status_code, method)
+        assert CachedResponse.from_response(response, 0) is None
+
+    def test_freshness(self):
+        entry = CachedResponse.from_response(
+            self.response(
+                {
+                    "cache-control": "max-age=60, stale-while-revalidate=30, "
+                    "stale-if-error=120",
+                    "age": "10",
+                }
+            ),
+            100,
+        )
+
+        assert entry.stored_at == 90
+        assert entry.is_fresh(149)
+        assert not entry.is_fresh(150)
+        assert entry.can_serve_while_revalidating(179)
+        assert not entry.can_serve_while_revalidating(180)
+        assert entry.can_serve_on_error(269)
+        assert not entry.can_serve_on_error(270)
+        assert entry.retention == 180
+        assert "content-length" not in dict(entry.headers)
+
+    def test_validators(self):
+        entry = CachedResponse.from_response(
+            self.response({"cache-control": "no-cache", "etag": '"a"'}), 0
+        )
+
+        assert not entry.is_fresh(0)
+        assert entry.conditional_headers() == {"if-none-match": '"a"'}
+
+    def test_serialization(self):
+        entry = CachedResponse.from_response(
+            self.response({"cache-control": "max-age=60"}), 0
+        )
+        entry.content = bytes(range(256))
+
+        data = ujson.loads(ujson.dumps(entry.to_dict()))
+        restored = CachedResponse.from_dict(data)
+
+        assert restored.content == entry.content
+        assert restored.max_age == 60
+
+
+class TestServiceResponseCache:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        self.now = 1000.0
+        self.sent = []
+        self.responses = []
+        monkeypatch.setattr(settings, "SERVICE_RESPONSE_CACHE", True)
+        monkeypatch.setattr(ResponseCache, "timer", lambda *a: self.now)
+
+        self.service = Service("test")
+        self.service.client.send = self.send
+
+    async def send(self, request, **kwargs):
+        self.sent.append(request)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+
+        status_code, headers, body = response
+        return httpx.Response(
+            status_code,
+            request=request,
+            headers=headers,
+            content=ujson.dumps(body).encode(),
+        )
+
+    async def test_fresh_response_is_served_from_cache(self):
+        self.responses.append((200, {"cache-control": "max-age=60"}, [1]))
+
+        assert await self.service.http_dispatch("GET", "/") == [1]
+        self.now += 59
+        assert await self.service.http_dispatch("GET", "/") == [1]
+        assert len(self.sent) == 1
+
+        self.responses.append((200, {"cache-control": "max-age=60"}, [2]))
+        self.now += 1
+        assert await self.service.http_dispatch("GET", "/") == [2]
+        assert len(self.sent) == 2
+
+    async def test_cache_can_be_disabled(self):
+        self.responses.append((200, {"cache-control": "max-age=60"}, [1]))
+        self.responses.append((200, {"cache-control": "max-age=60"}, [2]))
+
+        await self.service.http_dispatch("GET", "/", use_cache=False)
+        await self.service.http_dispatch("GET", "/", use_cache=False)
+
+        assert len(self.sent) == 2
+
+    async def test_revalidation(self):
+        self.responses.append(
+            (200, {"cache-control": "no-cache", "etag": '"v1"'}, [1])
+        )
+        self.responses.append(
+            (304, {"etag": '"v1"', "cache-control": "max-age=60"}, None)
+        )
+
+        assert await self.service.http_dispatch("GET", "/") == [1]
+        assert await self.service.http_dispatch("GET", "/") == [1]
+
+        assert self.sent[1].headers["if-none-match"] == '"v1"'
+
+        # the 304 updated the freshness
+        assert await self.service.http_dispatch("GET", "/") == [1]
+        assert len(self.sent) == 2
+
+    async def test_stale_while_revalidate(self):
+        headers = {"cache-control": "max-age=10, stale-while-revalidate=60"}
+        self.responses.append((200, headers, [1]))
+        self.responses.append((200, headers, [2]))
+
+        await self.service.http_dispatch("GET", "/")
+        self.now += 20
+
+        assert await self.service.http_dispatch("GET", "/") == [1]
+        await asyncio.sleep(0)
+        assert len(self.sent) == 2
+        assert await self.service.http_dispatch("GET", "/") == [2]
+
+    async def test_stale_if_error(self, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_CONNECTION_DEFAULT_RETRY_COUNT", 0
+        )
+        headers = {"cache-control": "max-age=10, stale-if-error=60"}
+        self.responses.append((200, headers, [1]))
+        self.responses.append((503, {}, {}))
+        self.responses.append(httpx.ConnectError("error", request=None))
+        self.responses.append((503, {}, {}))
+
+        await self.service.http_dispatch("GET", "/")
+        self.now += 20
+        assert await self.service.http_dispatch("GET", "/") == [1]
+        assert await self.service.http_dispatch("GET", "/") == [1]
+
+        self.now += 60
+        with pytest.raises(APIException):
+            await self.service.http_dispatch("GET", "/")
+
+    async def test_vary(self):
+        headers = {"cache-control": "max-age=60", "vary": "accept-language"}
+        self.responses.append((200, headers, [1]))
+        self.responses.append((200, headers, [2]))
+
+        await self.service.http_dispatch(
+            "GET", "/", headers={"accept-language": "en"}
+        )
+        await self.service.http_dispatch(
+            "GET", "/", headers={"accept-language": "en"}
+        )
+        response = await self.service.http_dispatch(
+            "GET", "/", headers={"accept-language": "ko"}
+        )
+
+        assert response == [2]
+        assert len(self.sent) == 2
+
+    async def test_bounded_entries(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_RESPONSE_CACHE_MAX_ENTRIES", 2)
+        for i in range(3):
+            self.responses.append((200, {"cache-control": "max-age=60"}, i))
+            await self.service.http_dispatch("GET", f"/{i}/")
+
+        assert len(self.service.response_cache) == 2
+
+    async def test_shared_with_alias(self, monkeypatch, loop):
+        monkeypatch.setattr(settings, "SERVICE_RESPONSE_CACHE_ALIAS", "default")
+        _connections.loop = loop
+
+        self.responses.append((200, {"cache-control": "max-age=60"}, [1]))
+        await self.service.http_dispatch("GET", "/")
+
+        other = Service("test")
+        other.client.send = self.send
+
+        assert await other.http_dispatch("GET", "/") == [1]
+        assert len(self.sent) == 1
+
+        await _connections.close_all()
@@ -0,0 +1,174 @@
+import asyncio
+import httpx
+import pytest
+
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.exceptions import APIException
+from insanic.metrics import InsanicMetrics
+from insanic.services import Service
+from insanic.services.circuitbreaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+class TestCircuitBreaker:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(CircuitBreaker, "timer", lambda *a: self.now)
+
+    @pytest.fixture()
+    def breaker(self):
+        return CircuitBreaker(
+            "test",
+            failure_rate_threshold=0.5,
+            slow_call_rate_threshold=0.5,
+            slow_call_duration=1,
+            window=10,
+            minimum_calls=4,
+            open_duration=30,
+            half_open_calls=2,
+        )
+
+    def state_metric(self):
+        return InsanicMetrics.registry.get_sample_value(
+            "service_circuit_breaker_state", {"service": "test"}
+        )
+
+    def test_opens_on_failure_rate(self, breaker):
+        for failed in (False, False, True):
+            breaker.record(0.1, failed)
+        assert breaker.state == CLOSED
+
+        breaker.record(0.1, True)
+        assert breaker.state == OPEN
+        assert breaker.allow_request() is False
+        assert self.state_metric() == 2
+
+    def test_opens_on_slow_calls(self, breaker):
+        for duration in (0.1, 0.1, 2, 2):
+            breaker.record(duration, False)
+
+        assert breaker.state == OPEN
+
+    def test_minimum_calls(self, breaker):
+        for _ in range(3):
+            breaker.record(0.1, True)
+
+        assert breaker.state == CLOSED
+
+    def test_window_rolls(self, breaker):
+        for _ in range(3):
+            breaker.record(0.1, True)
+
+        self.now += 10
+        breaker.record(0.1, True)
+        assert breaker.state == CLOSED
+
+    def test_half_open_closes(self, breaker):
+        for _ in range(4):
+            breaker.record(0.1, True)
+
+        self.now += 30
+        assert breaker.allow_request() is True
+        assert breaker.state == HALF_OPEN
+        assert self.state_metric() == 1
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+        breaker.record(0.1, False)
+        assert breaker.state == HALF_OPEN
+        breaker.record(0.1, False)
+        assert breaker.state == CLOSED
+        assert self.state_metric() == 0
+
+    def test_half_open_reopens(self, breaker):
+        for _ in range(4):
+            breaker.record(0.1, True)
+
+        self.now += 30
+        assert breaker.allow_request() is True
+        breaker.record(0.1, True)
+
+        assert breaker.state == OPEN
+        assert breaker.allow_request() is False
+
+    async def test_call(self, breaker):
+        async def fail():
+            raise ValueError()
+
+        for _ in range(4):
+            with pytest.raises(ValueError):
+                await breaker.call(fail)
+
+        with pytest.raises(CircuitOpenError) as exc_info:
+            await breaker.call(fail)
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.error_code == GlobalErrorCodes.service_unavailable
+
+    async def test_cancelled_call_releases_trial(self, breaker):
+        for _ in range(4):
+            breaker.record(0.1, True)
+        self.now += 30
+
+        for _ in range(2):
+            task = asyncio.ensure_future(breaker.call(asyncio.sleep, 10))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request() is True
+
+
+class TestServiceCircuitBreaker:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CIRCUIT_BREAKER", True)
+        monkeypatch.setattr(
+            settings, "SERVICE_CIRCUIT_BREAKER_MINIMUM_CALLS", 3
+        )
+        self.sent = []
+        self.service = Service("test")
+
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            raise httpx.ConnectError("error", request=request)
+
+        self.service.client.send = send
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CIRCUIT_BREAKER", False)
+
+        assert Service("test").circuit_breaker is None
+
+    async def test_fails_fast_while_open(self):
+        for _ in range(3):
+            with pytest.raises(APIException):
+                await self.service.http_dispatch("POST", "/")
+
+        assert self.service.circuit_breaker.state == OPEN
+
+        with pytest.raises(CircuitOpenError):
+            await self.service.http_dispatch("GET", "/")
+
+        assert len(self.sent) == 3
+
+    async def test_client_errors_are_not_failures(self):
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            return httpx.Response(404, request=request, content=b"{}")
+
+        self.service.client.send = send
+
+        for _ in range(5):
+            await self.service.http_dispatch("GET", "/")
+
+        assert self.service.circuit_breaker.state == CLOSED
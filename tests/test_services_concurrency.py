@@ -0,0 +1,175 @@
+import asyncio
+import httpx
+import pytest
+
+from insanic.conf import settings
+from insanic.exceptions import APIException
+from insanic.metrics import InsanicMetrics
+from insanic.services import Service
+from insanic.services.concurrency import (
+    ConcurrencyLimiter,
+    ConcurrencyLimitExceeded,
+)
+
+
+class TestConcurrencyLimiter:
+    @pytest.fixture()
+    def limiter(self):
+        return ConcurrencyLimiter(
+            "test",
+            initial_limit=10,
+            min_limit=2,
+            max_limit=20,
+            tolerance=1.5,
+            smoothing=0.2,
+            max_wait=0.01,
+        )
+
+    async def fill(self, limiter, count):
+        for _ in range(count):
+            await limiter.acquire()
+
+    def limit_metric(self):
+        return InsanicMetrics.registry.get_sample_value(
+            "service_concurrency_limit", {"service": "test"}
+        )
+
+    async def test_limit_grows_with_steady_latency(self, limiter):
+        await self.fill(limiter, 10)
+
+        for _ in range(30):
+            limiter.release(0.1)
+            await limiter.acquire()
+
+        assert limiter.limit == 20
+        assert self.limit_metric() == 20
+
+    async def test_limit_shrinks_when_latency_rises(self, limiter):
+        await self.fill(limiter, 10)
+        limiter.release(0.1)
+        limit = limiter.limit
+
+        for _ in range(5):
+            limiter.release(1.0)
+
+            assert limiter.limit < limit
+            limit = limiter.limit
+
+        assert limiter.limit < 10
+        assert self.limit_metric() == limiter.limit
+
+    async def test_limit_is_kept_when_not_used(self, limiter):
+        await self.fill(limiter, 2)
+        limiter.release(0.1)
+        limiter.release(10)
+
+        assert limiter.limit == 10
+
+    async def test_dropped_requests_shrink_limit(self, limiter):
+        await self.fill(limiter, 1)
+        limiter.release(dropped=True)
+
+        assert limiter.limit == 9
+
+        for _ in range(20):
+            await limiter.acquire()
+            limiter.release(dropped=True)
+
+        assert limiter.limit == 2
+
+    async def test_requests_wait_for_limit(self, limiter):
+        await self.fill(limiter, 10)
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        assert not waiting.done()
+        assert limiter.queued == 1
+
+        limiter.release()
+        await waiting
+
+        assert limiter.in_flight == 10
+        assert limiter.queued == 0
+
+    async def test_requests_rejected_after_max_wait(self, limiter):
+        await self.fill(limiter, 10)
+
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await limiter.acquire()
+
+        assert limiter.in_flight == 10
+        assert (
+            InsanicMetrics.registry.get_sample_value(
+                "service_concurrency_queue_wait_seconds_count",
+                {"service": "test"},
+            )
+            == 11
+        )
+
+    async def test_cancelled_waiter_does_not_take_slot(self, limiter):
+        await self.fill(limiter, 10)
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+
+        assert limiter.in_flight == 9
+
+    async def test_call(self, limiter):
+        async def fail():
+            raise asyncio.TimeoutError()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.call(fail)
+
+        assert limiter.in_flight == 0
+        assert limiter.limit == 9
+
+
+class TestServiceConcurrencyLimit:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CONCURRENCY_LIMIT", True)
+        monkeypatch.setattr(settings, "SERVICE_CONCURRENCY_LIMIT_INITIAL", 2)
+        monkeypatch.setattr(settings, "SERVICE_CONCURRENCY_LIMIT_MIN", 1)
+        monkeypatch.setattr(
+            settings, "SERVICE_CONCURRENCY_LIMIT_MAX_WAIT", 0.01
+        )
+        self.sent = []
+        self.service = Service("test")
+
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.service.client.send = send
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CONCURRENCY_LIMIT", False)
+
+        assert Service("test").concurrency_limiter is None
+
+    async def test_rejects_over_limit(self):
+        results = await asyncio.gather(
+            *[self.service.http_dispatch("GET", "/") for _ in range(3)],
+            return_exceptions=True,
+        )
+
+        assert results[:2] == [{}, {}]
+        assert isinstance(results[2], ConcurrencyLimitExceeded)
+        assert len(self.sent) == 2
+        assert self.service.concurrency_limiter.in_flight == 0
+
+    async def test_timeouts_shrink_limit(self):
+        async def send(request, **kwargs):
+            raise httpx.ReadTimeout("timeout", request=request)
+
+        self.service.client.send = send
+
+        with pytest.raises(APIException):
+            await self.service.http_dispatch("POST", "/")
+
+        assert self.service.concurrency_limiter.limit == 1.8
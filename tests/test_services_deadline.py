@@ -0,0 +1,188 @@
+import asyncio
+import httpx
+import pytest
+
+from sanic.response import json
+
+from insanic import Insanic, status
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.exceptions import APIException, DeadlineExceeded
+from insanic.services import Service
+from insanic.services import bulkhead as bulkhead_module
+from insanic.services.adapters import Timeout
+from insanic.services.utils import deadline_remaining, set_context_deadline
+from insanic.views import InsanicView
+
+
+class TestIncomingDeadline:
+    @pytest.fixture()
+    def app(self):
+        app = Insanic("test")
+        remaining = self.remaining = []
+
+        class DeadlineView(InsanicView):
+            authentication_classes = []
+            permission_classes = []
+
+            def get(self, request):
+                remaining.append(deadline_remaining())
+                return json({})
+
+        class TimeoutView(DeadlineView):
+            timeout = 1
+
+        app.add_route(DeadlineView.as_view(), "/")
+        app.add_route(TimeoutView.as_view(), "/timeout/")
+        return app
+
+    def get(self, app, path, deadline=None):
+        headers = {}
+        if deadline is not None:
+            headers[settings.INTERNAL_REQUEST_DEADLINE_HEADER] = deadline
+        return app.test_client.get(path, headers=headers)
+
+    def test_no_deadline(self, app):
+        request, response = self.get(app, "/")
+
+        assert response.status == status.HTTP_200_OK
+        assert self.remaining == [None]
+
+    def test_deadline_from_header(self, app):
+        request, response = self.get(app, "/", "2000")
+
+        assert response.status == status.HTTP_200_OK
+        assert 1.5 < self.remaining[0] <= 2
+
+    def test_invalid_header_is_ignored(self, app):
+        request, response = self.get(app, "/", "soon")
+
+        assert response.status == status.HTTP_200_OK
+        assert self.remaining == [None]
+
+    def test_passed_deadline_is_rejected(self, app):
+        request, response = self.get(app, "/", "0")
+
+        assert response.status == status.HTTP_504_GATEWAY_TIMEOUT
+        assert (
+            GlobalErrorCodes(response.json["error_code"]["value"])
+            == GlobalErrorCodes.deadline_exceeded
+        )
+        assert self.remaining == []
+
+    def test_view_timeout(self, app):
+        request, response = self.get(app, "/timeout/")
+
+        assert response.status == status.HTTP_200_OK
+        assert 0.5 < self.remaining[0] <= 1
+
+    def test_earlier_deadline_is_kept(self, app):
+        self.get(app, "/timeout/", "5000")
+        self.get(app, "/timeout/", "200")
+
+        assert 0.5 < self.remaining[0] <= 1
+        assert self.remaining[1] <= 0.2
+
+
+class TestOutgoingDeadline:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        self.sent = []
+        self.service = Service("test")
+
+        async def send(request, **kwargs):
+            self.sent.append((request, kwargs))
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.service.client.send = send
+
+    async def test_no_deadline(self):
+        await self.service.http_dispatch("GET", "/")
+
+        request, kwargs = self.sent[0]
+        assert settings.INTERNAL_REQUEST_DEADLINE_HEADER not in request.headers
+
+    async def test_deadline_is_forwarded(self):
+        set_context_deadline(2)
+
+        await self.service.http_dispatch("GET", "/")
+
+        request, kwargs = self.sent[0]
+        remaining = int(
+            request.headers[settings.INTERNAL_REQUEST_DEADLINE_HEADER]
+        )
+        assert 1500 < remaining <= 2000
+        assert 1.5 < kwargs["timeout"] <= 2
+
+    async def test_timeout_is_clipped(self):
+        set_context_deadline(10)
+
+        await self.service.http_dispatch("GET", "/")
+        await self.service.http_dispatch("GET", "/", response_timeout=1)
+
+        assert self.sent[0][1]["timeout"] == settings.SERVICE_TIMEOUT_TOTAL
+        assert self.sent[1][1]["timeout"] == 1
+
+    async def test_timeout_fields_are_clipped(self):
+        set_context_deadline(2)
+
+        await self.service.http_dispatch(
+            "GET", "/", response_timeout=Timeout(5, connect=1, pool=None)
+        )
+
+        timeout = self.sent[0][1]["timeout"]
+        assert timeout.connect == 1
+        for value in (timeout.read, timeout.write, timeout.pool):
+            assert 1.5 < value <= 2
+
+    async def test_queue_wait_is_charged(self, monkeypatch):
+        monkeypatch.setattr(bulkhead_module, "_bulkheads", {})
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_BULKHEADS",
+            {"test": {"MAX_CONCURRENCY": 1, "MAX_QUEUE": 1}},
+        )
+
+        async def send(request, **kwargs):
+            self.sent.append((request, kwargs))
+            await asyncio.sleep(0.5)
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.service.client.send = send
+        set_context_deadline(2)
+
+        await asyncio.gather(
+            *[self.service.http_dispatch("GET", "/") for _ in range(2)]
+        )
+
+        # the second request waited for the first in the bulkhead
+        request, kwargs = self.sent[1]
+        remaining = int(
+            request.headers[settings.INTERNAL_REQUEST_DEADLINE_HEADER]
+        )
+        assert 1000 < remaining <= 1500
+        assert 1 < kwargs["timeout"] <= 1.5
+
+    async def test_passed_deadline_is_not_sent(self):
+        set_context_deadline(-1)
+
+        with pytest.raises(DeadlineExceeded):
+            await self.service.http_dispatch("GET", "/")
+
+        assert self.sent == []
+
+    async def test_no_retry_after_deadline(self, monkeypatch):
+        async def send(request, **kwargs):
+            self.sent.append((request, kwargs))
+            raise httpx.ConnectError("error", request=request)
+
+        self.service.client.send = send
+        monkeypatch.setattr(
+            self.service.retry_policy, "backoff", lambda *args: 1.0
+        )
+        set_context_deadline(0.5)
+
+        with pytest.raises(APIException):
+            await self.service.http_dispatch("GET", "/", retry_count=2)
+
+        assert len(self.sent) == 1
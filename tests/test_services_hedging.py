@@ -0,0 +1,144 @@
+import asyncio
+import httpx
+import pytest
+import re
+import respx
+import ujson
+
+from insanic.conf import settings
+from insanic.services import Service
+from insanic.services import bulkhead as bulkhead_module
+from insanic.services.client import HEDGE_MIN_SAMPLES
+from insanic.services.retry import RetryBudget
+
+
+class TestServiceHedging:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_REQUESTS", True)
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_DELAY", 0.05)
+        self.responses = []
+        self.sent = []
+        self.cancelled = []
+        self.service = Service("test")
+
+        url = re.compile(
+            rf"^http://{self.service.url.host}:{self.service.url.port}/"
+        )
+        with respx.mock:
+            respx.get(url, content=self.content)
+            respx.post(url, content=self.content)
+            yield
+
+    async def content(self, request, **kwargs):
+        self.sent.append(request)
+        delay, result = self.responses.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(result)
+            raise
+
+        if isinstance(result, Exception):
+            raise result
+        return ujson.dumps(result).encode()
+
+    async def test_slow_request_is_hedged(self):
+        self.responses = [(1, "first"), (0, "second")]
+
+        assert await self.service.http_dispatch("GET", "/") == "second"
+        assert len(self.sent) == 2
+
+        await asyncio.sleep(0)
+        assert self.cancelled == ["first"]
+
+    async def test_fast_request_is_not_hedged(self):
+        self.responses = [(0, "first"), (0, "second")]
+
+        assert await self.service.http_dispatch("GET", "/") == "first"
+        assert len(self.sent) == 1
+
+    async def test_only_idempotent_methods(self):
+        self.responses = [(0.1, "first"), (0, "second")]
+
+        assert await self.service.http_dispatch("POST", "/") == "first"
+        assert len(self.sent) == 1
+
+    async def test_failed_request_waits_for_other(self, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_CONNECTION_DEFAULT_RETRY_COUNT", 0
+        )
+        self.responses = [
+            (0.1, httpx.ConnectError("error", request=None)),
+            (0.2, "second"),
+        ]
+
+        assert await self.service.http_dispatch("GET", "/") == "second"
+
+    async def test_budget(self):
+        self.service.hedge_budget = RetryBudget(
+            ratio=0, min_per_second=0, max_tokens=1
+        )
+        self.responses = [(0.1, "first"), (0, "second"), (0.1, "third")]
+
+        assert await self.service.http_dispatch("GET", "/") == "second"
+        assert await self.service.http_dispatch("GET", "/") == "third"
+        assert len(self.sent) == 3
+
+    async def test_delay_from_observed_latency(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_DELAY", None)
+        self.responses = [(0, "fast")] * HEDGE_MIN_SAMPLES
+
+        for _ in range(HEDGE_MIN_SAMPLES):
+            await self.service.http_dispatch("GET", "/", hedge=False)
+
+        self.responses = [(0.2, "slow"), (0, "hedged")]
+        assert await self.service.http_dispatch("GET", "/") == "hedged"
+
+        self.responses = [(0.2, "slow"), (0, "hedged")]
+        assert await self.service.http_dispatch("GET", "/other/") == "slow"
+
+    async def test_delay_excludes_queue_wait(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_DELAY", None)
+        monkeypatch.setattr(bulkhead_module, "_bulkheads", {})
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_BULKHEADS",
+            {"test": {"MAX_CONCURRENCY": 1, "MAX_QUEUE": HEDGE_MIN_SAMPLES}},
+        )
+        self.responses = [(0.01, "queued")] * HEDGE_MIN_SAMPLES
+
+        await asyncio.gather(
+            *[
+                self.service.http_dispatch("GET", "/", hedge=False)
+                for _ in range(HEDGE_MIN_SAMPLES)
+            ]
+        )
+
+        request = self.service.client.build_request("GET", "/")
+        # the last requests waited for the others for most of a second
+        assert self.service._hedge_delay(request) < 0.05
+
+    async def test_streamed_request_is_not_hedged(self):
+        self.responses = [(0.1, [1, 2]), (0, [3])]
+        closed = []
+        send = self.service.client.send
+
+        async def spy(request, **kwargs):
+            response = await send(request, **kwargs)
+            closed.append(response.is_closed)
+            return response
+
+        self.service.client.send = spy
+
+        items = [
+            item
+            async for item in self.service.http_dispatch(
+                "GET", "/", stream="json"
+            )
+        ]
+
+        assert items == [1, 2]
+        assert len(self.sent) == 1
+        # the body was not read before it was streamed
+        assert closed == [False]
@@ -304,6 +304,33 @@ class TestServiceClass:
         for h in required_headers:
             assert h in headers.keys()
 
+    async def test_inject_headers_coerces_values(self, loop):
+        headers = self.service._inject_headers({"content-length": 4})
+
+        assert headers["content-length"] == "4"
+
+    async def test_inject_headers_user(self, loop):
+        aiotask_context.set(settings.TASK_CONTEXT_REQUEST_USER, None)
+        headers = self.service._inject_headers({})
+
+        assert headers["x-insanic-request-user"] == to_header_value(
+            AnonymousUser
+        )
+
+        aiotask_context.set(
+            settings.TASK_CONTEXT_REQUEST_USER, {"id": "a", "level": 100}
+        )
+        headers = self.service._inject_headers({})
+
+        assert headers["x-insanic-request-user"] == "id=a;level=100"
+
+        aiotask_context.set(
+            settings.TASK_CONTEXT_REQUEST_USER, {"id": "b", "level": 100}
+        )
+        headers = self.service._inject_headers({})
+
+        assert headers["x-insanic-request-user"] == "id=b;level=100"
+
     @pytest.mark.parametrize(
         "exception",
         (
@@ -883,3 +910,118 @@ class TestRequestTaskContext:
             assert r.status == 200, resp
 
             assert resp["user"]["id"] == str(users[i].id)
+
+
+class TestServiceCoalescing:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        self.sent = []
+        self.service = Service("test")
+
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(
+                200, request=request, content=ujson.dumps({"a": "b"}).encode()
+            )
+
+        monkeypatch.setattr(self.service.client, "send", send)
+
+    async def test_identical_requests_are_coalesced(self):
+        responses = await asyncio.gather(
+            *[
+                self.service.http_dispatch(
+                    "GET", "/", query_params={"a": "b"}, coalesce=True
+                )
+                for _ in range(10)
+            ]
+        )
+
+        assert len(self.sent) == 1
+        assert responses == [{"a": "b"}] * 10
+        assert len(self.service._in_flight) == 0
+
+    async def test_coalesce_setting(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_COALESCE_REQUESTS", True)
+
+        await asyncio.gather(
+            *[self.service.http_dispatch("GET", "/") for _ in range(5)]
+        )
+
+        assert len(self.sent) == 1
+
+    async def test_not_coalesced_by_default(self):
+        await asyncio.gather(
+            *[self.service.http_dispatch("GET", "/") for _ in range(5)]
+        )
+
+        assert len(self.sent) == 5
+
+    async def test_different_requests_are_not_coalesced(self):
+        await asyncio.gather(
+            self.service.http_dispatch("GET", "/", coalesce=True),
+            self.service.http_dispatch("GET", "/a/", coalesce=True),
+            self.service.http_dispatch(
+                "GET", "/", query_params={"a": "b"}, coalesce=True
+            ),
+            self.service.http_dispatch(
+                "GET", "/", headers={"x-a": "b"}, coalesce=True
+            ),
+            self.service.http_dispatch("POST", "/", coalesce=True),
+            self.service.http_dispatch("POST", "/", coalesce=True),
+        )
+
+        assert len(self.sent) == 6
+
+    async def test_different_users_are_not_coalesced(self):
+        async def dispatch_as(user_id):
+            aiotask_context.set(
+                settings.TASK_CONTEXT_REQUEST_USER,
+                dict(User(id=user_id, level=UserLevels.ACTIVE)),
+            )
+            return await self.service.http_dispatch("GET", "/", coalesce=True)
+
+        await asyncio.gather(
+            asyncio.ensure_future(dispatch_as("a")),
+            asyncio.ensure_future(dispatch_as("a")),
+            asyncio.ensure_future(dispatch_as("b")),
+        )
+
+        assert len(self.sent) == 2
+
+    async def test_errors_are_shared(self, monkeypatch):
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            await asyncio.sleep(0.05)
+            raise httpx.ConnectTimeout("timeout", request=request)
+
+        monkeypatch.setattr(self.service.client, "send", send)
+        monkeypatch.setattr(
+            settings, "SERVICE_CONNECTION_DEFAULT_RETRY_COUNT", 0
+        )
+
+        results = await asyncio.gather(
+            *[
+                self.service.http_dispatch("GET", "/", coalesce=True)
+                for _ in range(3)
+            ],
+            return_exceptions=True,
+        )
+
+        assert len(self.sent) == 1
+        assert all(isinstance(r, ResponseTimeoutError) for r in results)
+
+
+def test_date_header(monkeypatch):
+    from insanic.services import utils
+
+    monkeypatch.setattr(utils, "get_utc_timestamp", lambda: 0.2)
+    assert utils.date_header() == "Thu, 01 Jan 70 00:00:00 +0000"
+
+    monkeypatch.setattr(utils, "get_utc_timestamp", lambda: 0.9)
+    monkeypatch.setattr(utils, "datetime", None)
+    assert utils.date_header() == "Thu, 01 Jan 70 00:00:00 +0000"
+
+    monkeypatch.undo()
+    monkeypatch.setattr(utils, "get_utc_timestamp", lambda: 86401.5)
+    assert utils.date_header() == "Fri, 02 Jan 70 00:00:01 +0000"
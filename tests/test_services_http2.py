@@ -0,0 +1,129 @@
+import asyncio
+import gc
+import pytest
+
+from insanic.conf import settings
+from insanic.services import Service
+from insanic.services.adapters import IS_HTTPX_VERSION_0_15
+from insanic.services.pool import close_connection_pool, get_transport
+
+h2 = pytest.importorskip("h2")
+
+pytestmark = pytest.mark.skipif(
+    not IS_HTTPX_VERSION_0_15,
+    reason="HTTP/2 prior knowledge needs httpx 0.15 and later",
+)
+
+import h2.config  # noqa: E402
+import h2.connection  # noqa: E402
+import h2.events  # noqa: E402
+
+
+class ServerState:
+    connections = 0
+    streams = 0
+    open_streams = 0
+    max_open_streams = 0
+    delay = 0
+
+
+class TestHTTP2PriorKnowledge:
+    @pytest.fixture(autouse=True)
+    async def server(self, monkeypatch, loop):
+        state = ServerState()
+
+        async def respond(conn, writer, stream_id):
+            state.open_streams += 1
+            state.max_open_streams = max(
+                state.max_open_streams, state.open_streams
+            )
+            await asyncio.sleep(state.delay)
+            conn.send_headers(
+                stream_id,
+                [
+                    (":status", "200"),
+                    ("content-type", "application/json"),
+                    ("content-length", "2"),
+                ],
+            )
+            conn.send_data(stream_id, b"{}", end_stream=True)
+            writer.write(conn.data_to_send())
+            state.open_streams -= 1
+
+        async def handle(reader, writer):
+            state.connections += 1
+            conn = h2.connection.H2Connection(
+                config=h2.config.H2Configuration(client_side=False)
+            )
+            conn.initiate_connection()
+            writer.write(conn.data_to_send())
+            try:
+                while True:
+                    data = await reader.read(65535)
+                    if not data:
+                        break
+                    for event in conn.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            state.streams += 1
+                            asyncio.ensure_future(
+                                respond(conn, writer, event.stream_id)
+                            )
+                    writer.write(conn.data_to_send())
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        monkeypatch.setattr(settings, "SERVICE_HTTP2_PRIOR_KNOWLEDGE", True)
+        monkeypatch.setattr(
+            settings, "SERVICE_GLOBAL_HOST_TEMPLATE", "127.0.0.1"
+        )
+        monkeypatch.setattr(settings, "SERVICE_GLOBAL_PORT", str(port))
+        # a collection while the requests are sent would serialize them
+        gc.collect()
+        yield state
+
+        await close_connection_pool()
+        server.close()
+        await server.wait_closed()
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_HTTP2_PRIOR_KNOWLEDGE", False)
+
+        assert get_transport() is None
+
+    async def test_requests_share_a_connection(self, server):
+        server.delay = 0.05
+        service = Service("first")
+
+        responses = await asyncio.gather(
+            *[service.http_dispatch("GET", "/") for _ in range(10)]
+        )
+
+        assert responses == [{}] * 10
+        assert server.connections == 1
+        assert server.streams == 10
+        assert server.max_open_streams == 10
+
+        await service.close_client()
+
+    async def test_shared_connection_pool(self, server, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_SHARED_CONNECTION_POOL", True)
+        monkeypatch.setattr(settings, "SERVICE_CONNECTOR_MAX_PER_HOST", 2)
+        server.delay = 0.05
+        first, second = Service("first"), Service("second")
+
+        responses = await asyncio.gather(
+            *[
+                service.http_dispatch("GET", "/")
+                for service in (first, second)
+                for _ in range(5)
+            ]
+        )
+
+        assert responses == [{}] * 10
+        assert server.connections == 1
+        assert server.max_open_streams == 10
@@ -0,0 +1,134 @@
+import aiotask_context
+import asyncio
+import httpx
+import pytest
+
+from sanic.response import json
+
+from insanic import Insanic
+from insanic.conf import settings
+from insanic.exceptions import APIException
+from insanic.services import Service
+from insanic.services.loader import Loader, RequestBatches
+from insanic.views import InsanicView
+
+
+@pytest.fixture()
+def service():
+    service = Service("user")
+    service.requests = []
+
+    async def send(request, **kwargs):
+        ids = httpx.QueryParams(request.url.query)["ids"].split(",")
+        service.requests.append(ids)
+        if "0" in ids:
+            return httpx.Response(400, request=request, json={})
+        return httpx.Response(
+            200,
+            request=request,
+            json=[
+                {"id": int(i), "name": f"user {i}"} for i in ids if i != "404"
+            ],
+        )
+
+    service.client.send = send
+    return service
+
+
+def request_scope(batches=None):
+    aiotask_context.set(settings.TASK_CONTEXT_LOADERS, batches)
+
+
+class TestLoader:
+    async def test_batches_keys_in_the_same_tick(self, service):
+        request_scope(RequestBatches())
+        loader = Loader(service, "/api/v1/users/")
+
+        users = await asyncio.gather(loader.load(1), loader.load(2))
+
+        assert [u["name"] for u in users] == ["user 1", "user 2"]
+        assert service.requests == [["1", "2"]]
+
+    async def test_load_many(self, service):
+        request_scope(RequestBatches())
+        loader = Loader(service, "/api/v1/users/")
+
+        users = await loader.load_many([3, 404, 3])
+
+        assert users == [{"id": 3, "name": "user 3"}, None, users[0]]
+        assert service.requests == [["3", "404"]]
+
+    async def test_max_batch_size(self, service):
+        request_scope(RequestBatches())
+        loader = Loader(service, "/api/v1/users/", max_batch_size=2)
+
+        await loader.load_many([1, 2, 3])
+
+        assert service.requests == [["1", "2"], ["3"]]
+
+    async def test_loaded_keys_are_kept(self, service):
+        request_scope(RequestBatches())
+        loader = Loader(service, "/api/v1/users/")
+
+        await loader.load(1)
+        await loader.load_many([1, 2])
+
+        assert service.requests == [["1"], ["2"]]
+
+        loader.clear(1)
+        await loader.load(1)
+
+        assert service.requests[-1] == ["1"]
+
+    async def test_failed_keys_are_not_kept(self, service):
+        request_scope(RequestBatches())
+        loader = Loader(service, "/api/v1/users/")
+
+        with pytest.raises(APIException):
+            await loader.load_many([0, 1])
+
+        await loader.load(1)
+
+        assert service.requests == [["0", "1"], ["1"]]
+
+    async def test_batch_load_override(self):
+        request_scope(RequestBatches())
+
+        class SquareLoader(Loader):
+            async def batch_load(self, keys):
+                return {key: key ** 2 for key in keys}
+
+        loader = SquareLoader("square", "/")
+
+        assert await loader.load_many([2, 3]) == [4, 9]
+
+    async def test_without_request_scope(self, service):
+        aiotask_context.set(settings.TASK_CONTEXT_LOADERS, None)
+        loader = Loader(service, "/api/v1/users/")
+
+        await asyncio.gather(loader.load(1), loader.load(2))
+        await loader.load(1)
+
+        assert service.requests == [["1", "2"], ["1"]]
+
+
+class TestRequestScope:
+    def test_loaded_keys_are_kept_per_request(self, service):
+        app = Insanic("test")
+        loader = Loader(service, "/api/v1/users/")
+
+        class UserView(InsanicView):
+            authentication_classes = []
+            permission_classes = []
+
+            async def get(self, request):
+                users = await asyncio.gather(loader.load(1), loader.load(1))
+                return json(users)
+
+        app.add_route(UserView.as_view(), "/")
+
+        app.test_client.get("/")
+        request, response = app.test_client.get("/")
+
+        assert response.json[0]["name"] == "user 1"
+        assert service.requests == [["1"], ["1"]]
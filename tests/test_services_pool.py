@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+
+from insanic.conf import settings
+from insanic.services import Service
+from insanic.services.pool import (
+    ConnectionPool,
+    close_connection_pool,
+    get_connection_pool,
+)
+
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 2\r\n"
+    b"\r\n"
+    b"{}"
+)
+
+
+class ServerState:
+    connections = 0
+    open_connections = 0
+    max_open_connections = 0
+    delay = 0
+
+
+class TestSharedConnectionPool:
+    @pytest.fixture(autouse=True)
+    async def server(self, monkeypatch, loop):
+        state = ServerState()
+
+        async def handle(reader, writer):
+            state.connections += 1
+            state.open_connections += 1
+            state.max_open_connections = max(
+                state.max_open_connections, state.open_connections
+            )
+            try:
+                while await reader.readuntil(b"\r\n\r\n"):
+                    await asyncio.sleep(state.delay)
+                    writer.write(RESPONSE)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                state.open_connections -= 1
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        monkeypatch.setattr(settings, "SERVICE_SHARED_CONNECTION_POOL", True)
+        monkeypatch.setattr(
+            settings, "SERVICE_GLOBAL_HOST_TEMPLATE", "127.0.0.1"
+        )
+        monkeypatch.setattr(settings, "SERVICE_GLOBAL_PORT", str(port))
+        yield state
+
+        await close_connection_pool()
+        server.close()
+        await server.wait_closed()
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_SHARED_CONNECTION_POOL", False)
+
+        assert get_connection_pool() is None
+
+    async def test_services_share_connections(self, server):
+        first, second = Service("first"), Service("second")
+
+        assert first.client._transport is second.client._transport
+        assert isinstance(first.client._transport, ConnectionPool)
+
+        for _ in range(3):
+            assert await first.http_dispatch("GET", "/") == {}
+            assert await second.http_dispatch("GET", "/") == {}
+
+        assert server.connections == 1
+
+    async def test_connections_per_host(self, server, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CONNECTOR_MAX_PER_HOST", 2)
+        server.delay = 0.05
+        service = Service("first")
+
+        responses = await asyncio.gather(
+            *[service.http_dispatch("GET", "/") for _ in range(6)]
+        )
+
+        assert responses == [{}] * 6
+        assert server.max_open_connections == 2
+
+    async def test_idle_connections_are_closed(self, server, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_CONNECTOR_KEEPALIVE_EXPIRY", 0.05
+        )
+        service = Service("first")
+
+        await service.http_dispatch("GET", "/")
+        assert server.open_connections == 1
+
+        await asyncio.sleep(0.2)
+        assert server.open_connections == 0
+        assert await get_connection_pool().connection_info() == {}
+
+    async def test_closing_client_keeps_pool(self, server):
+        first, second = Service("first"), Service("second")
+        await first.http_dispatch("GET", "/")
+
+        await first.close_client()
+
+        assert await second.http_dispatch("GET", "/") == {}
+        assert server.connections == 1
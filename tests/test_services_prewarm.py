@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+
+from insanic.conf import settings
+from insanic.listeners import after_server_start_prewarm_connections
+from insanic.services import Service
+from insanic.services.registry import registry
+
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 2\r\n"
+    b"\r\n"
+    b"{}"
+)
+
+
+class ServerState:
+    connections = 0
+    open_connections = 0
+    paths = ()
+
+
+class TestPrewarmConnections:
+    @pytest.fixture(autouse=True)
+    async def server(self, monkeypatch, loop):
+        state = ServerState()
+        state.paths = []
+
+        async def handle(reader, writer):
+            state.connections += 1
+            state.open_connections += 1
+            try:
+                while True:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    state.paths.append(head.split(b" ")[1].decode())
+                    writer.write(RESPONSE)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                state.open_connections -= 1
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        state.port = server.sockets[0].getsockname()[1]
+
+        monkeypatch.setattr(
+            settings, "SERVICE_GLOBAL_HOST_TEMPLATE", "127.0.0.1"
+        )
+        monkeypatch.setattr(settings, "SERVICE_GLOBAL_PORT", str(state.port))
+        yield state
+
+        server.close()
+        await server.wait_closed()
+
+    async def test_prewarm(self, server):
+        service = Service("first")
+
+        assert await service.prewarm(3) == 3
+        assert server.connections == 3
+        assert server.open_connections == 3
+        assert server.paths == ["/first/ping/"] * 3
+
+        responses = await asyncio.gather(
+            *[service.http_dispatch("GET", "/") for _ in range(3)]
+        )
+
+        assert responses == [{}] * 3
+        assert server.connections == 3
+        await service.close_client()
+
+    async def test_prewarm_keepalive_limit(self, server, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CONNECTOR_MAX_KEEPALIVE", 2)
+        service = Service("first")
+
+        assert await service.prewarm(5) == 2
+        assert server.connections == 2
+        await service.close_client()
+
+    async def test_prewarm_endpoints(self, server, monkeypatch):
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_ENDPOINTS",
+            {"first": [f"127.0.0.1:{server.port}", f"localhost:{server.port}"]},
+        )
+        service = Service("first")
+
+        assert await service.prewarm(2) == 4
+        assert server.connections == 4
+        await service.close_client()
+
+    async def test_prewarm_unavailable(self, server, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_GLOBAL_PORT", "1")
+        service = Service("first")
+
+        assert await service.prewarm(2) == 0
+        assert server.connections == 0
+        await service.close_client()
+
+    async def test_listener(self, server, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_CONNECTIONS", ["first", "second"]
+        )
+        monkeypatch.setattr(settings, "SERVICE_PREWARM_CONNECTIONS", 2)
+        registry.reset()
+
+        await after_server_start_prewarm_connections(None)
+
+        assert server.connections == 4
+        assert (
+            sorted(server.paths) == ["/first/ping/"] * 2 + ["/second/ping/"] * 2
+        )
+
+        await asyncio.gather(*[s.close_client() for s in registry.values()])
+        registry.reset()
+
+    async def test_listener_disabled(self, server, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_CONNECTIONS", ["first"])
+        registry.reset()
+
+        await after_server_start_prewarm_connections(None)
+
+        assert server.connections == 0
+        registry.reset()
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import pytest
+import re
+import respx
+
+from sanic.response import json
+
+from insanic import Insanic
+from insanic.conf import settings
+from insanic.protocol import InsanicHttpProtocol
+from insanic.services import Service
+
+
+class TestProxy:
+    @pytest.fixture()
+    def app(self):
+        self.sent = []
+        self.streams = []
+        self.responses = []
+
+        service = Service("user")
+        send = service.client.send
+
+        async def spy(request, **kwargs):
+            self.streams.append(kwargs.get("stream"))
+            response = await send(request, **kwargs)
+            self.responses.append(response)
+            return response
+
+        service.client.send = spy
+
+        async def upstream(request, **kwargs):
+            body = await request.aread()
+            self.sent.append({"request": request, "body": body})
+            return b'{"id": 1}'
+
+        app = Insanic("test")
+
+        @app.route("/api/v1/users/<path:path>", methods=["GET", "POST"])
+        async def users(request, path):
+            return await service.proxy(request)
+
+        @app.route("/replaced/")
+        async def replaced(request):
+            await service.proxy(request, "/api/v1/users/1/")
+            return json({"replaced": True})
+
+        @app.route("/upload/", methods=["PUT"], stream=True)
+        async def upload(request):
+            return await service.proxy(request, "/api/v1/files/")
+
+        base_url = f"http://{service.url.host}:{service.url.port}"
+        headers = {"etag": '"abc"', "connection": "close"}
+        with respx.mock:
+            respx.get(
+                f"{base_url}/api/v1/users/2/",
+                status_code=404,
+                content=b'{"description": "not here"}',
+                content_type="application/json",
+            )
+            respx.get(
+                f"{base_url}/api/v1/users/3/",
+                status_code=503,
+                content=b'{"description": "down"}',
+                content_type="application/json",
+            )
+            for method in (respx.get, respx.post, respx.put):
+                method(
+                    # respx drops the first of overlapping routes
+                    re.compile(rf"^{base_url}/api/v1/(users/1|files)/"),
+                    content=upstream,
+                    content_type="application/json",
+                    headers=headers,
+                )
+            yield app
+
+    @pytest.fixture()
+    async def client(self, app, sanic_client):
+        return await sanic_client(app, protocol=InsanicHttpProtocol)
+
+    async def test_forwards_request(self, client):
+        response = await client.post(
+            "/api/v1/users/1/?fields=id",
+            data=b'{"name": "insanic"}',
+            headers={
+                "content-type": "application/json",
+                "authorization": "Bearer user-token",
+                "x-custom": "forwarded",
+            },
+        )
+
+        assert response.status == 200
+
+        sent = self.sent[0]["request"]
+        assert sent.method == "POST"
+        assert sent.url.path == "/api/v1/users/1/"
+        assert sent.url.query == b"fields=id"
+        assert self.sent[0]["body"] == b'{"name": "insanic"}'
+        assert sent.headers["content-type"] == "application/json"
+        assert sent.headers["x-custom"] == "forwarded"
+        assert "Bearer user-token" not in sent.headers["authorization"]
+        assert settings.INTERNAL_REQUEST_USER_HEADER.lower() in sent.headers
+        assert self.streams == [True]
+
+    async def test_streams_response(self, client):
+        response = await client.get("/api/v1/users/1/")
+
+        assert response.status == 200
+        assert await response.json() == {"id": 1}
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["etag"] == '"abc"'
+        assert response.headers.get("connection") != "close"
+
+    async def test_error_response_is_passed_through(self, client):
+        response = await client.get("/api/v1/users/2/")
+
+        assert response.status == 404
+        assert await response.json() == {"description": "not here"}
+
+    async def test_server_error_is_passed_through(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_RETRY_BACKOFF_BASE", 0.01)
+
+        response = await client.get("/api/v1/users/3/")
+
+        assert response.status == 503
+        assert await response.json() == {"description": "down"}
+        # retried before the last response is passed through
+        assert len(self.responses) == 3
+        assert all(r.is_closed for r in self.responses)
+
+    async def test_replaced_response_is_closed(self, client):
+        response = await client.get("/replaced/")
+
+        assert await response.json() == {"replaced": True}
+        await asyncio.sleep(0)
+        assert self.responses[0].is_closed
+
+    async def test_streams_request_body(self, client):
+        data = b"x" * 100000
+
+        response = await client.put("/upload/", data=data)
+
+        sent = self.sent[0]["request"]
+        assert response.status == 200
+        assert sent.url.path == "/api/v1/files/"
+        assert self.sent[0]["body"] == data
+        assert sent.headers.get("transfer-encoding") == "chunked"
+
+    async def test_hedging_enabled(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_REQUESTS", True)
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_DELAY", 0.05)
+
+        response = await client.get("/api/v1/users/1/")
+
+        assert response.status == 200
+        assert await response.json() == {"id": 1}
+        assert len(self.sent) == 1
+        assert self.streams == [True]
+
+    async def test_connection_is_kept_alive(self, app, test_server, caplog):
+        server = await test_server(app, protocol=InsanicHttpProtocol)
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+
+        async def read_response():
+            head = await reader.readuntil(b"\r\n\r\n")
+            body = await reader.readuntil(b"\r\n0\r\n\r\n")
+            return head, body
+
+        responses = []
+        try:
+            for _ in range(2):
+                writer.write(
+                    b"GET /api/v1/users/1/ HTTP/1.1\r\nhost: localhost\r\n\r\n"
+                )
+                responses.append(
+                    await asyncio.wait_for(read_response(), timeout=5)
+                )
+        finally:
+            writer.close()
+
+        # the second response is not preceded by an error for the first
+        for head, body in responses:
+            assert head.startswith(b"HTTP/1.1 200")
+            assert body == b'9\r\n{"id": 1}\r\n0\r\n\r\n'
+        assert not [
+            r
+            for r in caplog.records
+            if r.levelno >= logging.ERROR or getattr(r, "status", 0) >= 500
+        ]
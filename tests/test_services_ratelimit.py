@@ -0,0 +1,191 @@
+import asyncio
+import httpx
+import pytest
+import time
+
+from insanic import status
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.services import Service
+from insanic.services.ratelimit import RateLimited, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.clock = Clock()
+        monkeypatch.setattr(RateLimiter, "timer", staticmethod(self.clock))
+
+    def test_paces_requests(self):
+        limiter = RateLimiter("test", rate=10, burst=2, max_wait=1)
+
+        assert [limiter.reserve() for _ in range(4)] == pytest.approx(
+            [0, 0, 0.1, 0.2]
+        )
+
+        self.clock.now += 0.5
+
+        assert limiter.reserve() == 0
+
+    def test_rejection_returns_token(self):
+        limiter = RateLimiter("test", rate=10, max_wait=0.15)
+        limiter.reserve()
+        limiter.reserve()
+
+        with pytest.raises(RateLimited) as exc_info:
+            limiter.reserve()
+
+        assert exc_info.value.error_code == GlobalErrorCodes.throttled
+        assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        self.clock.now += 0.1
+
+        assert limiter.reserve() == pytest.approx(0.1)
+
+    def test_no_rate(self):
+        limiter = RateLimiter("test", max_wait=5)
+
+        assert [limiter.reserve() for _ in range(3)] == [0, 0, 0]
+
+    def test_backoff_without_rate_paces_held_requests(self):
+        limiter = RateLimiter("test", max_wait=5, backoff_rate=10)
+
+        limiter.backoff(2)
+
+        assert [limiter.reserve() for _ in range(3)] == pytest.approx(
+            [2, 2.1, 2.2]
+        )
+
+        limiter.backoff()
+        self.clock.now += 2
+
+        assert limiter.reserve() == pytest.approx(0.3)
+
+    def test_backoff_without_rate_stops_pacing(self):
+        limiter = RateLimiter("test", burst=2, max_wait=5, backoff_rate=10)
+
+        limiter.backoff(1)
+        limiter.reserve()
+        self.clock.now += 1.5
+
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == 0
+
+    def test_backoff_paces_held_requests(self):
+        limiter = RateLimiter("test", rate=10, burst=5, max_wait=5)
+
+        limiter.backoff(2)
+
+        assert [limiter.reserve() for _ in range(3)] == pytest.approx(
+            [2, 2.1, 2.2]
+        )
+
+    def test_backoff_rejects(self):
+        limiter = RateLimiter("test", max_wait=1)
+
+        limiter.backoff(2)
+
+        with pytest.raises(RateLimited):
+            limiter.reserve()
+
+    def test_from_settings(self, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_RATE_LIMITS", {"test": {"RATE": 5, "BURST": 10}}
+        )
+
+        limiter = RateLimiter.from_settings("test")
+
+        assert limiter.rate == 5
+        assert limiter.burst == 10
+        assert limiter.max_wait == settings.SERVICE_RATE_LIMIT_MAX_WAIT
+        assert limiter.backoff_rate == settings.SERVICE_RATE_LIMIT_BACKOFF_RATE
+        assert RateLimiter.from_settings("other").rate is None
+
+
+class TestServiceRateLimit:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_RATE_LIMIT", True)
+        self.sent = []
+        self.sent_at = []
+        self.responses = []
+
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            self.sent_at.append(time.monotonic())
+            status_code, headers = (
+                self.responses.pop(0) if self.responses else (200, {})
+            )
+            return httpx.Response(
+                status_code, request=request, headers=headers, content=b"{}"
+            )
+
+        self.service = Service("test")
+        self.service.client.send = send
+
+    async def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_RATE_LIMIT", False)
+
+        assert Service("test").rate_limiter is None
+
+    async def test_enabled_by_rate_limits(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_RATE_LIMIT", False)
+        monkeypatch.setattr(
+            settings, "SERVICE_RATE_LIMITS", {"test": {"RATE": 5}}
+        )
+
+        assert Service("test").rate_limiter.rate == 5
+
+    async def test_honors_retry_after(self):
+        self.responses.append((429, {"Retry-After": "30"}))
+
+        response, status_code = await self.service.http_dispatch(
+            "GET", "/", include_status_code=True
+        )
+
+        assert status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        with pytest.raises(RateLimited) as exc_info:
+            await self.service.http_dispatch("GET", "/")
+
+        assert exc_info.value.wait == 30
+        assert len(self.sent) == 1
+
+    async def test_short_backoff_waits(self, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_RATE_LIMIT_DEFAULT_BACKOFF", 0.05
+        )
+        self.responses.append((429, {}))
+
+        await self.service.http_dispatch("GET", "/")
+        start = self.service.rate_limiter.timer()
+        await self.service.http_dispatch("GET", "/")
+
+        assert len(self.sent) == 2
+        assert self.service.rate_limiter.timer() - start >= 0.04
+
+    async def test_held_requests_are_spread(self, monkeypatch):
+        monkeypatch.setattr(
+            settings, "SERVICE_RATE_LIMIT_DEFAULT_BACKOFF", 0.05
+        )
+        monkeypatch.setattr(settings, "SERVICE_RATE_LIMIT_BACKOFF_RATE", 20)
+        self.responses.append((429, {}))
+
+        await self.service.http_dispatch("GET", "/")
+        await asyncio.gather(
+            *[self.service.http_dispatch("GET", "/") for _ in range(3)]
+        )
+
+        sent_at = self.sent_at[1:]
+        gaps = [b - a for a, b in zip(sent_at, sent_at[1:])]
+        assert len(gaps) == 2
+        assert all(gap >= 0.04 for gap in gaps)
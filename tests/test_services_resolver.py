@@ -0,0 +1,145 @@
+import asyncio
+import httpx
+import pytest
+import socket
+import ujson
+
+from insanic.conf import settings
+from insanic.exceptions import APIException
+from insanic.services import Service, resolver as resolver_module
+from insanic.services.resolver import Resolver
+
+
+class TestResolver:
+    @pytest.fixture(autouse=True)
+    def lookups(self, monkeypatch, loop):
+        self.now = 1000.0
+        self.lookups = []
+        self.addresses = {"service": ["10.0.0.1", "10.0.0.2"]}
+        monkeypatch.setattr(Resolver, "timer", lambda *a: self.now)
+
+        async def getaddrinfo(host, port, **kwargs):
+            self.lookups.append(host)
+            await asyncio.sleep(0)
+            if host not in self.addresses:
+                raise socket.gaierror(socket.EAI_NONAME, "unknown")
+            return [
+                (socket.AF_INET, socket.SOCK_STREAM, 6, "", (a, port))
+                for a in self.addresses[host] * 2
+            ]
+
+        monkeypatch.setattr(loop, "getaddrinfo", getaddrinfo)
+
+    @pytest.fixture()
+    def resolver(self):
+        return Resolver(ttl=10, negative_ttl=5, refresh_after=0.5)
+
+    async def test_addresses_are_cached(self, resolver):
+        assert await resolver.resolve("service", 8000) == [
+            "10.0.0.1",
+            "10.0.0.2",
+        ]
+        await resolver.resolve("service", 8000)
+
+        assert self.lookups == ["service"]
+
+    async def test_concurrent_lookups_are_shared(self, resolver):
+        await asyncio.gather(
+            *[resolver.resolve("service", 8000) for _ in range(10)]
+        )
+
+        assert self.lookups == ["service"]
+
+    async def test_negative_caching(self, resolver):
+        for _ in range(2):
+            with pytest.raises(socket.gaierror):
+                await resolver.resolve("unknown", 8000)
+        assert self.lookups == ["unknown"]
+
+        self.now += 5
+        with pytest.raises(socket.gaierror):
+            await resolver.resolve("unknown", 8000)
+        assert len(self.lookups) == 2
+
+    async def test_refreshed_in_background(self, resolver):
+        await resolver.resolve("service", 8000)
+
+        self.now += 5
+        self.addresses["service"] = ["10.0.0.3"]
+        assert await resolver.resolve("service", 8000) == [
+            "10.0.0.1",
+            "10.0.0.2",
+        ]
+
+        await asyncio.sleep(0.01)
+        assert len(self.lookups) == 2
+        assert await resolver.resolve("service", 8000) == ["10.0.0.3"]
+
+    async def test_failed_refresh_keeps_addresses(self, resolver):
+        await resolver.resolve("service", 8000)
+
+        self.now += 5
+        del self.addresses["service"]
+        await resolver.resolve("service", 8000)
+        await asyncio.sleep(0.01)
+
+        assert await resolver.resolve("service", 8000) == [
+            "10.0.0.1",
+            "10.0.0.2",
+        ]
+
+        self.now += 5
+        with pytest.raises(socket.gaierror):
+            await resolver.resolve("service", 8000)
+
+
+class TestServiceResolution:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_DNS_CACHE", True)
+        monkeypatch.setattr(resolver_module, "_resolver", None)
+        self.sent = []
+        self.addresses = ["10.0.0.1", "10.0.0.2"]
+
+        async def resolve(resolver, host, port=None):
+            if not self.addresses:
+                raise socket.gaierror(socket.EAI_NONAME, "unknown")
+            return self.addresses
+
+        monkeypatch.setattr(Resolver, "resolve", resolve)
+
+        self.service = Service("test")
+        self.service.client.send = self.send
+
+    async def send(self, request, **kwargs):
+        self.sent.append(request)
+        return httpx.Response(
+            200, request=request, content=ujson.dumps(request.url.host).encode()
+        )
+
+    async def test_requests_go_to_addresses(self):
+        hosts = {
+            await self.service.http_dispatch("GET", "/") for _ in range(20)
+        }
+
+        assert hosts == {"10.0.0.1", "10.0.0.2"}
+        assert all(r.headers["host"] == "test:8000" for r in self.sent)
+
+        self.addresses = ["10.0.0.3"]
+        assert await self.service.http_dispatch("GET", "/") == "10.0.0.3"
+
+    async def test_ip_hosts_are_not_resolved(self):
+        self.service.host = "127.0.0.1"
+        self.service._client = None
+        self.service.client.send = self.send
+        self.addresses = []
+
+        assert await self.service.http_dispatch("GET", "/") == "127.0.0.1"
+
+    async def test_unresolvable(self):
+        self.addresses = []
+
+        with pytest.raises(APIException) as exc_info:
+            await self.service.http_dispatch("GET", "/")
+
+        assert exc_info.value.status_code == 503
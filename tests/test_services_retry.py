@@ -0,0 +1,164 @@
+import httpx
+import pytest
+import time
+
+from email.utils import formatdate
+
+from insanic.conf import settings
+from insanic.exceptions import APIException
+from insanic.services import Service
+from insanic.services.retry import RetryBudget, RetryPolicy, parse_retry_after
+
+
+class TestRetryBudget:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(RetryBudget, "timer", lambda *a: self.now)
+
+    def test_retries_are_limited_to_ratio(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=10)
+        assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+        for _ in range(4):
+            budget.deposit()
+
+        assert budget.withdraw() is True
+        assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+    def test_refills_over_time(self):
+        budget = RetryBudget(ratio=0, min_per_second=2, max_tokens=4)
+        for _ in range(2):
+            assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+        self.now += 0.5
+        assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+        self.now += 100
+        assert budget.tokens == 4
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    ((None, None), ("", None), ("3", 3), ("-1", 0), ("soon", None)),
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date():
+    value = formatdate(time.time() + 30, usegmt=True)
+    assert 28 < parse_retry_after(value) <= 30
+
+
+class TestRetryPolicy:
+    def error(self, status_code, headers=None):
+        request = httpx.Request("GET", "http://test:8000/")
+        response = httpx.Response(
+            status_code, request=request, headers=headers or {}
+        )
+        return httpx.HTTPStatusError(
+            "error", request=request, response=response
+        )
+
+    @pytest.mark.parametrize(
+        "method, retry_count, expected",
+        (("GET", None, 3), ("get", 1, 2), ("GET", 10, 5), ("POST", 2, 1)),
+    )
+    def test_attempts(self, method, retry_count, expected):
+        assert RetryPolicy().attempts(method, retry_count) == expected
+
+    def test_is_retryable(self):
+        policy = RetryPolicy(status_codes=[503])
+
+        assert policy.is_retryable(self.error(503))
+        assert not policy.is_retryable(self.error(500))
+        assert policy.is_retryable(httpx.ConnectError("e", request=None))
+
+    def test_backoff_is_exponential_with_jitter(self):
+        policy = RetryPolicy(backoff_base=0.1, backoff_max=0.5)
+
+        for attempt, cap in ((0, 0.1), (1, 0.2), (2, 0.4), (3, 0.5)):
+            delays = [policy.backoff(attempt) for _ in range(50)]
+            assert all(0 <= d <= cap for d in delays)
+            assert len(set(delays)) > 1
+
+    def test_backoff_honors_retry_after(self):
+        policy = RetryPolicy(backoff_base=0.1, backoff_max=2)
+
+        assert policy.backoff(0, self.error(503, {"retry-after": "1"})) == 1
+        assert policy.backoff(0, self.error(503, {"retry-after": "5"})) is None
+
+
+class TestServiceRetry:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_RETRY_BACKOFF_BASE", 0.01)
+        self.responses = []
+        self.sent = []
+        self.service = Service("test")
+
+        async def send(request, **kwargs):
+            self.sent.append(request)
+            status_code, headers = self.responses.pop(0)
+            return httpx.Response(
+                status_code, request=request, headers=headers, content=b"{}"
+            )
+
+        self.service.client.send = send
+
+    async def test_retries_retryable_status(self):
+        self.responses = [(503, {}), (502, {}), (200, {})]
+
+        assert await self.service.http_dispatch("GET", "/") == {}
+        assert len(self.sent) == 3
+
+    async def test_does_not_retry_other_status(self):
+        self.responses = [(501, {}), (200, {})]
+
+        with pytest.raises(APIException):
+            await self.service.http_dispatch("GET", "/", propagate_error=True)
+        assert len(self.sent) == 1
+
+    async def test_retries_too_many_requests_after_retry_after(self):
+        self.service.retry_policy.status_codes.add(429)
+        self.responses = [(429, {"retry-after": "0.2"}), (200, {})]
+
+        start = time.monotonic()
+        assert await self.service.http_dispatch("GET", "/") == {}
+        assert time.monotonic() - start >= 0.2
+        assert len(self.sent) == 2
+
+    async def test_last_attempt_returns_retryable_status(self):
+        self.service.retry_policy.status_codes.add(429)
+        self.responses = [(429, {})] * 2
+
+        response = await self.service.http_dispatch(
+            "GET", "/", retry_count=1, include_status_code=True
+        )
+        assert response == ({}, 429)
+        assert len(self.sent) == 2
+
+    async def test_long_retry_after_is_not_retried(self):
+        self.responses = [(503, {"retry-after": "120"}), (200, {})]
+
+        with pytest.raises(APIException):
+            await self.service.http_dispatch("GET", "/")
+        assert len(self.sent) == 1
+
+    async def test_budget_limits_retries(self):
+        self.service.retry_policy.budget = RetryBudget(
+            ratio=0, min_per_second=0, max_tokens=1
+        )
+        self.responses = [(503, {})] * 6
+
+        for _ in range(2):
+            with pytest.raises(APIException):
+                await self.service.http_dispatch("GET", "/")
+
+        # one retry was allowed by the budget
+        assert len(self.sent) == 3
@@ -0,0 +1,88 @@
+import pytest
+
+from insanic.services.stats import (
+    LatencySketch,
+    LatencyStats,
+    endpoint_template,
+)
+
+
+class TestLatencySketch:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(LatencySketch, "timer", lambda *a: self.now)
+
+    def test_empty(self):
+        assert LatencySketch().percentile(0.5) is None
+
+    @pytest.mark.parametrize("q", (0, 0.5, 0.95, 0.99, 1))
+    def test_percentile_accuracy(self, q):
+        sketch = LatencySketch(relative_accuracy=0.02)
+        latencies = [i / 1000 for i in range(1, 1001)]
+        for latency in reversed(latencies):
+            sketch.add(latency)
+
+        expected = latencies[int(q * (len(latencies) - 1))]
+        assert sketch.percentile(q) == pytest.approx(expected, rel=0.021)
+        assert len(sketch) == 1000
+
+    def test_window(self):
+        sketch = LatencySketch(window=60)
+        sketch.add(1)
+
+        self.now += 60
+        sketch.add(0.1)
+        assert len(sketch) == 2
+        assert sketch.percentile(1) == pytest.approx(1, rel=0.021)
+
+        self.now += 60
+        assert len(sketch) == 1
+        assert sketch.percentile(1) == pytest.approx(0.1, rel=0.021)
+
+        self.now += 120
+        assert len(sketch) == 0
+
+
+class TestLatencyStats:
+    def test_min_samples(self):
+        stats = LatencyStats()
+        stats.add("a", 0.1)
+
+        assert stats.percentile("a", 0.5, min_samples=2) is None
+        assert stats.percentile("b", 0.5) is None
+
+        stats.add("a", 0.1)
+        assert stats.percentile("a", 0.5, min_samples=2) == pytest.approx(
+            0.1, rel=0.021
+        )
+
+    def test_max_keys(self):
+        stats = LatencyStats(max_keys=2)
+        stats.add("a", 0.1)
+        stats.add("b", 0.1)
+        stats.add("a", 0.1)
+        stats.add("c", 0.1)
+
+        assert len(stats) == 2
+        assert stats.get("b") is None
+        assert stats.get("a") is not None
+
+
+@pytest.mark.parametrize(
+    "path,template",
+    [
+        ("/api/v1/users/", "/api/v1/users/"),
+        ("/api/v1/users/1234/", "/api/v1/users/{id}/"),
+        ("/api/v1/users/1234/posts/5", "/api/v1/users/{id}/posts/{id}"),
+        (
+            "/api/v1/users/0f8fad5b-d9cb-469f-a165-70867728950e/",
+            "/api/v1/users/{id}/",
+        ),
+        ("/api/v1/users/507f1f77bcf86cd799439011/", "/api/v1/users/{id}/"),
+        ("/api/v2/users/me/", "/api/v2/users/me/"),
+        ("/api/v1/face/", "/api/v1/face/"),
+    ],
+)
+def test_endpoint_template(path, template):
+    assert endpoint_template(path) == template
@@ -0,0 +1,199 @@
+import pytest
+import respx
+
+from insanic.conf import settings
+from insanic.errors import GlobalErrorCodes
+from insanic.exceptions import APIException, ResponseTooLarge
+from insanic.services import Service
+from insanic.services import bulkhead as bulkhead_module
+from insanic.services.streaming import iter_json_array, iter_ndjson
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+class TestDecoders:
+    async def test_ndjson(self):
+        records = await collect(
+            iter_ndjson(chunks(b'{"a": 1}\n{"a"', b': 2}\n\n{"a": 3}'))
+        )
+
+        assert records == [{"a": 1}, {"a": 2}, {"a": 3}]
+
+    async def test_ndjson_invalid(self):
+        with pytest.raises(APIException) as exc_info:
+            await collect(iter_ndjson(chunks(b'{"a": 1}\n{"a"\n')))
+
+        assert exc_info.value.error_code == GlobalErrorCodes.stream_error
+
+    @pytest.mark.parametrize(
+        "parts,items",
+        (
+            ((b"[]",), []),
+            ((b" [ ", b" ] ",), []),
+            ((b"[1", b"23, 4", b"5]"), [123, 45]),
+            (
+                (b'[{"a": "x,', b']"}, true', b", null]"),
+                [{"a": "x,]"}, True, None],
+            ),
+            ((b'["\xc3', b'\xa9"]'), ["é"]),
+        ),
+    )
+    async def test_json_array(self, parts, items):
+        assert await collect(iter_json_array(chunks(*parts))) == items
+
+    @pytest.mark.parametrize(
+        "parts", ((b'{"a": 1}',), (b"[1, 2",), (b"[1] 2",), (b"[1 2]",))
+    )
+    async def test_json_array_invalid(self, parts):
+        with pytest.raises(APIException) as exc_info:
+            await collect(iter_json_array(chunks(*parts)))
+
+        assert exc_info.value.error_code == GlobalErrorCodes.stream_error
+
+    async def test_items_are_yielded_as_they_arrive(self):
+        received = []
+
+        async def parts():
+            yield b"[1, "
+            received.append("second chunk")
+            yield b"2]"
+
+        async for item in iter_json_array(parts()):
+            received.append(item)
+
+        assert received == [1, "second chunk", 2]
+
+
+class TestServiceStreaming:
+    @pytest.fixture(autouse=True)
+    def service(self):
+        self.sent = []
+        self.responses = []
+        self.body = b'{"id": 1}\n{"id": 2}\n'
+        self.service = Service("test")
+        send = self.service.client.send
+
+        async def spy(request, **kwargs):
+            self.sent.append(kwargs)
+            response = await send(request, **kwargs)
+            self.responses.append(response)
+            return response
+
+        self.service.client.send = spy
+
+        base_url = f"http://{self.service.url.host}:{self.service.url.port}"
+        with respx.mock:
+            respx.get(f"{base_url}/export/", content=lambda request: self.body)
+            respx.get(
+                f"{base_url}/missing/", status_code=404, content=b"not here"
+            )
+            respx.get(f"{base_url}/down/", status_code=503, content=b"down")
+            yield
+
+    async def test_ndjson(self):
+        records = []
+        async for record in self.service.http_dispatch(
+            "GET", "/export/", stream="ndjson"
+        ):
+            # the body is read as it is iterated over
+            assert not self.responses[0].is_closed
+            records.append(record)
+
+        assert records == [{"id": 1}, {"id": 2}]
+        assert self.sent[0]["stream"] is True
+        assert self.responses[0].is_closed
+
+    async def test_bytes(self):
+        body = b"".join(
+            await collect(
+                self.service.http_dispatch("GET", "/export/", stream="bytes")
+            )
+        )
+
+        assert body == self.body
+
+    async def test_max_body_size(self):
+        with pytest.raises(ResponseTooLarge):
+            await collect(
+                self.service.http_dispatch(
+                    "GET", "/export/", stream="bytes", max_body_size=12
+                )
+            )
+
+        assert self.responses[0].is_closed
+
+    async def test_max_body_size_setting(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_STREAM_MAX_BODY_SIZE", 12)
+
+        with pytest.raises(ResponseTooLarge):
+            await collect(
+                self.service.http_dispatch("GET", "/export/", stream="ndjson")
+            )
+
+    async def test_error_response(self):
+        with pytest.raises(APIException) as exc_info:
+            await collect(
+                self.service.http_dispatch("GET", "/missing/", stream="json")
+            )
+
+        assert exc_info.value.status_code == 404
+        assert exc_info.value.description == "not here"
+
+    async def test_server_error_response(self):
+        with pytest.raises(APIException) as exc_info:
+            await collect(
+                self.service.http_dispatch("GET", "/down/", stream="json")
+            )
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.description == "down"
+        assert len(self.responses) == 3
+        assert all(r.is_closed for r in self.responses)
+
+    async def test_closing_early_closes_response(self):
+        iterator = self.service.http_dispatch(
+            "GET", "/export/", stream="ndjson"
+        )
+
+        async for record in iterator:
+            break
+        await iterator.aclose()
+
+        assert self.responses[0].is_closed
+
+    async def test_hedging_enabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_REQUESTS", True)
+        monkeypatch.setattr(settings, "SERVICE_HEDGE_DELAY", 0.05)
+
+        records = await collect(
+            self.service.http_dispatch("GET", "/export/", stream="ndjson")
+        )
+
+        assert records == [{"id": 1}, {"id": 2}]
+        assert self.sent[0]["stream"] is True
+
+    async def test_limits_are_released_with_the_headers(self, monkeypatch):
+        monkeypatch.setattr(bulkhead_module, "_bulkheads", {})
+        monkeypatch.setattr(
+            settings, "SERVICE_BULKHEADS", {"test": {"MAX_CONCURRENCY": 1}}
+        )
+        first = self.service.http_dispatch("GET", "/export/", stream="ndjson")
+        second = self.service.http_dispatch("GET", "/export/", stream="ndjson")
+
+        assert await first.__anext__() == {"id": 1}
+        # the first response is still open, but no longer holds the slot
+        assert not self.responses[0].is_closed
+        assert self.service.bulkhead.in_flight == 0
+        assert await collect(second) == [{"id": 1}, {"id": 2}]
+        await first.aclose()
+
+    def test_invalid_format(self):
+        with pytest.raises(ValueError):
+            self.service.http_dispatch("GET", "/export/", stream="xml")
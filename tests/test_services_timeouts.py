@@ -0,0 +1,139 @@
+import asyncio
+import httpx
+import pytest
+
+from insanic.conf import settings
+from insanic.exceptions import ResponseTimeoutError
+from insanic.services import Service
+from insanic.services import bulkhead as bulkhead_module
+from insanic.services.adapters import UNSET
+from insanic.services.client import ADAPTIVE_TIMEOUT_MIN_SAMPLES
+
+
+class TestEndpointTimeouts:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        self.timeouts = []
+        self.service = Service("test")
+
+        async def send(request, **kwargs):
+            self.timeouts.append(kwargs["timeout"])
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.service.client.send = send
+
+    def observe(self, latency, count=ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        for _ in range(count):
+            self.service.latencies.add(("GET", "/users/{id}/"), latency)
+
+    async def test_default(self):
+        await self.service.http_dispatch("GET", "/users/1/")
+
+        assert self.timeouts == [UNSET]
+
+    async def test_overrides(self, monkeypatch):
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_ENDPOINT_TIMEOUTS",
+            {"test": {"GET /users/{id}/": 1, "/users/{id}/": 2}},
+        )
+
+        await self.service.http_dispatch("GET", "/users/1/")
+        await self.service.http_dispatch("POST", "/users/2/")
+        await self.service.http_dispatch("GET", "/users/")
+        await self.service.http_dispatch("GET", "/users/1/", response_timeout=3)
+
+        assert self.timeouts == [1, 2, UNSET, 3]
+
+    async def test_adaptive(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_ADAPTIVE_TIMEOUT", True)
+        self.observe(0.1)
+
+        await self.service.http_dispatch("GET", "/users/1/")
+        await self.service.http_dispatch("GET", "/users/")
+
+        assert self.timeouts[0] == pytest.approx(0.2, rel=0.021)
+        assert self.timeouts[1] is UNSET
+
+    async def test_adaptive_needs_samples(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_ADAPTIVE_TIMEOUT", True)
+        self.observe(0.1, ADAPTIVE_TIMEOUT_MIN_SAMPLES - 2)
+
+        await self.service.http_dispatch("GET", "/users/1/")
+
+        assert self.timeouts == [UNSET]
+
+    @pytest.mark.parametrize(
+        "latency,timeout", ((0.001, 0.1), (10, settings.SERVICE_TIMEOUT_TOTAL))
+    )
+    async def test_adaptive_bounds(self, monkeypatch, latency, timeout):
+        monkeypatch.setattr(settings, "SERVICE_ADAPTIVE_TIMEOUT", True)
+        self.observe(latency)
+
+        await self.service.http_dispatch("GET", "/users/1/")
+
+        assert self.timeouts == [timeout]
+
+    async def test_adaptive_max(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_ADAPTIVE_TIMEOUT", True)
+        monkeypatch.setattr(settings, "SERVICE_ADAPTIVE_TIMEOUT_MAX", 1)
+        self.observe(10)
+
+        await self.service.http_dispatch("GET", "/users/1/")
+
+        assert self.timeouts == [1]
+
+    async def test_latencies_are_kept_by_template(self):
+        await self.service.http_dispatch("GET", "/users/1/")
+        await self.service.http_dispatch("GET", "/users/2/")
+
+        assert len(self.service.latencies.get(("GET", "/users/{id}/"))) == 2
+
+    async def test_latencies_exclude_queue_wait(self, monkeypatch):
+        monkeypatch.setattr(bulkhead_module, "_bulkheads", {})
+        monkeypatch.setattr(
+            settings,
+            "SERVICE_BULKHEADS",
+            {"test": {"MAX_CONCURRENCY": 1, "MAX_QUEUE": 4}},
+        )
+
+        async def send(request, **kwargs):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.service.client.send = send
+
+        await asyncio.gather(
+            *[self.service.http_dispatch("GET", "/users/1/") for _ in range(5)]
+        )
+
+        latencies = self.service.latencies.get(("GET", "/users/{id}/"))
+        assert len(latencies) == 5
+        # the last request waited for the other four in the bulkhead
+        assert latencies.percentile(1) < 0.1
+
+    async def test_adaptive_grows_when_latency_jumps(self, monkeypatch):
+        monkeypatch.setattr(settings, "SERVICE_ADAPTIVE_TIMEOUT", True)
+        self.observe(0.1)
+
+        async def send(request, **kwargs):
+            self.timeouts.append(kwargs["timeout"])
+            # the endpoint now takes 0.5 seconds to respond
+            if kwargs["timeout"] < 0.5:
+                raise httpx.ReadTimeout("timed out", request=request)
+            return httpx.Response(200, request=request, content=b"{}")
+
+        self.service.client.send = send
+
+        for _ in range(20):
+            try:
+                await self.service.http_dispatch(
+                    "GET", "/users/1/", retry_count=0
+                )
+                break
+            except ResponseTimeoutError:
+                pass
+
+        assert self.timeouts[0] == pytest.approx(0.2, rel=0.021)
+        assert self.timeouts[-1] >= 0.5
+        assert self.timeouts == sorted(self.timeouts)